@@ -1,4 +1,6 @@
-from flask import Flask
+import os
+import shutil
+from flask import Flask, abort, request
 from flask_login import LoginManager
 import config
 from tools import db
@@ -9,6 +11,7 @@ def create_app():
     app = Flask(__name__)
     app.secret_key = config.SECRET_KEY
     app.config["MAX_CONTENT_LENGTH"] = config.MAX_FILE_SIZE
+    app.config["USE_X_SENDFILE"] = config.FILE_SENDFILE == "x-sendfile"
 
     # Flask-Login
     login_manager = LoginManager()
@@ -19,16 +22,56 @@ def create_app():
     def load_user(user_id):
         return User.get_by_id(user_id)
 
+    # Uploads are served only through the access-checked /files routes. Move
+    # any left under static/ by older versions, and refuse the static route
+    # for them in case the move could not happen.
+    _move_legacy_uploads()
+
+    @app.before_request
+    def refuse_static_uploads():
+        if request.path.startswith(f"{app.static_url_path}/uploads/"):
+            abort(404)
+
     # Init database
-    db.init_db()
+    db.init_app(app)
+    with app.app_context():
+        db.init_db()
 
     # Register blueprints
     from routes import register_blueprints
     register_blueprints(app)
 
+    # Storage GC runs on a timer in each serving process; runs are claimed in
+    # the database so only one process collects per interval.
+    from tools import storage_gc
+    app.before_request(storage_gc.start_scheduler)
+
+    # Change-log compaction likewise runs on a timer, never inside a mutation
+    from tools import changelog
+    app.before_request(changelog.start_scheduler)
+
+    # Export jobs are held by the process that queued them; its heartbeat
+    # thread also picks up jobs left behind by processes that died.
+    from tools import export_jobs
+    app.before_request(export_jobs.start)
+
+    # Thumbnail and tile jobs interrupted by a crash or restart are resubmitted
+    from tools import thumbnails
+    app.before_request(thumbnails.start)
+
+    # CLI commands (flask --app app <command>)
+    from tools.cli import register_commands
+    register_commands(app)
+
     return app
 
 
+def _move_legacy_uploads():
+    legacy = config.LEGACY_UPLOAD_DIR
+    if os.path.isdir(legacy) and not os.path.exists(config.UPLOAD_DIR):
+        shutil.move(legacy, config.UPLOAD_DIR)
+
+
 if __name__ == "__main__":
     app = create_app()
     app.run(debug=True, port=5000)
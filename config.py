@@ -7,7 +7,10 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
 DB_PATH = os.path.join(BASE_DIR, ".tmp", "canva_board.db")
-UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
+# Outside static/ so uploads are only reachable through the access-checked
+# /files routes; files left in the old static/uploads are moved on startup.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
+LEGACY_UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
 EMAIL_ATTACH_DIR = os.path.join(BASE_DIR, ".tmp", "email_attachments")
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
 
@@ -15,5 +18,126 @@ MAIL_USER = os.getenv("MAIL_USER", "")
 MAIL_PASS = os.getenv("MAIL_PASS", "")
 IMAP_HOST = os.getenv("IMAP_HOST", "")
 IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
+IMAP_FETCH_BATCH = int(os.getenv("IMAP_FETCH_BATCH", "200"))
 SMTP_HOST = os.getenv("SMTP_HOST", "")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Change-log compaction runs every CHANGELOG_COMPACT_INTERVAL seconds in a
+# background thread (0 leaves it to `flask compact-changes`).
+CHANGELOG_MAX_AGE_DAYS = int(os.getenv("CHANGELOG_MAX_AGE_DAYS", "7"))
+CHANGELOG_MAX_PER_BOARD = int(os.getenv("CHANGELOG_MAX_PER_BOARD", "5000"))
+CHANGELOG_COMPACT_INTERVAL = int(os.getenv("CHANGELOG_COMPACT_INTERVAL", "3600"))
+
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "200"))
+SSE_HEARTBEAT = int(os.getenv("SSE_HEARTBEAT", "15"))
+
+ACCESS_CACHE_SIZE = int(os.getenv("ACCESS_CACHE_SIZE", "10000"))
+ACCESS_CACHE_TTL = int(os.getenv("ACCESS_CACHE_TTL", "30"))
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+
+BOARD_PREVIEW_IMAGES = int(os.getenv("BOARD_PREVIEW_IMAGES", "6"))
+BOARD_PREVIEW_CACHE_SIZE = int(os.getenv("BOARD_PREVIEW_CACHE_SIZE", "5000"))
+BOARD_PREVIEW_CACHE_TTL = int(os.getenv("BOARD_PREVIEW_CACHE_TTL", "600"))
+
+# Accounts allowed to read operational stats such as /api/stats/caches
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "60"))
+DASHBOARD_MAX_PAGE_SIZE = int(os.getenv("DASHBOARD_MAX_PAGE_SIZE", "500"))
+
+# Thumbnail widths generated for every image (bounding box, px); the default
+# one is what card and dashboard previews link to.
+THUMB_WIDTHS = [int(w) for w in os.getenv("THUMB_WIDTHS", "150,300,800").split(",")]
+THUMB_DEFAULT_WIDTH = int(os.getenv("THUMB_DEFAULT_WIDTH", "300"))
+THUMB_WEBP_QUALITY = int(os.getenv("THUMB_WEBP_QUALITY", "80"))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+THUMB_MAX_ATTEMPTS = int(os.getenv("THUMB_MAX_ATTEMPTS", "3"))
+
+# Chunked uploads: each chunk is one request, so UPLOAD_CHUNK_SIZE must stay
+# under MAX_FILE_SIZE (the per-request body limit); UPLOAD_MAX_SIZE bounds the
+# assembled file.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+UPLOAD_CLEANUP_INTERVAL = int(os.getenv("UPLOAD_CLEANUP_INTERVAL", "3600"))
+
+# Serving uploads: how long browsers may keep a file (content never changes
+# under a URL), and optionally let the front-end server send the bytes.
+# FILE_SENDFILE is "", "x-sendfile" (Apache/lighttpd) or "x-accel" (nginx,
+# with an internal location at FILE_ACCEL_PREFIX aliased to UPLOAD_DIR).
+FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+FILE_SENDFILE = os.getenv("FILE_SENDFILE", "")
+FILE_ACCEL_PREFIX = os.getenv("FILE_ACCEL_PREFIX", "/_uploads/")
+
+# Deep-zoom tiles for images whose longer side exceeds TILE_MIN_SIZE px
+TILE_MIN_SIZE = int(os.getenv("TILE_MIN_SIZE", "4096"))
+TILE_SIZE = int(os.getenv("TILE_SIZE", "256"))
+TILE_QUALITY = int(os.getenv("TILE_QUALITY", "85"))
+
+# Storage garbage collection: files unreferenced for STORAGE_GC_GRACE_HOURS are
+# removed every STORAGE_GC_INTERVAL seconds (0 leaves it to `flask gc-storage`).
+STORAGE_GC_GRACE_HOURS = int(os.getenv("STORAGE_GC_GRACE_HOURS", "24"))
+STORAGE_GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", str(24 * 3600)))
+STORAGE_GC_BATCH_SIZE = int(os.getenv("STORAGE_GC_BATCH_SIZE", "500"))
+
+# Board export through headless Chromium: where the browser reaches the app,
+# how many exports render at once per process, and per-step timeout (seconds).
+EXPORT_BASE_URL = os.getenv("EXPORT_BASE_URL", "http://127.0.0.1:5000")
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "2"))
+EXPORT_TIMEOUT = int(os.getenv("EXPORT_TIMEOUT", "30"))
+EXPORT_CONTEXT_MAX_USES = int(os.getenv("EXPORT_CONTEXT_MAX_USES", "50"))
+# The browser loads boards through a share link; when a board has none, one
+# is created that expires after EXPORT_SHARE_TTL_MINUTES.
+EXPORT_SHARE_TTL_MINUTES = int(os.getenv("EXPORT_SHARE_TTL_MINUTES", "60"))
+
+# Background export jobs and their result cache
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_QUEUE_MAX = int(os.getenv("EXPORT_QUEUE_MAX", "50"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(BASE_DIR, ".tmp", "exports"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+EXPORT_CACHE_MAX_AGE_HOURS = int(os.getenv("EXPORT_CACHE_MAX_AGE_HOURS", str(7 * 24)))
+EXPORT_JOB_TTL_HOURS = int(os.getenv("EXPORT_JOB_TTL_HOURS", "24"))
+# Each process beats its jobs every EXPORT_HEARTBEAT seconds. A job not beaten
+# for EXPORT_JOB_STALE seconds lost its process: if it was queued, another
+# process takes it over; if it was running, it is marked failed.
+EXPORT_HEARTBEAT = int(os.getenv("EXPORT_HEARTBEAT", "10"))
+EXPORT_JOB_STALE = int(os.getenv("EXPORT_JOB_STALE", "60"))
+
+# Export renderer: "browser" (headless Chromium, above) or "native" (Pillow,
+# no browser). Native PNGs are capped at NATIVE_MAX_PIXELS; native PDFs put
+# the board on one A3 page unless that shrinks it below NATIVE_PDF_MIN_SCALE,
+# in which case it is split across pages at full size.
+EXPORT_BACKEND = os.getenv("EXPORT_BACKEND", "browser")
+NATIVE_FONT = os.getenv("NATIVE_FONT", "DejaVuSans.ttf")
+NATIVE_FONT_BOLD = os.getenv("NATIVE_FONT_BOLD", "DejaVuSans-Bold.ttf")
+NATIVE_PNG_SCALE = float(os.getenv("NATIVE_PNG_SCALE", "1"))
+NATIVE_MAX_PIXELS = int(os.getenv("NATIVE_MAX_PIXELS", str(64 * 1024 * 1024)))
+NATIVE_PDF_DPI = int(os.getenv("NATIVE_PDF_DPI", "150"))
+NATIVE_PDF_MIN_SCALE = float(os.getenv("NATIVE_PDF_MIN_SCALE", "0.5"))
+
+# Bulk ZIP export: boards rendered at once per process, and boards per archive
+BULK_EXPORT_WORKERS = int(os.getenv("BULK_EXPORT_WORKERS", "4"))
+BULK_EXPORT_MAX_BOARDS = int(os.getenv("BULK_EXPORT_MAX_BOARDS", "500"))
+
+# IMAP ingestion worker (python -m tools.email_worker). It waits in IDLE and
+# wakes every IMAP_IDLE_CHECK seconds to beat its heartbeat and look for poll
+# requests; it re-issues IDLE every IMAP_IDLE_RENEW seconds (servers drop it
+# after 30 minutes) and rescans every IMAP_RESYNC_INTERVAL in case a
+# notification was missed. Without IDLE support it polls every
+# IMAP_POLL_INTERVAL. Failed connections retry after IMAP_BACKOFF_MIN seconds,
+# doubling up to IMAP_BACKOFF_MAX. The worker counts as down once its
+# heartbeat is older than IMAP_WORKER_STALE seconds.
+IMAP_TIMEOUT = int(os.getenv("IMAP_TIMEOUT", "60"))
+IMAP_IDLE_CHECK = int(os.getenv("IMAP_IDLE_CHECK", "5"))
+IMAP_IDLE_RENEW = int(os.getenv("IMAP_IDLE_RENEW", str(25 * 60)))
+IMAP_RESYNC_INTERVAL = int(os.getenv("IMAP_RESYNC_INTERVAL", "300"))
+IMAP_POLL_INTERVAL = int(os.getenv("IMAP_POLL_INTERVAL", "60"))
+IMAP_BACKOFF_MIN = float(os.getenv("IMAP_BACKOFF_MIN", "1"))
+IMAP_BACKOFF_MAX = float(os.getenv("IMAP_BACKOFF_MAX", "300"))
+IMAP_WORKER_STALE = int(os.getenv("IMAP_WORKER_STALE", "60"))
@@ -4,10 +4,12 @@ def register_blueprints(app):
     from routes.api import api_bp
     from routes.share_routes import share_bp
     from routes.email_routes import email_bp
+    from routes.file_routes import file_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(board_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(share_bp)
     app.register_blueprint(email_bp)
+    app.register_blueprint(file_bp)
 
@@ -1,23 +1,28 @@
+import json
 import uuid
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_login import login_required, current_user
-from tools import db
-from tools.file_handler import save_upload, get_file_url, get_thumb_url, is_image
+import config
+from tools import db, access, changelog, events, search
+from tools import board_previews, dashboard, blobs, thumbnails, uploads
+from tools.board_loader import load_board, load_window, board_bounds, first_card_position
+from tools.file_handler import save_upload, file_url, thumb_url, viewer_url, is_image
+from tools.revisions import bump_revision, board_etag, not_modified, with_etag
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+CARD_FIELDS = ("title", "body", "pos_x", "pos_y", "sort_order")
+
+# Extra canvas pixels loaded around a requested viewport
+WINDOW_MARGIN = 800
+WINDOW_MAX_MARGIN = 5000
+
 
 def _check_board_access(board_id):
     board = db.query_one("SELECT * FROM boards WHERE id = ?", (board_id,))
     if not board:
         return None
-    if board["owner_id"] == current_user.id:
-        return board
-    member = db.query_one(
-        "SELECT * FROM board_members WHERE board_id = ? AND user_id = ?",
-        (board_id, current_user.id),
-    )
-    return board if member else None
+    return board if access.can_access(current_user.id, board) else None
 
 
 # ── Cards ──────────────────────────────────────────────────
@@ -29,41 +34,98 @@ def get_cards(board_id):
     if not board:
         return jsonify({"error": "Access denied"}), 403
 
-    cards = db.query(
-        "SELECT * FROM cards WHERE board_id = ? ORDER BY sort_order, created_at",
-        (board_id,),
-    )
+    etag = board_etag(board, "cards")
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    for card in cards:
-        card["files"] = db.query(
-            "SELECT * FROM card_files WHERE card_id = ?", (card["id"],)
-        )
-        for f in card["files"]:
-            f["url"] = get_file_url(board_id, f["stored_name"])
-            f["thumb_url"] = get_thumb_url(board_id, f["stored_name"])
-            f["is_image"] = is_image(f["mime_type"])
-
-        tags = db.query(
-            """SELECT t.id, t.name FROM tags t
-               JOIN card_tags ct ON ct.tag_id = t.id
-               WHERE ct.card_id = ?""",
-            (card["id"],),
-        )
-        card["tags"] = tags
+    payload = load_board(board_id)
+    payload["view_mode"] = board["view_mode"]
+    payload["seq"] = changelog.latest_seq(board_id)
+    return with_etag(jsonify(payload), etag)
 
-        # Add email info if card is from email
-        if card.get("email_id"):
-            email = db.query_one(
-                "SELECT id, from_addr, subject, body_text FROM emails WHERE id = ?",
-                (card["email_id"],)
-            )
-            card["email"] = email
 
-    connections = db.query(
-        "SELECT * FROM connections WHERE board_id = ?", (board_id,)
+@api_bp.route("/boards/<board_id>/cards/window", methods=["GET"])
+@login_required
+def get_cards_window(board_id):
+    """Cards of a freeform board inside a bounding box (plus a margin).
+
+    Pass x1, y1, x2, y2 in canvas coordinates. Without them, a w x h box
+    centred on the board's first card is used and returned as `anchor`.
+    """
+    board = _check_board_access(board_id)
+    if not board:
+        return jsonify({"error": "Access denied"}), 403
+
+    args = request.args
+    margin = max(0, min(args.get("margin", WINDOW_MARGIN, type=float), WINDOW_MAX_MARGIN))
+    anchor = None
+    box = [args.get(k, type=float) for k in ("x1", "y1", "x2", "y2")]
+    if None in box:
+        w = args.get("w", 1400, type=float)
+        h = args.get("h", 900, type=float)
+        anchor = first_card_position(board_id) or {"pos_x": 0, "pos_y": 0}
+        cx, cy = anchor["pos_x"], anchor["pos_y"]
+        box = [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+    x1, y1, x2, y2 = box
+    if x2 < x1 or y2 < y1:
+        return jsonify({"error": "Invalid bounding box"}), 400
+    x1, y1, x2, y2 = x1 - margin, y1 - margin, x2 + margin, y2 + margin
+
+    payload = load_window(board_id, x1, y1, x2, y2)
+    payload.update({
+        "view_mode": board["view_mode"],
+        "seq": changelog.latest_seq(board_id),
+        "bbox": [x1, y1, x2, y2],
+        "bounds": board_bounds(board_id),
+        "anchor": anchor,
+    })
+    return jsonify(payload)
+
+
+@api_bp.route("/boards/<board_id>/changes", methods=["GET"])
+@login_required
+def get_changes(board_id):
+    board = _check_board_access(board_id)
+    if not board:
+        return jsonify({"error": "Access denied"}), 403
+
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a non-negative integer"}), 400
+
+    result = changelog.changes_since(board_id, since)
+    result["revision"] = board["revision"]
+    return jsonify(result)
+
+
+@api_bp.route("/boards/<board_id>/events", methods=["GET"])
+@login_required
+def board_events(board_id):
+    """Server-Sent Events stream of a board's change log."""
+    board = _check_board_access(board_id)
+    if not board:
+        return jsonify({"error": "Access denied"}), 403
+
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if since is None:
+        since = changelog.latest_seq(board_id)
+
+    try:
+        q = events.hub.subscribe(board_id)
+    except events.TooManySubscribers:
+        resp = jsonify({"error": "Too many live connections, try again later"})
+        resp.headers["Retry-After"] = "30"
+        return resp, 503
+
+    return Response(
+        events.stream(board_id, q, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    return jsonify({"cards": cards, "connections": connections, "view_mode": board["view_mode"]})
 
 @api_bp.route("/boards/<board_id>/cards", methods=["POST"])
 @login_required
@@ -78,22 +140,22 @@ def create_card(board_id):
     pos_x = data.get("pos_x", 100)
     pos_y = data.get("pos_y", 100)
 
-    max_order = db.query_one(
-        "SELECT COALESCE(MAX(sort_order), -1) as mx FROM cards WHERE board_id = ?",
-        (board_id,),
-    )
-    sort_order = (max_order["mx"] if max_order else -1) + 1
+    with db.transaction():
+        max_order = db.query_one(
+            "SELECT COALESCE(MAX(sort_order), -1) as mx FROM cards WHERE board_id = ?",
+            (board_id,),
+        )
+        sort_order = (max_order["mx"] if max_order else -1) + 1
 
-    db.execute(
-        """INSERT INTO cards (id, board_id, title, pos_x, pos_y, sort_order)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (card_id, board_id, title, pos_x, pos_y, sort_order),
-    )
-    db.execute(
-        "UPDATE boards SET updated_at = datetime('now') WHERE id = ?", (board_id,)
-    )
+        db.execute(
+            """INSERT INTO cards (id, board_id, title, pos_x, pos_y, sort_order)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (card_id, board_id, title, pos_x, pos_y, sort_order),
+        )
+        card = db.query_one("SELECT * FROM cards WHERE id = ?", (card_id,))
+        changelog.record(board_id, changelog.CARD, card_id, changelog.CREATE, card)
+        bump_revision(board_id)
 
-    card = db.query_one("SELECT * FROM cards WHERE id = ?", (card_id,))
     card["files"] = []
     card["tags"] = []
     return jsonify(card), 201
@@ -111,23 +173,69 @@ def update_card(card_id):
         return jsonify({"error": "Access denied"}), 403
 
     data = request.get_json() or {}
+    fields, params = _card_assignments(data)
+    if fields:
+        params.append(card_id)
+        with db.transaction():
+            db.execute(f"UPDATE cards SET {', '.join(fields)} WHERE id = ?", params)
+            changelog.record(card["board_id"], changelog.CARD, card_id, changelog.UPDATE,
+                             _card_changes(data))
+            bump_revision(card["board_id"])
+
+    return jsonify({"ok": True})
+
+
+@api_bp.route("/boards/<board_id>/cards", methods=["PATCH"])
+@login_required
+def update_cards(board_id):
+    """Apply many partial card updates (positions, order, titles) in one transaction."""
+    board = _check_board_access(board_id)
+    if not board:
+        return jsonify({"error": "Access denied"}), 403
+
+    data = request.get_json(silent=True)
+    updates = data.get("cards") if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not all(
+        isinstance(u, dict) and u.get("id") for u in updates
+    ):
+        return jsonify({"error": "Expected a list of card updates with ids"}), 400
+
+    updated = 0
+    with db.transaction() as conn:
+        for u in updates:
+            fields, params = _card_assignments(u)
+            if not fields:
+                continue
+            params.extend([u["id"], board_id])
+            cur = conn.execute(
+                f"UPDATE cards SET {', '.join(fields)} WHERE id = ? AND board_id = ?",
+                params,
+            )
+            if cur.rowcount:
+                updated += cur.rowcount
+                changelog.record(board_id, changelog.CARD, u["id"], changelog.UPDATE,
+                                 _card_changes(u))
+        if updated:
+            bump_revision(board_id)
+
+    return jsonify({"ok": True, "updated": updated})
+
+
+def _card_changes(data):
+    return {key: data[key] for key in CARD_FIELDS if key in data}
+
+
+def _card_assignments(data):
+    """SET clauses and params for the editable card fields present in `data`."""
     fields = []
     params = []
-    for key in ("title", "body", "pos_x", "pos_y", "sort_order"):
+    for key in CARD_FIELDS:
         if key in data:
             fields.append(f"{key} = ?")
             params.append(data[key])
-
     if fields:
         fields.append("updated_at = datetime('now')")
-        params.append(card_id)
-        db.execute(f"UPDATE cards SET {', '.join(fields)} WHERE id = ?", params)
-        db.execute(
-            "UPDATE boards SET updated_at = datetime('now') WHERE id = ?",
-            (card["board_id"],),
-        )
-
-    return jsonify({"ok": True})
+    return fields, params
 
 
 @api_bp.route("/cards/<card_id>", methods=["DELETE"])
@@ -140,7 +248,10 @@ def delete_card(card_id):
     if not board:
         return jsonify({"error": "Access denied"}), 403
 
-    db.execute("DELETE FROM cards WHERE id = ?", (card_id,))
+    with db.transaction():
+        db.execute("DELETE FROM cards WHERE id = ?", (card_id,))
+        changelog.record(card["board_id"], changelog.CARD, card_id, changelog.DELETE)
+        bump_revision(card["board_id"])
     return jsonify({"ok": True})
 
 
@@ -156,31 +267,149 @@ def upload_files(card_id):
     if not board:
         return jsonify({"error": "Access denied"}), 403
 
-    uploaded = []
-    for f in request.files.getlist("files"):
-        meta = save_upload(f, card["board_id"])
-        if meta:
+    uploaded = [meta for meta in map(save_upload, request.files.getlist("files")) if meta]
+    _attach_files(card, uploaded)
+    return jsonify({"files": uploaded}), 201
+
+
+def _attach_files(card, uploaded):
+    """Insert card_files rows for files already in the blob store."""
+    for meta in uploaded:
+        meta["url"] = file_url(meta)
+        meta["thumb_url"] = thumb_url(meta)
+        meta["viewer_url"] = viewer_url(meta)
+        meta["is_image"] = is_image(meta["mime_type"])
+    if not uploaded:
+        return
+    with db.transaction():
+        for meta in uploaded:
+            blobs.register(meta["blob_id"], meta["stored_name"], meta["file_size"])
             db.execute(
-                """INSERT INTO card_files (id, card_id, original_name, stored_name, mime_type, file_size)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (meta["id"], card_id, meta["original_name"], meta["stored_name"],
-                 meta["mime_type"], meta["file_size"]),
+                """INSERT INTO card_files
+                       (id, card_id, original_name, stored_name, mime_type, file_size, blob_id)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (meta["id"], card["id"], meta["original_name"], meta["stored_name"],
+                 meta["mime_type"], meta["file_size"], meta["blob_id"]),
             )
-            meta["url"] = get_file_url(card["board_id"], meta["stored_name"])
-            meta["thumb_url"] = get_thumb_url(card["board_id"], meta["stored_name"])
-            meta["is_image"] = is_image(meta["mime_type"])
-            uploaded.append(meta)
+            thumbnails.enqueue(meta["blob_id"])
+            changelog.record(card["board_id"], changelog.FILE, meta["id"], changelog.CREATE,
+                             dict(meta, card_id=card["id"]))
+        bump_revision(card["board_id"])
 
-    return jsonify({"files": uploaded}), 201
+
+# Chunked uploads: POST /cards/<id>/uploads with {"name", "size", "mime_type"},
+# then PUT each chunk's raw bytes to /uploads/<id>/chunks/<n> in order, then
+# POST /uploads/<id>/complete (optionally with {"sha256"}). GET /uploads/<id>
+# tells a client where to resume.
+
+def _session_json(session):
+    return {
+        "id": session["id"],
+        "card_id": session["card_id"],
+        "name": session["original_name"],
+        "size": session["total_size"],
+        "chunk_size": session["chunk_size"],
+        "next_chunk": session["next_chunk"],
+        "received_bytes": session["received_bytes"],
+    }
+
+
+def _upload_error(e):
+    return jsonify({"error": str(e), **e.extra}), e.status
+
+
+def _own_session(session_id):
+    session = uploads.get(session_id)
+    if not session or session["user_id"] != current_user.id:
+        return None
+    return session
+
+
+@api_bp.route("/cards/<card_id>/uploads", methods=["POST"])
+@login_required
+def create_upload(card_id):
+    card = db.query_one("SELECT * FROM cards WHERE id = ?", (card_id,))
+    if not card:
+        return jsonify({"error": "Not found"}), 404
+    if not _check_board_access(card["board_id"]):
+        return jsonify({"error": "Access denied"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        session = uploads.create(card_id, current_user.id, data.get("name", ""),
+                                 data.get("mime_type"), data.get("size"))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(_session_json(session)), 201
+
+
+@api_bp.route("/uploads/<session_id>", methods=["GET"])
+@login_required
+def get_upload(session_id):
+    session = _own_session(session_id)
+    if not session:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(_session_json(session))
+
+
+@api_bp.route("/uploads/<session_id>/chunks/<int:index>", methods=["PUT"])
+@login_required
+def put_upload_chunk(session_id, index):
+    session = _own_session(session_id)
+    if not session:
+        return jsonify({"error": "Not found"}), 404
+    try:
+        session = uploads.write_chunk(session, index, request.stream)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(_session_json(session))
+
+
+@api_bp.route("/uploads/<session_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(session_id):
+    session = _own_session(session_id)
+    if not session:
+        return jsonify({"error": "Not found"}), 404
+    card = db.query_one("SELECT * FROM cards WHERE id = ?", (session["card_id"],))
+    if not card or not _check_board_access(card["board_id"]):
+        return jsonify({"error": "Access denied"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        meta = uploads.finish(session, data.get("sha256"))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    _attach_files(card, [meta])
+    return jsonify({"file": meta}), 201
+
+
+@api_bp.route("/uploads/<session_id>", methods=["DELETE"])
+@login_required
+def abort_upload(session_id):
+    session = _own_session(session_id)
+    if not session:
+        return jsonify({"error": "Not found"}), 404
+    uploads.discard(session_id)
+    return jsonify({"ok": True})
 
 
 @api_bp.route("/files/<file_id>", methods=["DELETE"])
 @login_required
 def delete_file(file_id):
-    f = db.query_one("SELECT * FROM card_files WHERE id = ?", (file_id,))
+    f = db.query_one(
+        """SELECT cf.*, c.board_id FROM card_files cf
+           JOIN cards c ON c.id = cf.card_id
+           WHERE cf.id = ?""",
+        (file_id,),
+    )
     if not f:
         return jsonify({"error": "Not found"}), 404
-    db.execute("DELETE FROM card_files WHERE id = ?", (file_id,))
+    with db.transaction():
+        db.execute("DELETE FROM card_files WHERE id = ?", (file_id,))
+        changelog.record(f["board_id"], changelog.FILE, file_id, changelog.DELETE,
+                         {"card_id": f["card_id"]})
+        bump_revision(f["board_id"])
     return jsonify({"ok": True})
 
 
@@ -198,22 +427,26 @@ def add_tag(card_id):
     if not tag_name:
         return jsonify({"error": "Tag name required"}), 400
 
-    tag = db.query_one("SELECT * FROM tags WHERE name = ?", (tag_name,))
-    if not tag:
-        tag_id = str(uuid.uuid4())
-        db.execute("INSERT INTO tags (id, name) VALUES (?, ?)", (tag_id, tag_name))
-    else:
-        tag_id = tag["id"]
+    with db.transaction():
+        tag = db.query_one("SELECT * FROM tags WHERE name = ?", (tag_name,))
+        if not tag:
+            tag_id = str(uuid.uuid4())
+            db.execute("INSERT INTO tags (id, name) VALUES (?, ?)", (tag_id, tag_name))
+        else:
+            tag_id = tag["id"]
 
-    existing = db.query_one(
-        "SELECT * FROM card_tags WHERE card_id = ? AND tag_id = ?",
-        (card_id, tag_id),
-    )
-    if not existing:
-        db.execute(
-            "INSERT INTO card_tags (card_id, tag_id) VALUES (?, ?)",
+        existing = db.query_one(
+            "SELECT * FROM card_tags WHERE card_id = ? AND tag_id = ?",
             (card_id, tag_id),
         )
+        if not existing:
+            db.execute(
+                "INSERT INTO card_tags (card_id, tag_id) VALUES (?, ?)",
+                (card_id, tag_id),
+            )
+            changelog.record(card["board_id"], changelog.TAG, tag_id, changelog.CREATE,
+                             {"card_id": card_id, "id": tag_id, "name": tag_name})
+            bump_revision(card["board_id"])
 
     return jsonify({"id": tag_id, "name": tag_name}), 201
 
@@ -221,10 +454,18 @@ def add_tag(card_id):
 @api_bp.route("/cards/<card_id>/tags/<tag_id>", methods=["DELETE"])
 @login_required
 def remove_tag(card_id, tag_id):
-    db.execute(
-        "DELETE FROM card_tags WHERE card_id = ? AND tag_id = ?",
-        (card_id, tag_id),
-    )
+    card = db.query_one("SELECT board_id FROM cards WHERE id = ?", (card_id,))
+    if not card:
+        return jsonify({"error": "Not found"}), 404
+    with db.transaction() as conn:
+        cur = conn.execute(
+            "DELETE FROM card_tags WHERE card_id = ? AND tag_id = ?",
+            (card_id, tag_id),
+        )
+        if cur.rowcount:
+            changelog.record(card["board_id"], changelog.TAG, tag_id, changelog.DELETE,
+                             {"card_id": card_id})
+            bump_revision(card["board_id"])
     return jsonify({"ok": True})
 
 
@@ -244,39 +485,39 @@ def create_connection(board_id):
         return jsonify({"error": "Invalid connection"}), 400
 
     conn_id = str(uuid.uuid4())
-    db.execute(
-        """INSERT INTO connections (id, board_id, from_card_id, to_card_id)
-           VALUES (?, ?, ?, ?)""",
-        (conn_id, board_id, from_id, to_id),
-    )
+    with db.transaction():
+        db.execute(
+            """INSERT INTO connections (id, board_id, from_card_id, to_card_id)
+               VALUES (?, ?, ?, ?)""",
+            (conn_id, board_id, from_id, to_id),
+        )
+        connection = db.query_one("SELECT * FROM connections WHERE id = ?", (conn_id,))
+        changelog.record(board_id, changelog.CONNECTION, conn_id, changelog.CREATE, connection)
+        bump_revision(board_id)
     return jsonify({"id": conn_id, "from_card_id": from_id, "to_card_id": to_id}), 201
 
 
 @api_bp.route("/connections/<conn_id>", methods=["DELETE"])
 @login_required
 def delete_connection(conn_id):
-    db.execute("DELETE FROM connections WHERE id = ?", (conn_id,))
+    conn = db.query_one("SELECT board_id FROM connections WHERE id = ?", (conn_id,))
+    if not conn:
+        return jsonify({"error": "Not found"}), 404
+    with db.transaction():
+        db.execute("DELETE FROM connections WHERE id = ?", (conn_id,))
+        changelog.record(conn["board_id"], changelog.CONNECTION, conn_id, changelog.DELETE)
+        bump_revision(conn["board_id"])
     return jsonify({"ok": True})
 
 
 @api_bp.route("/search/tags", methods=["GET"])
 @login_required
 def search_tags_global():
-    q = request.args.get("q", "").strip().lower()
+    q = request.args.get("q", "").strip()
     if not q:
         return jsonify({"boards": []})
 
-    results = db.query(
-        """SELECT DISTINCT b.id, b.title
-           FROM boards b
-           JOIN cards c ON c.board_id = b.id
-           JOIN card_tags ct ON ct.card_id = c.id
-           JOIN tags t ON t.id = ct.tag_id
-           WHERE (b.owner_id = ? OR b.id IN (SELECT board_id FROM board_members WHERE user_id = ?))
-             AND LOWER(t.name) LIKE ?
-           ORDER BY b.updated_at DESC""",
-        (current_user.id, current_user.id, f"%{q}%"),
-    )
+    results = search.search_boards_by_tag(current_user.id, q)
     return jsonify({"boards": [{"id": r["id"], "title": r["title"]} for r in results]})
 
 
@@ -289,19 +530,12 @@ def search_cards(board_id):
     if not board:
         return jsonify({"error": "Access denied"}), 403
 
-    q = request.args.get("q", "").strip().lower()
+    q = request.args.get("q", "").strip()
     if not q:
-        return jsonify({"card_ids": []})
-
-    results = db.query(
-        """SELECT DISTINCT c.id FROM cards c
-           LEFT JOIN card_tags ct ON ct.card_id = c.id
-           LEFT JOIN tags t ON t.id = ct.tag_id
-           WHERE c.board_id = ?
-             AND (LOWER(c.title) LIKE ? OR LOWER(t.name) LIKE ?)""",
-        (board_id, f"%{q}%", f"%{q}%"),
-    )
-    return jsonify({"card_ids": [r["id"] for r in results]})
+        return jsonify({"card_ids": [], "results": []})
+
+    results = search.search_board(board_id, q)
+    return jsonify({"card_ids": [r["id"] for r in results], "results": results})
 
 
 @api_bp.route("/boards/<board_id>/images", methods=["GET"])
@@ -311,20 +545,66 @@ def get_board_images(board_id):
     if not board:
         return jsonify({"error": "Access denied"}), 403
 
-    images = db.query(
-        """SELECT cf.* FROM card_files cf
-           JOIN cards c ON c.id = cf.card_id
-           WHERE c.board_id = ?
-             AND cf.mime_type LIKE 'image/%'
-           ORDER BY cf.uploaded_at DESC
-           LIMIT 6""",
-        (board_id,),
+    images = board_previews.latest_images([board])[board_id]
+    return jsonify({"images": images})
+
+
+@api_bp.route("/boards", methods=["GET"])
+@login_required
+def list_boards():
+    """A page of visible boards, filtered by facets, with facet counts.
+
+    Query args: sales_team, customer, brand_site, category, cursor, limit.
+    """
+    filters = dashboard.parse_filters(request.args)
+    page = dashboard.list_boards(
+        current_user.id, filters,
+        cursor=request.args.get("cursor"),
+        limit=dashboard.page_size(request.args.get("limit")),
     )
+    page["filters"] = filters
+    page["facets"] = dashboard.facet_counts(current_user.id, filters)
+    return jsonify(page)
 
-    for img in images:
-        img["thumb_url"] = get_thumb_url(board_id, img["stored_name"])
 
-    return jsonify({"images": images})
+# Cap on board ids per request; the dashboard sends at most one page of boards
+MAX_PREVIEW_BOARDS = 500
+
+
+@api_bp.route("/boards/images", methods=["POST"])
+@login_required
+def get_boards_images():
+    """Latest image thumbnails for many boards in one request.
+
+    Body: {"board_ids": [...]}. Boards the user can't see are left out.
+    """
+    data = request.get_json(silent=True) or {}
+    board_ids = data.get("board_ids")
+    if not isinstance(board_ids, list) or len(board_ids) > MAX_PREVIEW_BOARDS:
+        return jsonify({"error": f"board_ids must be a list of at most {MAX_PREVIEW_BOARDS}"}), 400
+
+    visible = access.visible_board_ids(current_user.id)
+    wanted = [b for b in dict.fromkeys(board_ids) if b in visible]
+    boards = db.query(
+        """SELECT id, revision, image_count FROM boards
+           WHERE id IN (SELECT value FROM json_each(?))""",
+        (json.dumps(wanted),),
+    )
+    return jsonify({"boards": board_previews.latest_images(boards)})
+
+
+@api_bp.route("/stats/caches", methods=["GET"])
+@login_required
+def cache_stats():
+    """Hit/miss counters for this worker's in-process caches. Admins (ADMIN_EMAILS) only."""
+    if current_user.email.lower() not in config.ADMIN_EMAILS:
+        return jsonify({"error": "Not found"}), 404
+    from tools.auth import user_cache_stats
+    return jsonify({
+        "users": user_cache_stats(),
+        "access": access.stats(),
+        "board_previews": board_previews.stats(),
+    })
 
 
 @api_bp.route("/boards/<board_id>", methods=["GET"])
@@ -333,4 +613,9 @@ def get_board(board_id):
     board = _check_board_access(board_id)
     if not board:
         return jsonify({"error": "Access denied"}), 403
-    return jsonify(dict(board))
+
+    etag = board_etag(board, "board")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify(dict(board)), etag)
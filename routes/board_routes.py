@@ -1,7 +1,8 @@
 import uuid
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from tools import db
+from tools import db, access, changelog, dashboard as board_list
+from tools.revisions import bump_revision
 
 board_bp = Blueprint("board", __name__)
 
@@ -9,22 +10,22 @@ board_bp = Blueprint("board", __name__)
 @board_bp.route("/")
 @login_required
 def dashboard():
-    boards = db.query(
-        """SELECT b.*, COUNT(c.id) as card_count
-           FROM boards b
-           LEFT JOIN cards c ON c.board_id = b.id
-           WHERE b.owner_id = ?
-              OR b.id IN (SELECT board_id FROM board_members WHERE user_id = ?)
-           GROUP BY b.id
-           ORDER BY b.updated_at DESC""",
-        (current_user.id, current_user.id),
+    filters = board_list.parse_filters(request.args)
+    page = board_list.list_boards(
+        current_user.id, filters,
+        cursor=request.args.get("cursor"),
+        limit=board_list.page_size(request.args.get("limit")),
     )
     pending_emails = db.query_one(
         "SELECT COUNT(*) as cnt FROM emails WHERE processed = 0"
     )
     return render_template(
         "dashboard.html",
-        boards=boards,
+        boards=page["boards"],
+        next_cursor=page["next_cursor"],
+        paged=bool(request.args.get("cursor")),
+        filters=filters,
+        facets=board_list.facet_counts(current_user.id, filters),
         pending_email_count=pending_emails["cnt"] if pending_emails else 0,
     )
 
@@ -48,6 +49,7 @@ def create_board():
            VALUES (?, ?, ?, ?, ?, ?, ?)""",
         (board_id, title, current_user.id, sales_team, customer, brand_site, category),
     )
+    access.invalidate_user(current_user.id)
     return redirect(url_for("board.view_board", board_id=board_id))
 
 
@@ -58,16 +60,10 @@ def view_board(board_id):
     if not board:
         flash("Board not found.", "error")
         return redirect(url_for("board.dashboard"))
-    # Check access
-    if board["owner_id"] != current_user.id:
-        member = db.query_one(
-            "SELECT * FROM board_members WHERE board_id = ? AND user_id = ?",
-            (board_id, current_user.id),
-        )
-        if not member:
-            flash("Access denied.", "error")
-            return redirect(url_for("board.dashboard"))
-    return render_template("board.html", board=board)
+    if not access.can_access(current_user.id, board):
+        flash("Access denied.", "error")
+        return redirect(url_for("board.dashboard"))
+    return render_template("board.html", board=board, card_count=board["card_count"])
 
 
 @board_bp.route("/boards/<board_id>/delete", methods=["POST"])
@@ -78,13 +74,14 @@ def delete_board(board_id):
         flash("Cannot delete this board.", "error")
         return redirect(url_for("board.dashboard"))
 
-    # Simple delete - CASCADE should handle related data
+    # Emails keep their history but let go of the board, so the delete can
+    # cascade to cards and their files (and release the files' blobs).
     operations = [
-        ("PRAGMA foreign_keys = OFF", ()),
+        ("UPDATE emails SET board_id = NULL WHERE board_id = ?", (board_id,)),
         ("DELETE FROM boards WHERE id = ?", (board_id,)),
-        ("PRAGMA foreign_keys = ON", ()),
     ]
     db.execute_many(operations)
+    access.invalidate_board(board_id)
 
     flash("Board deleted.", "success")
     return redirect(url_for("board.dashboard"))
@@ -102,10 +99,14 @@ def update_board(board_id):
     view_mode = request.form.get("view_mode", board["view_mode"])
     if view_mode not in ("flowchart", "freeform"):
         view_mode = board["view_mode"]
-    db.execute(
-        "UPDATE boards SET title = ?, view_mode = ?, updated_at = datetime('now') WHERE id = ?",
-        (title, view_mode, board_id),
-    )
+    with db.transaction():
+        db.execute(
+            "UPDATE boards SET title = ?, view_mode = ? WHERE id = ?",
+            (title, view_mode, board_id),
+        )
+        changelog.record(board_id, changelog.BOARD, board_id, changelog.UPDATE,
+                         {"title": title, "view_mode": view_mode})
+        bump_revision(board_id)
     # If called via JS (no redirect needed), return JSON
     if request.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
         from flask import jsonify
@@ -131,11 +132,17 @@ def edit_board(board_id):
         flash("Board title is required.", "error")
         return redirect(url_for("board.dashboard"))
 
-    db.execute(
-        """UPDATE boards SET title = ?, sales_team = ?, customer = ?, brand_site = ?, category = ?, updated_at = datetime('now')
-           WHERE id = ?""",
-        (title, sales_team, customer, brand_site, category, board_id),
-    )
+    with db.transaction():
+        db.execute(
+            """UPDATE boards SET title = ?, sales_team = ?, customer = ?, brand_site = ?, category = ?
+               WHERE id = ?""",
+            (title, sales_team, customer, brand_site, category, board_id),
+        )
+        changelog.record(board_id, changelog.BOARD, board_id, changelog.UPDATE, {
+            "title": title, "sales_team": sales_team, "customer": customer,
+            "brand_site": brand_site, "category": category,
+        })
+        bump_revision(board_id)
 
     flash("Board updated successfully.", "success")
     return redirect(url_for("board.dashboard"))
@@ -1,7 +1,8 @@
 import uuid
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from tools import db
+from tools import db, access, changelog, blobs, email_worker
+from tools.revisions import bump_revision
 
 email_bp = Blueprint("email", __name__)
 
@@ -28,10 +29,9 @@ def email_detail(email_id):
     )
     boards = db.query(
         """SELECT * FROM boards
-           WHERE owner_id = ?
-              OR id IN (SELECT board_id FROM board_members WHERE user_id = ?)
+           WHERE id IN (SELECT value FROM json_each(?))
            ORDER BY updated_at DESC""",
-        (current_user.id, current_user.id),
+        (access.visible_board_ids_json(current_user.id),),
     )
     return render_template(
         "email_detail.html", email=em, attachments=attachments, boards=boards
@@ -55,50 +55,63 @@ def assign_email(email_id):
             "INSERT INTO boards (id, title, owner_id) VALUES (?, ?, ?)",
             (board_id, new_board_title.strip(), current_user.id),
         )
+        access.invalidate_user(current_user.id)
     elif not board_id:
         flash("Select a board or create a new one.", "error")
         return redirect(url_for("email.email_detail", email_id=email_id))
 
     # Create a card from the email
-    import os, shutil, config
-    from tools.file_handler import get_board_upload_dir
+    from tools import thumbnails
+    from tools.file_handler import file_url, thumb_url, viewer_url, is_image
 
-    max_order = db.query_one(
-        "SELECT COALESCE(MAX(sort_order), -1) as mx FROM cards WHERE board_id = ?",
-        (board_id,),
-    )
-    sort_order = (max_order["mx"] if max_order else -1) + 1
+    # The card, its files and their change-log entries commit together
+    with db.transaction():
+        attachments = db.query(
+            "SELECT * FROM email_attachments WHERE email_id = ?", (email_id,)
+        )
+        attachments = [att for att in attachments
+                       if att["blob_id"] or blobs.migrate_attachment(att)]
 
-    card_id = str(uuid.uuid4())
-    db.execute(
-        """INSERT INTO cards (id, board_id, title, body, sort_order, email_id)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (card_id, board_id, em["subject"], em["body_text"][:500], sort_order, email_id),
-    )
+        max_order = db.query_one(
+            "SELECT COALESCE(MAX(sort_order), -1) as mx FROM cards WHERE board_id = ?",
+            (board_id,),
+        )
+        sort_order = (max_order["mx"] if max_order else -1) + 1
 
-    # Move attachments to board uploads
-    attachments = db.query(
-        "SELECT * FROM email_attachments WHERE email_id = ?", (email_id,)
-    )
-    upload_dir = get_board_upload_dir(board_id)
-    for att in attachments:
-        src = os.path.join(config.EMAIL_ATTACH_DIR, att["stored_name"])
-        if os.path.exists(src):
-            dst = os.path.join(upload_dir, att["stored_name"])
-            shutil.copy2(src, dst)
+        card_id = str(uuid.uuid4())
+        db.execute(
+            """INSERT INTO cards (id, board_id, title, body, sort_order, email_id)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (card_id, board_id, em["subject"], em["body_text"][:500], sort_order, email_id),
+        )
+        card = db.query_one("SELECT * FROM cards WHERE id = ?", (card_id,))
+        card["email"] = {k: em[k] for k in ("id", "from_addr", "subject", "body_text")}
+        changelog.record(board_id, changelog.CARD, card_id, changelog.CREATE, card)
+
+        # Attach the email's files to the card; both rows share the stored blob
+        for att in attachments:
             file_id = str(uuid.uuid4())
             db.execute(
-                """INSERT INTO card_files (id, card_id, original_name, stored_name, mime_type, file_size)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
+                """INSERT INTO card_files
+                       (id, card_id, original_name, stored_name, mime_type, file_size, blob_id)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
                 (file_id, card_id, att["original_name"], att["stored_name"],
-                 att["mime_type"], att["file_size"]),
+                 att["mime_type"], att["file_size"], att["blob_id"]),
             )
-
-    # Mark email as processed
-    db.execute(
-        "UPDATE emails SET processed = 1, board_id = ? WHERE id = ?",
-        (board_id, email_id),
-    )
+            f = db.query_one("SELECT * FROM card_files WHERE id = ?", (file_id,))
+            f["url"] = file_url(f)
+            f["thumb_url"] = thumb_url(f)
+            f["viewer_url"] = viewer_url(f)
+            f["is_image"] = is_image(f["mime_type"])
+            changelog.record(board_id, changelog.FILE, file_id, changelog.CREATE, f)
+            thumbnails.enqueue(att["blob_id"])
+
+        # Mark email as processed
+        db.execute(
+            "UPDATE emails SET processed = 1, board_id = ? WHERE id = ?",
+            (board_id, email_id),
+        )
+        bump_revision(board_id)
 
     flash("Email assigned to board.", "success")
     return redirect(url_for("board.view_board", board_id=board_id))
@@ -115,9 +128,21 @@ def ignore_email(email_id):
 @email_bp.route("/emails/poll", methods=["POST"])
 @login_required
 def poll_now():
-    try:
-        from tools.email_poller import poll
-        count = poll()
-        return jsonify({"ok": True, "fetched": count})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """Ask the ingestion worker (tools/email_worker) to check for mail now.
+
+    Mail is fetched by the worker, never by the web tier; this only flags
+    the request and reports whether a worker is running to pick it up.
+    """
+    email_worker.request_poll()
+    worker = email_worker.status()
+    if not worker["healthy"]:
+        return jsonify({"error": "The email worker is not running", "worker": worker}), 503
+    return jsonify({"ok": True, "requested": True, "worker": worker}), 202
+
+
+@email_bp.route("/emails/worker", methods=["GET"])
+@login_required
+def worker_status():
+    """Health and lag of the ingestion worker; 503 while it is down."""
+    worker = email_worker.status()
+    return jsonify(worker), 200 if worker["healthy"] else 503
@@ -0,0 +1,205 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Blueprint, Response, send_file, abort, render_template, request
+from flask_login import login_required, current_user
+import config
+from tools import db, access, blobs, tiles
+from tools.file_handler import thumb_widths, tiles_url
+
+file_bp = Blueprint("files", __name__)
+
+
+def _card_file(file_id):
+    f = db.query_one(
+        """SELECT cf.*, c.board_id, b.created_at AS blob_created_at,
+                  b.image_width, b.image_height, b.tile_size
+           FROM card_files cf
+           JOIN cards c ON c.id = cf.card_id
+           LEFT JOIN blobs b ON b.sha256 = cf.blob_id
+           WHERE cf.id = ?""",
+        (file_id,),
+    )
+    if not f:
+        abort(404)
+    return f
+
+
+def _member_file(file_id):
+    f = _card_file(file_id)
+    board = db.query_one("SELECT id, owner_id FROM boards WHERE id = ?", (f["board_id"],))
+    if not board or not access.can_access(current_user.id, board):
+        abort(404)
+    return f
+
+
+def _shared_file(share_id, file_id):
+    f = _card_file(file_id)
+    share = db.query_one(
+        """SELECT 1 FROM shares
+           WHERE id = ? AND board_id = ? AND is_active = 1
+             AND (expires_at IS NULL OR expires_at > datetime('now'))""",
+        (share_id, f["board_id"]),
+    )
+    if not share:
+        abort(404)
+    return f
+
+
+def _original(f):
+    """Path and validator for a card file's content."""
+    if f["blob_id"]:
+        return blobs.blob_path(f["stored_name"]), f["blob_id"]
+    return os.path.join(config.UPLOAD_DIR, f["board_id"], f["stored_name"]), f["stored_name"]
+
+
+def _thumbnail(f, variant):
+    """Path and validator for a thumbnail variant such as "300.webp" or "300.png"."""
+    if f["thumb_state"] != "ready":
+        abort(404)
+    if not f["blob_id"]:
+        path = os.path.join(config.UPLOAD_DIR, f["board_id"], "thumbs", f["stored_name"])
+        return path, f"{f['stored_name']}.thumb"
+    width, _, ext = variant.partition(".")
+    if not width.isdigit() or int(width) not in thumb_widths(f):
+        abort(404)
+    webp = ext == "webp"
+    if not webp and f".{ext}" != os.path.splitext(f["stored_name"])[1]:
+        abort(404)
+    return blobs.thumb_path(f["stored_name"], int(width), webp), f"{f['blob_id']}.{variant}"
+
+
+def _tile(f, level, name):
+    """Path and validator for one Deep Zoom tile."""
+    if f["tile_state"] != "ready":
+        abort(404)
+    path = tiles.tile_path(f, level, name)
+    if path is None:
+        abort(404)
+    return path, f"{f['blob_id']}.{level}.{name}"
+
+
+def _dzi(f, public=False):
+    if f["tile_state"] != "ready":
+        abort(404)
+    resp = Response(tiles.dzi(f), mimetype="application/xml")
+    resp.set_etag(f"{f['blob_id']}.dzi")
+    resp.headers["Cache-Control"] = (f"{'public' if public else 'private'}, "
+                                     f"max-age={config.FILE_CACHE_MAX_AGE}, immutable")
+    return resp.make_conditional(request)
+
+
+def _viewer(f, share_id=None):
+    if f["tile_state"] != "ready":
+        abort(404)
+    return render_template("image_viewer.html", file=f, dzi_url=tiles_url(f, share_id))
+
+
+def _send(f, path, etag, public=False, download_name=None):
+    """Send a stored file with long-lived caching, validators and Range support.
+
+    Content never changes under a URL, so clients may cache it for
+    FILE_CACHE_MAX_AGE without revalidating. Shared-link files may also be
+    kept by proxies.
+    """
+    if not os.path.isfile(path):
+        abort(404)
+    cache_control = (f"{'public' if public else 'private'}, "
+                     f"max-age={config.FILE_CACHE_MAX_AGE}, immutable")
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if config.FILE_SENDFILE == "x-accel":
+        rel = os.path.relpath(path, config.UPLOAD_DIR).replace(os.sep, "/")
+        resp = Response(status=200, mimetype=mimetype)
+        resp.headers["X-Accel-Redirect"] = config.FILE_ACCEL_PREFIX.rstrip("/") + "/" + rel
+        resp.set_etag(etag)
+    else:
+        # With USE_X_SENDFILE set (FILE_SENDFILE = "x-sendfile") this only
+        # emits headers and leaves the body to the front-end server.
+        resp = send_file(
+            path,
+            mimetype=mimetype,
+            download_name=download_name or os.path.basename(path),
+            conditional=True,
+            etag=etag,
+            last_modified=_last_modified(f, path),
+        )
+    resp.headers["Cache-Control"] = cache_control
+    resp.headers["X-Content-Type-Options"] = "nosniff"
+    if mimetype == "image/svg+xml":
+        # SVG can carry script; never let it run in our origin
+        resp.headers["Content-Security-Policy"] = "sandbox; default-src 'none'; style-src 'unsafe-inline'"
+    return resp
+
+
+def _last_modified(f, path):
+    if f.get("blob_created_at"):
+        return datetime.strptime(f["blob_created_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return os.path.getmtime(path)
+
+
+@file_bp.route("/files/<file_id>")
+@login_required
+def serve_file(file_id):
+    f = _member_file(file_id)
+    path, etag = _original(f)
+    return _send(f, path, etag, download_name=f["original_name"])
+
+
+@file_bp.route("/files/<file_id>/thumb/<variant>")
+@login_required
+def serve_thumb(file_id, variant):
+    f = _member_file(file_id)
+    path, etag = _thumbnail(f, variant)
+    return _send(f, path, etag)
+
+
+@file_bp.route("/s/<share_id>/files/<file_id>")
+def serve_shared_file(share_id, file_id):
+    f = _shared_file(share_id, file_id)
+    path, etag = _original(f)
+    return _send(f, path, etag, public=True, download_name=f["original_name"])
+
+
+@file_bp.route("/s/<share_id>/files/<file_id>/thumb/<variant>")
+def serve_shared_thumb(share_id, file_id, variant):
+    f = _shared_file(share_id, file_id)
+    path, etag = _thumbnail(f, variant)
+    return _send(f, path, etag, public=True)
+
+
+@file_bp.route("/files/<file_id>/view")
+@login_required
+def view_tiled(file_id):
+    return _viewer(_member_file(file_id))
+
+
+@file_bp.route("/files/<file_id>/tiles.dzi")
+@login_required
+def serve_dzi(file_id):
+    return _dzi(_member_file(file_id))
+
+
+@file_bp.route("/files/<file_id>/tiles_files/<int:level>/<name>")
+@login_required
+def serve_tile(file_id, level, name):
+    f = _member_file(file_id)
+    path, etag = _tile(f, level, name)
+    return _send(f, path, etag)
+
+
+@file_bp.route("/s/<share_id>/files/<file_id>/view")
+def view_shared_tiled(share_id, file_id):
+    return _viewer(_shared_file(share_id, file_id), share_id)
+
+
+@file_bp.route("/s/<share_id>/files/<file_id>/tiles.dzi")
+def serve_shared_dzi(share_id, file_id):
+    return _dzi(_shared_file(share_id, file_id), public=True)
+
+
+@file_bp.route("/s/<share_id>/files/<file_id>/tiles_files/<int:level>/<name>")
+def serve_shared_tile(share_id, file_id, level, name):
+    f = _shared_file(share_id, file_id)
+    path, etag = _tile(f, level, name)
+    return _send(f, path, etag, public=True)
@@ -1,8 +1,10 @@
 import uuid
-from flask import Blueprint, request, jsonify, render_template, send_file
+from flask import (Blueprint, Response, request, jsonify, render_template, send_file, abort,
+                   redirect, url_for, stream_with_context)
 from flask_login import login_required, current_user
-from tools import db
-from tools.file_handler import get_file_url, get_thumb_url, is_image
+from tools import db, access, export_jobs, bulk_export
+from tools.board_loader import load_board
+from tools.revisions import board_etag, not_modified, with_etag
 
 share_bp = Blueprint("share", __name__)
 
@@ -28,7 +30,9 @@ def revoke_share(share_id):
 @share_bp.route("/s/<share_id>")
 def public_board(share_id):
     share = db.query_one(
-        "SELECT * FROM shares WHERE id = ? AND is_active = 1", (share_id,)
+        """SELECT * FROM shares
+           WHERE id = ? AND is_active = 1 AND (expires_at IS NULL OR expires_at > datetime('now'))""",
+        (share_id,),
     )
     if not share:
         return "Link expired or invalid.", 404
@@ -37,62 +41,130 @@ def public_board(share_id):
     if not board:
         return "Board not found.", 404
 
-    cards = db.query(
-        "SELECT * FROM cards WHERE board_id = ? ORDER BY sort_order, created_at",
-        (board["id"],),
-    )
-    for card in cards:
-        card["files"] = db.query(
-            "SELECT * FROM card_files WHERE card_id = ?", (card["id"],)
-        )
-        for f in card["files"]:
-            f["url"] = get_file_url(board["id"], f["stored_name"])
-            f["thumb_url"] = get_thumb_url(board["id"], f["stored_name"])
-            f["is_image"] = is_image(f["mime_type"])
-        card["tags"] = db.query(
-            """SELECT t.id, t.name FROM tags t
-               JOIN card_tags ct ON ct.tag_id = t.id
-               WHERE ct.card_id = ?""",
-            (card["id"],),
-        )
-
-    connections = db.query(
-        "SELECT * FROM connections WHERE board_id = ?", (board["id"],)
-    )
+    etag = board_etag(board, "public")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    payload = load_board(board["id"], include_email=False, share_id=share_id)
 
-    return render_template(
+    return with_etag(render_template(
         "board_public.html",
         board=board,
-        cards=cards,
-        connections=connections,
+        cards=payload["cards"],
+        connections=payload["connections"],
+    ), etag)
+
+
+def _accessible_board(board_id):
+    board = db.query_one("SELECT * FROM boards WHERE id = ?", (board_id,))
+    if not board or not access.can_access(current_user.id, board):
+        abort(404)
+    return board
+
+
+def _job_json(job):
+    data = {
+        "id": job["id"],
+        "board_id": job["board_id"],
+        "revision": job["revision"],
+        "format": job["format"],
+        "state": job["state"],
+        "error": job["error"],
+        "status_url": url_for("share.export_status", job_id=job["id"]),
+    }
+    if job["state"] == "done" and not job["email_to"]:
+        data["download_url"] = url_for("share.export_download", job_id=job["id"])
+    return data
+
+
+def _submit_export(board_id, fmt, email_to=None):
+    board = _accessible_board(board_id)
+    return export_jobs.submit(board, fmt, current_user.id, email_to)
+
+
+def _export_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+@share_bp.route("/boards/<board_id>/exports", methods=["POST"])
+@login_required
+def submit_export(board_id):
+    fmt = (request.get_json(silent=True) or {}).get("format", "png")
+    try:
+        job = _submit_export(board_id, fmt)
+    except export_jobs.ExportError as e:
+        return _export_error(e)
+    data = _job_json(job)
+    return jsonify(data), 200 if job["state"] == "done" else 202, {"Location": data["status_url"]}
+
+
+@share_bp.route("/exports/<job_id>")
+@login_required
+def export_status(job_id):
+    job = export_jobs.get(job_id)
+    if not job:
+        abort(404)
+    _accessible_board(job["board_id"])
+    return jsonify(_job_json(job))
+
+
+@share_bp.route("/exports/<job_id>/download")
+@login_required
+def export_download(job_id):
+    job = export_jobs.get(job_id)
+    if not job:
+        abort(404)
+    board = _accessible_board(job["board_id"])
+    if job["state"] != "done":
+        return jsonify(_job_json(job)), 409
+    path = export_jobs.result(job)
+    if path is None:
+        return jsonify({"error": "Export has expired; submit it again"}), 410
+    return send_file(path, as_attachment=True,
+                     download_name=export_jobs.download_name(board, job["format"]))
+
+
+@share_bp.route("/exports/bulk", methods=["POST"])
+@login_required
+def export_bulk():
+    """Stream one ZIP holding many boards' renderings, JSON snapshots and uploads.
+
+    Body: {"board_ids": [...]} or facet filters such as {"customer": ...},
+    plus an optional "format" (png or pdf). Boards the user can't see are
+    left out.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        filters = bulk_export.parse_filters(data)
+        boards = bulk_export.select_boards(current_user.id, filters, data.get("board_ids"))
+        if not boards:
+            return jsonify({"error": "No boards to export"}), 404
+        chunks = bulk_export.stream(boards, data.get("format", "pdf"), current_user.id)
+    except export_jobs.ExportError as e:
+        return _export_error(e)
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{bulk_export.archive_name(filters)}"'},
     )
 
 
 @share_bp.route("/boards/<board_id>/export", methods=["GET", "POST"])
 @login_required
 def export_board(board_id):
+    """Older single-call export: downloads at once if cached, else queues a job."""
     fmt = request.args.get("format", "png")
     if request.is_json:
         fmt = request.json.get("format", "png")
-    # Find or create a share link for export
-    share = db.query_one(
-        "SELECT * FROM shares WHERE board_id = ? AND is_active = 1", (board_id,)
-    )
-    if not share:
-        share_id = str(uuid.uuid4())
-        db.execute(
-            "INSERT INTO shares (id, board_id, created_by) VALUES (?, ?, ?)",
-            (share_id, board_id, current_user.id),
-        )
-    else:
-        share_id = share["id"]
-
     try:
-        from tools.export_board import export_board as do_export
-        path = do_export(share_id, fmt)
-        return send_file(path, as_attachment=True)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        job = _submit_export(board_id, fmt)
+    except export_jobs.ExportError as e:
+        return _export_error(e)
+    data = _job_json(job)
+    if job["state"] == "done":
+        return redirect(data["download_url"])
+    return jsonify(data), 202, {"Location": data["status_url"]}
 
 
 @share_bp.route("/boards/<board_id>/send", methods=["POST"])
@@ -103,33 +175,9 @@ def send_board(board_id):
     if not to_addr:
         return jsonify({"error": "Recipient email required"}), 400
 
-    board = db.query_one("SELECT * FROM boards WHERE id = ?", (board_id,))
-    if not board:
-        return jsonify({"error": "Board not found"}), 404
-
-    # Export first
-    share = db.query_one(
-        "SELECT * FROM shares WHERE board_id = ? AND is_active = 1", (board_id,)
-    )
-    if not share:
-        share_id = str(uuid.uuid4())
-        db.execute(
-            "INSERT INTO shares (id, board_id, created_by) VALUES (?, ?, ?)",
-            (share_id, board_id, current_user.id),
-        )
-    else:
-        share_id = share["id"]
-
+    # Rendered and mailed by the export workers
     try:
-        from tools.export_board import export_board as do_export
-        from tools.email_sender import send_board_email
-        path = do_export(share_id, "pdf")
-        send_board_email(
-            to_addr,
-            f"Board: {board['title']}",
-            f"Please find the board '{board['title']}' attached.",
-            path,
-        )
-        return jsonify({"ok": True})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        job = _submit_export(board_id, "pdf", email_to=to_addr)
+    except export_jobs.ExportError as e:
+        return _export_error(e)
+    return jsonify({"ok": True, "job": _job_json(job)}), 202
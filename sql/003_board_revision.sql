@@ -0,0 +1,2 @@
+-- Monotonic per-board revision, bumped with every change to the board's content
+ALTER TABLE boards ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,16 @@
+-- Per-board change log for delta sync
+CREATE TABLE IF NOT EXISTS board_changes (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    board_id    TEXT NOT NULL REFERENCES boards(id) ON DELETE CASCADE,
+    entity      TEXT NOT NULL,
+    entity_id   TEXT NOT NULL,
+    op          TEXT NOT NULL,
+    data        TEXT,
+    created_at  TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_board_changes_board_seq ON board_changes(board_id, seq);
+CREATE INDEX IF NOT EXISTS idx_board_changes_created ON board_changes(created_at);
+
+-- Highest seq removed by compaction; clients behind it must reload the board
+ALTER TABLE boards ADD COLUMN change_floor INTEGER NOT NULL DEFAULT 0;
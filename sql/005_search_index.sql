@@ -0,0 +1,96 @@
+-- Full-text search over card titles/bodies, tag names and email subjects/bodies.
+-- search_docs gives every indexed row a stable integer id, used as the rowid of
+-- search_fts; triggers below keep both in sync with the source tables.
+
+-- Cards created from emails link back to them (added by hand on older databases)
+ALTER TABLE cards ADD COLUMN email_id TEXT REFERENCES emails(id);
+
+CREATE TABLE IF NOT EXISTS search_docs (
+    doc_id    INTEGER PRIMARY KEY,
+    kind      TEXT NOT NULL,
+    ref_id    TEXT NOT NULL,
+    board_id  TEXT,
+    UNIQUE (kind, ref_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_docs_board ON search_docs(board_id, kind);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    title,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE INDEX IF NOT EXISTS idx_cards_email ON cards(email_id);
+
+-- Cards
+CREATE TRIGGER IF NOT EXISTS search_cards_ai AFTER INSERT ON cards BEGIN
+    INSERT INTO search_docs (kind, ref_id, board_id) VALUES ('card', new.id, new.board_id);
+    INSERT INTO search_fts (rowid, title, body)
+        VALUES ((SELECT doc_id FROM search_docs WHERE kind = 'card' AND ref_id = new.id),
+                new.title, COALESCE(new.body, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_cards_au AFTER UPDATE OF title, body ON cards BEGIN
+    UPDATE search_fts SET title = new.title, body = COALESCE(new.body, '')
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'card' AND ref_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_cards_ad AFTER DELETE ON cards BEGIN
+    DELETE FROM search_fts
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'card' AND ref_id = old.id);
+    DELETE FROM search_docs WHERE kind = 'card' AND ref_id = old.id;
+END;
+
+-- Tags
+CREATE TRIGGER IF NOT EXISTS search_tags_ai AFTER INSERT ON tags BEGIN
+    INSERT INTO search_docs (kind, ref_id) VALUES ('tag', new.id);
+    INSERT INTO search_fts (rowid, title, body)
+        VALUES ((SELECT doc_id FROM search_docs WHERE kind = 'tag' AND ref_id = new.id),
+                new.name, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_tags_au AFTER UPDATE OF name ON tags BEGIN
+    UPDATE search_fts SET title = new.name
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'tag' AND ref_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_tags_ad AFTER DELETE ON tags BEGIN
+    DELETE FROM search_fts
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'tag' AND ref_id = old.id);
+    DELETE FROM search_docs WHERE kind = 'tag' AND ref_id = old.id;
+END;
+
+-- Emails
+CREATE TRIGGER IF NOT EXISTS search_emails_ai AFTER INSERT ON emails BEGIN
+    INSERT INTO search_docs (kind, ref_id) VALUES ('email', new.id);
+    INSERT INTO search_fts (rowid, title, body)
+        VALUES ((SELECT doc_id FROM search_docs WHERE kind = 'email' AND ref_id = new.id),
+                new.subject, COALESCE(new.body_text, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_emails_au AFTER UPDATE OF subject, body_text ON emails BEGIN
+    UPDATE search_fts SET title = new.subject, body = COALESCE(new.body_text, '')
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'email' AND ref_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_emails_ad AFTER DELETE ON emails BEGIN
+    DELETE FROM search_fts
+        WHERE rowid = (SELECT doc_id FROM search_docs WHERE kind = 'email' AND ref_id = old.id);
+    DELETE FROM search_docs WHERE kind = 'email' AND ref_id = old.id;
+END;
+
+-- Index existing rows
+INSERT INTO search_docs (kind, ref_id, board_id) SELECT 'card', id, board_id FROM cards;
+INSERT INTO search_docs (kind, ref_id) SELECT 'tag', id FROM tags;
+INSERT INTO search_docs (kind, ref_id) SELECT 'email', id FROM emails;
+INSERT INTO search_fts (rowid, title, body)
+    SELECT d.doc_id, c.title, COALESCE(c.body, '') FROM search_docs d
+    JOIN cards c ON d.kind = 'card' AND c.id = d.ref_id;
+INSERT INTO search_fts (rowid, title, body)
+    SELECT d.doc_id, t.name, '' FROM search_docs d
+    JOIN tags t ON d.kind = 'tag' AND t.id = d.ref_id;
+INSERT INTO search_fts (rowid, title, body)
+    SELECT d.doc_id, e.subject, COALESCE(e.body_text, '') FROM search_docs d
+    JOIN emails e ON d.kind = 'email' AND e.id = d.ref_id;
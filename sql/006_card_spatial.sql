@@ -0,0 +1,53 @@
+-- R-tree over card positions, partitioned by board, for viewport queries on
+-- freeform boards. Boards and cards get small integer keys because R-tree
+-- entries are addressed by integer id; triggers keep everything in sync.
+
+CREATE TABLE IF NOT EXISTS spatial_boards (
+    board_key  INTEGER PRIMARY KEY,
+    board_id   TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS card_spatial (
+    rid      INTEGER PRIMARY KEY,
+    card_id  TEXT UNIQUE NOT NULL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS card_rtree USING rtree(
+    rid,
+    min_x, max_x,
+    min_y, max_y,
+    min_board, max_board
+);
+
+CREATE TRIGGER IF NOT EXISTS spatial_cards_ai AFTER INSERT ON cards BEGIN
+    INSERT OR IGNORE INTO spatial_boards (board_id) VALUES (new.board_id);
+    INSERT INTO card_spatial (card_id) VALUES (new.id);
+    INSERT INTO card_rtree (rid, min_x, max_x, min_y, max_y, min_board, max_board)
+        SELECT s.rid, new.pos_x, new.pos_x, new.pos_y, new.pos_y, b.board_key, b.board_key
+        FROM card_spatial s, spatial_boards b
+        WHERE s.card_id = new.id AND b.board_id = new.board_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS spatial_cards_au AFTER UPDATE OF pos_x, pos_y ON cards BEGIN
+    UPDATE card_rtree
+        SET min_x = new.pos_x, max_x = new.pos_x, min_y = new.pos_y, max_y = new.pos_y
+        WHERE rid = (SELECT rid FROM card_spatial WHERE card_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS spatial_cards_ad AFTER DELETE ON cards BEGIN
+    DELETE FROM card_rtree WHERE rid = (SELECT rid FROM card_spatial WHERE card_id = old.id);
+    DELETE FROM card_spatial WHERE card_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS spatial_boards_ad AFTER DELETE ON boards BEGIN
+    DELETE FROM spatial_boards WHERE board_id = old.id;
+END;
+
+-- Index existing cards
+INSERT OR IGNORE INTO spatial_boards (board_id) SELECT DISTINCT board_id FROM cards;
+INSERT INTO card_spatial (card_id) SELECT id FROM cards;
+INSERT INTO card_rtree (rid, min_x, max_x, min_y, max_y, min_board, max_board)
+    SELECT s.rid, c.pos_x, c.pos_x, c.pos_y, c.pos_y, b.board_key, b.board_key
+    FROM cards c
+    JOIN card_spatial s ON s.card_id = c.id
+    JOIN spatial_boards b ON b.board_id = c.board_id;
@@ -0,0 +1,44 @@
+-- Per-board card/file/image counters kept up to date by triggers, so the
+-- dashboard doesn't have to count every card of every board on each load.
+
+ALTER TABLE boards ADD COLUMN card_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE boards ADD COLUMN file_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE boards ADD COLUMN image_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS stats_cards_ai AFTER INSERT ON cards BEGIN
+    UPDATE boards SET card_count = card_count + 1 WHERE id = new.board_id;
+END;
+
+-- BEFORE so the card's files are still there to be counted; the cascade that
+-- removes them runs after the card is gone and so finds no board to update.
+CREATE TRIGGER IF NOT EXISTS stats_cards_bd BEFORE DELETE ON cards BEGIN
+    UPDATE boards SET
+        card_count = card_count - 1,
+        file_count = file_count - (SELECT COUNT(*) FROM card_files WHERE card_id = old.id),
+        image_count = image_count - (SELECT COUNT(*) FROM card_files
+                                     WHERE card_id = old.id AND mime_type LIKE 'image/%')
+    WHERE id = old.board_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_files_ai AFTER INSERT ON card_files BEGIN
+    UPDATE boards SET
+        file_count = file_count + 1,
+        image_count = image_count + (new.mime_type LIKE 'image/%')
+    WHERE id = (SELECT board_id FROM cards WHERE id = new.card_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_files_ad AFTER DELETE ON card_files BEGIN
+    UPDATE boards SET
+        file_count = file_count - 1,
+        image_count = image_count - (old.mime_type LIKE 'image/%')
+    WHERE id = (SELECT board_id FROM cards WHERE id = old.card_id);
+END;
+
+-- Count existing content
+UPDATE boards SET
+    card_count = (SELECT COUNT(*) FROM cards WHERE board_id = boards.id),
+    file_count = (SELECT COUNT(*) FROM card_files cf
+                  JOIN cards c ON c.id = cf.card_id WHERE c.board_id = boards.id),
+    image_count = (SELECT COUNT(*) FROM card_files cf
+                   JOIN cards c ON c.id = cf.card_id
+                   WHERE c.board_id = boards.id AND cf.mime_type LIKE 'image/%');
@@ -0,0 +1,8 @@
+-- Indexes for the paginated, filterable dashboard: boards are listed newest
+-- first by (updated_at, id) and filtered on their metadata columns.
+
+CREATE INDEX IF NOT EXISTS idx_boards_updated ON boards(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_boards_sales_team ON boards(sales_team, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_boards_customer ON boards(customer, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_boards_brand_site ON boards(brand_site, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_boards_category ON boards(category, updated_at, id);
@@ -0,0 +1,51 @@
+-- Content-addressed upload storage. Each distinct file is stored once, named
+-- by its SHA-256, and card files / email attachments point at it. Triggers
+-- keep a reference count so unreferenced blobs can be found and removed.
+-- Rows with a NULL blob_id predate the store (see `flask migrate-blobs`).
+
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256       TEXT PRIMARY KEY,
+    stored_name  TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    ref_count    INTEGER NOT NULL DEFAULT 0,
+    created_at   TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+ALTER TABLE card_files ADD COLUMN blob_id TEXT REFERENCES blobs(sha256);
+ALTER TABLE email_attachments ADD COLUMN blob_id TEXT REFERENCES blobs(sha256);
+
+CREATE INDEX IF NOT EXISTS idx_card_files_blob ON card_files(blob_id);
+CREATE INDEX IF NOT EXISTS idx_email_attachments_blob ON email_attachments(blob_id);
+CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(created_at) WHERE ref_count = 0;
+
+CREATE TRIGGER IF NOT EXISTS blobs_card_files_ai AFTER INSERT ON card_files
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = new.blob_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_card_files_ad AFTER DELETE ON card_files
+WHEN old.blob_id IS NOT NULL BEGIN
+    UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = old.blob_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_card_files_au AFTER UPDATE OF blob_id ON card_files
+WHEN old.blob_id IS NOT new.blob_id BEGIN
+    UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = old.blob_id;
+    UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = new.blob_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_email_attachments_ai AFTER INSERT ON email_attachments
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = new.blob_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_email_attachments_ad AFTER DELETE ON email_attachments
+WHEN old.blob_id IS NOT NULL BEGIN
+    UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = old.blob_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_email_attachments_au AFTER UPDATE OF blob_id ON email_attachments
+WHEN old.blob_id IS NOT new.blob_id BEGIN
+    UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = old.blob_id;
+    UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = new.blob_id;
+END;
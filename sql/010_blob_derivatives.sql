@@ -0,0 +1,15 @@
+-- Thumbnail generation state per blob. Derivatives are produced in the
+-- background; 'pending' rows are the work queue and survive restarts.
+--   pending     waiting to be generated
+--   processing  claimed by a worker (reset to pending if it goes stale)
+--   ready       all sizes written
+--   failed      generation raised; see thumb_error
+--   skipped     not an image Pillow can thumbnail
+
+ALTER TABLE blobs ADD COLUMN thumb_state TEXT NOT NULL DEFAULT 'pending';
+ALTER TABLE blobs ADD COLUMN thumb_error TEXT;
+ALTER TABLE blobs ADD COLUMN thumb_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE blobs ADD COLUMN thumb_updated_at TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_blobs_thumb_state ON blobs(thumb_state)
+    WHERE thumb_state IN ('pending', 'processing', 'failed');
@@ -0,0 +1,30 @@
+-- Thumbnail availability on each card file, so building URLs never has to
+-- look at the disk. Blob-backed rows mirror their blob's generation state via
+-- triggers; rows from before the blob store are filled in by
+-- `flask reconcile-thumbnails`, which also repairs drift in either direction.
+
+ALTER TABLE blobs ADD COLUMN thumb_widths TEXT;
+ALTER TABLE card_files ADD COLUMN thumb_state TEXT;
+ALTER TABLE card_files ADD COLUMN thumb_widths TEXT;
+
+CREATE TRIGGER IF NOT EXISTS thumbs_blobs_au AFTER UPDATE OF thumb_state, thumb_widths ON blobs BEGIN
+    UPDATE card_files SET thumb_state = new.thumb_state, thumb_widths = new.thumb_widths
+    WHERE blob_id = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS thumbs_card_files_ai AFTER INSERT ON card_files
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE card_files SET (thumb_state, thumb_widths) =
+        (SELECT thumb_state, thumb_widths FROM blobs WHERE sha256 = new.blob_id)
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS thumbs_card_files_au AFTER UPDATE OF blob_id ON card_files
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE card_files SET (thumb_state, thumb_widths) =
+        (SELECT thumb_state, thumb_widths FROM blobs WHERE sha256 = new.blob_id)
+    WHERE id = new.id;
+END;
+
+UPDATE card_files SET thumb_state = (SELECT thumb_state FROM blobs WHERE sha256 = card_files.blob_id)
+WHERE blob_id IS NOT NULL;
@@ -0,0 +1,19 @@
+-- Chunked, resumable uploads. Chunks are appended in order to a part file in
+-- the blob store's tmp directory; this row records how far the upload got so
+-- a client (or a restarted server) can carry on from there.
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id              TEXT PRIMARY KEY,
+    card_id         TEXT NOT NULL REFERENCES cards(id) ON DELETE CASCADE,
+    user_id         TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    original_name   TEXT NOT NULL,
+    mime_type       TEXT NOT NULL,
+    total_size      INTEGER NOT NULL,
+    chunk_size      INTEGER NOT NULL,
+    next_chunk      INTEGER NOT NULL DEFAULT 0,
+    received_bytes  INTEGER NOT NULL DEFAULT 0,
+    created_at      TEXT NOT NULL DEFAULT (datetime('now')),
+    updated_at      TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions(updated_at);
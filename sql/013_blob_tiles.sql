@@ -0,0 +1,30 @@
+-- Deep-zoom tile pyramids for very large images. State works like
+-- thumb_state (pending/processing/ready/failed); NULL means the image is
+-- small enough not to need tiles, or hasn't been measured yet.
+
+ALTER TABLE blobs ADD COLUMN image_width INTEGER;
+ALTER TABLE blobs ADD COLUMN image_height INTEGER;
+ALTER TABLE blobs ADD COLUMN tile_state TEXT;
+ALTER TABLE blobs ADD COLUMN tile_size INTEGER;
+ALTER TABLE blobs ADD COLUMN tile_error TEXT;
+ALTER TABLE blobs ADD COLUMN tile_updated_at TEXT;
+ALTER TABLE card_files ADD COLUMN tile_state TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_blobs_tile_state ON blobs(tile_state)
+    WHERE tile_state IN ('pending', 'processing', 'failed');
+
+CREATE TRIGGER IF NOT EXISTS tiles_blobs_au AFTER UPDATE OF tile_state ON blobs BEGIN
+    UPDATE card_files SET tile_state = new.tile_state WHERE blob_id = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tiles_card_files_ai AFTER INSERT ON card_files
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE card_files SET tile_state = (SELECT tile_state FROM blobs WHERE sha256 = new.blob_id)
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tiles_card_files_au AFTER UPDATE OF blob_id ON card_files
+WHEN new.blob_id IS NOT NULL BEGIN
+    UPDATE card_files SET tile_state = (SELECT tile_state FROM blobs WHERE sha256 = new.blob_id)
+    WHERE id = new.id;
+END;
@@ -0,0 +1,15 @@
+-- Storage garbage collection runs. A run is claimed by inserting its row, so
+-- only one process starts a scheduled run per interval; the row then records
+-- what the run removed.
+
+CREATE TABLE IF NOT EXISTS storage_gc_runs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at   TEXT NOT NULL DEFAULT (datetime('now')),
+    finished_at  TEXT,
+    dry_run      INTEGER NOT NULL DEFAULT 0,
+    files        INTEGER,
+    bytes        INTEGER,
+    report       TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_storage_gc_runs_started ON storage_gc_runs(started_at);
@@ -0,0 +1,32 @@
+-- Background board exports. A job renders one board at one revision in one
+-- format; the file it produces is cached in export_results under that key
+-- and shared by every job asking for the same thing.
+
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id           TEXT PRIMARY KEY,
+    board_id     TEXT NOT NULL REFERENCES boards(id) ON DELETE CASCADE,
+    user_id      TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    share_id     TEXT NOT NULL,
+    revision     INTEGER NOT NULL,
+    format       TEXT NOT NULL,
+    email_to     TEXT,
+    state        TEXT NOT NULL DEFAULT 'queued',
+    error        TEXT,
+    created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+    updated_at   TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_key ON export_jobs(board_id, revision, format, state);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_updated ON export_jobs(updated_at);
+
+CREATE TABLE IF NOT EXISTS export_results (
+    board_id      TEXT NOT NULL,
+    revision      INTEGER NOT NULL,
+    format        TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    created_at    TEXT NOT NULL DEFAULT (datetime('now')),
+    last_used_at  TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (board_id, revision, format)
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_results_used ON export_results(last_used_at);
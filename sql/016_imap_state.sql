@@ -0,0 +1,13 @@
+-- How far the email poller has got in each IMAP folder. UIDs only identify
+-- a message within one UIDVALIDITY, so emails fetched from here on are keyed
+-- "<uidvalidity>:<uid>" and the poller starts the folder over when the
+-- server changes it. `legacy_uids` marks a folder whose earlier emails were
+-- stored under their bare UID and must still be recognised as fetched.
+
+CREATE TABLE IF NOT EXISTS imap_state (
+    folder       TEXT PRIMARY KEY,
+    uidvalidity  INTEGER NOT NULL,
+    last_uid     INTEGER NOT NULL DEFAULT 0,
+    legacy_uids  INTEGER NOT NULL DEFAULT 0,
+    updated_at   TEXT NOT NULL DEFAULT (datetime('now'))
+);
@@ -0,0 +1,20 @@
+-- Status of the IMAP ingestion worker (tools/email_worker), one row per
+-- folder. The worker keeps it current; the web tier reads it for health and
+-- lag, and asks for an immediate check by setting poll_requested_at instead
+-- of talking to the mail server itself.
+
+CREATE TABLE IF NOT EXISTS email_worker (
+    folder             TEXT PRIMARY KEY,
+    state              TEXT NOT NULL DEFAULT 'stopped',
+    pid                INTEGER,
+    heartbeat_at       TEXT,
+    connected_at       TEXT,
+    synced_at          TEXT,
+    last_fetched       INTEGER NOT NULL DEFAULT 0,
+    last_lag_ms        INTEGER,
+    pending_since      TEXT,
+    failures           INTEGER NOT NULL DEFAULT 0,
+    last_error         TEXT,
+    last_error_at      TEXT,
+    poll_requested_at  TEXT
+);
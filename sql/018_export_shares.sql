@@ -0,0 +1,4 @@
+-- Export jobs no longer carry a share link: the browser backend gets a
+-- short-lived one when it renders, and the native backend needs none.
+
+ALTER TABLE export_jobs DROP COLUMN share_id;
@@ -0,0 +1,5 @@
+-- Board order lookups for viewport loads: the card after a given one, and
+-- the cards without a saved position, without scanning the whole board.
+
+CREATE INDEX IF NOT EXISTS idx_cards_board_order ON cards(board_id, sort_order, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_cards_unplaced ON cards(board_id) WHERE pos_x = 0 OR pos_y = 0;
@@ -0,0 +1,7 @@
+-- The process holding each export job. It refreshes updated_at while the
+-- job is queued or running, so jobs of a process that died can be told
+-- apart from ones still waiting their turn.
+
+ALTER TABLE export_jobs ADD COLUMN worker TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_worker ON export_jobs(worker, state);
@@ -0,0 +1,4 @@
+-- 'open' while chunks arrive; 'finishing' once a complete call has claimed
+-- the session, so a second concurrent call can't attach the file again.
+
+ALTER TABLE upload_sessions ADD COLUMN state TEXT NOT NULL DEFAULT 'open';
@@ -1,4 +1,5 @@
 @echo off
 cd /d "%~dp0"
+start "Email worker" py -m tools.email_worker
 py app.py
 pause
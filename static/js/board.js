@@ -13,15 +13,31 @@
     let activeCardId = null;
     let searchHighlight = [];
     let flowchartLayout = "vertical"; // "vertical" or "horizontal"
+    let changeSeq = 0;    // last applied change-log sequence number
+    let pendingRender = false;
+    let zoomLevel = 1.0;
+    let windowed = false; // freeform board loaded viewport by viewport
+    let loadedRects = []; // canvas areas already fetched when windowed
+
+    const SYNC_INTERVAL = 10000;
+    const WINDOW_THRESHOLD = 300; // cards before a freeform board loads by viewport
+    const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024; // larger files upload in resumable chunks
+    const UPLOAD_RETRIES = 5;
+    const EXPORT_POLL_INTERVAL = 1000; // ms between export job status checks
 
     const canvas = document.getElementById("canvas");
     const container = document.getElementById("canvas-container");
     const contextMenu = document.getElementById("card-context-menu");
     const fileInput = document.getElementById("file-upload-input");
 
-    // Reposition lines on scroll
+    // Reposition lines on scroll, and fetch newly visible cards when windowed
+    let windowTimer = null;
     container.addEventListener("scroll", () => {
         lines.forEach(l => { try { l.position(); } catch(e) {} });
+        if (windowed) {
+            clearTimeout(windowTimer);
+            windowTimer = setTimeout(loadVisibleWindow, 200);
+        }
     });
     window.addEventListener("resize", () => {
         lines.forEach(l => { try { l.position(); } catch(e) {} });
@@ -69,16 +85,213 @@
 
     // ── Init ──────────────────────────────────────────────
     async function init() {
+        windowed = viewMode === "freeform" && BOARD_CARD_COUNT > WINDOW_THRESHOLD;
+        if (windowed) {
+            await loadInitialWindow();
+        } else {
+            await loadBoard();
+        }
+        render();
+        setupToolbar();
+        subscribe();
+    }
+
+    async function loadBoard() {
         const data = await api(`/api/boards/${BOARD_ID}/cards`);
         cards = data.cards;
         connections = data.connections;
         viewMode = data.view_mode;
-        render();
-        setupToolbar();
+        changeSeq = data.seq || 0;
+    }
+
+    // ── Viewport windowing (large freeform boards) ────────
+    async function loadInitialWindow() {
+        // Server centres the first window on the board's first card
+        const data = await api(`/api/boards/${BOARD_ID}/cards/window?w=${container.clientWidth}&h=${container.clientHeight}`);
+        cards = data.cards;
+        connections = data.connections;
+        viewMode = data.view_mode;
+        changeSeq = data.seq || 0;
+        loadedRects = [data.bbox];
+        sizeCanvas(data.bounds);
+    }
+
+    function sizeCanvas(bounds) {
+        // Unloaded cards don't stretch the canvas, so size it to the whole board
+        if (!bounds) return;
+        canvas.style.minWidth = Math.max(3000, bounds.max_x + 500) + "px";
+        canvas.style.minHeight = Math.max(3000, bounds.max_y + 500) + "px";
+    }
+
+    async function loadVisibleWindow() {
+        const view = [
+            container.scrollLeft / zoomLevel,
+            container.scrollTop / zoomLevel,
+            (container.scrollLeft + container.clientWidth) / zoomLevel,
+            (container.scrollTop + container.clientHeight) / zoomLevel,
+        ].map(Math.round);
+        const covered = loadedRects.some(r =>
+            r[0] <= view[0] && r[1] <= view[1] && r[2] >= view[2] && r[3] >= view[3]);
+        if (covered) return;
+
+        const [x1, y1, x2, y2] = view;
+        const data = await api(`/api/boards/${BOARD_ID}/cards/window?x1=${x1}&y1=${y1}&x2=${x2}&y2=${y2}`);
+        if (data.error || !windowed) return;
+        loadedRects.push(data.bbox);
+        sizeCanvas(data.bounds);
+
+        const known = new Map(cards.map(c => [c.id, c]));
+        let added = false;
+        data.cards.forEach(c => {
+            if (known.has(c.id)) {
+                known.get(c.id).next_id = c.next_id;
+            } else {
+                cards.push(c);
+                added = true;
+            }
+        });
+        const knownConns = new Set(connections.map(c => c.id));
+        data.connections.forEach(c => {
+            if (!knownConns.has(c.id)) {
+                connections.push(c);
+                added = true;
+            }
+        });
+        if (added) {
+            cards.sort((a, b) => a.sort_order - b.sort_order);
+            renderWhenIdle();
+        }
+    }
+
+    // ── Live updates ──────────────────────────────────────
+    // Push over Server-Sent Events; poll the change log only if the stream
+    // is unavailable (unsupported, or the server is at its subscriber cap).
+    function subscribe() {
+        if (!window.EventSource) {
+            setInterval(syncChanges, SYNC_INTERVAL);
+            return;
+        }
+        let renderTimer = null;
+        const scheduleRender = () => {
+            clearTimeout(renderTimer);
+            renderTimer = setTimeout(renderWhenIdle, 100);
+        };
+        const source = new EventSource(`/api/boards/${BOARD_ID}/events?since=${changeSeq}`);
+        source.addEventListener("change", (e) => {
+            changeSeq = Number(e.lastEventId);
+            if (applyChange(JSON.parse(e.data))) scheduleRender();
+        });
+        source.addEventListener("reset", async (e) => {
+            await loadBoard();
+            changeSeq = Number(e.lastEventId);
+            scheduleRender();
+        });
+        source.addEventListener("error", () => {
+            if (source.readyState === EventSource.CLOSED) {
+                setInterval(syncChanges, SYNC_INTERVAL);
+            }
+        });
+    }
+
+    // ── Delta sync ────────────────────────────────────────
+    async function syncChanges() {
+        let changed = false;
+        let more = true;
+        while (more) {
+            const res = await api(`/api/boards/${BOARD_ID}/changes?since=${changeSeq}`);
+            if (res.error) return;
+            if (res.reset) {
+                // Our position fell out of the compacted log; start over
+                await loadBoard();
+                changed = true;
+                break;
+            }
+            res.changes.forEach(ch => { if (applyChange(ch)) changed = true; });
+            changeSeq = res.seq;
+            more = res.more;
+        }
+        if (changed) renderWhenIdle();
+    }
+
+    function applyChange(ch) {
+        const d = ch.data || {};
+        const findCard = (id) => cards.find(c => c.id === id);
+
+        if (ch.entity === "card") {
+            const card = findCard(ch.entity_id);
+            if (ch.op === "delete") {
+                if (!card) return false;
+                cards = cards.filter(c => c.id !== ch.entity_id);
+                connections = connections.filter(c => c.from_card_id !== ch.entity_id && c.to_card_id !== ch.entity_id);
+            } else if (card) {
+                Object.assign(card, d);
+            } else if (ch.op === "create") {
+                cards.push({ files: [], tags: [], ...d });
+            } else {
+                return false;
+            }
+            cards.sort((a, b) => a.sort_order - b.sort_order);
+            return true;
+        }
+        if (ch.entity === "file" || ch.entity === "tag") {
+            const card = findCard(d.card_id);
+            if (!card) return false;
+            const key = ch.entity === "file" ? "files" : "tags";
+            const list = card[key] || [];
+            const exists = list.some(x => x.id === ch.entity_id);
+            if (ch.op === "delete") {
+                if (!exists) return false;
+                card[key] = list.filter(x => x.id !== ch.entity_id);
+            } else if (ch.op === "update") {
+                // e.g. a file's thumbnail or tiles becoming ready
+                if (!exists) return false;
+                Object.assign(list.find(x => x.id === ch.entity_id), d);
+            } else {
+                if (exists) return false;
+                const item = ch.entity === "tag" ? { id: d.id, name: d.name } : d;
+                card[key] = [...list, item];
+            }
+            return true;
+        }
+        if (ch.entity === "connection") {
+            const exists = connections.some(c => c.id === ch.entity_id);
+            if (ch.op === "delete") {
+                if (!exists) return false;
+                connections = connections.filter(c => c.id !== ch.entity_id);
+            } else {
+                if (exists) return false;
+                connections.push(d);
+            }
+            return true;
+        }
+        if (ch.entity === "board" && d.view_mode && d.view_mode !== viewMode) {
+            viewMode = d.view_mode;
+            document.getElementById("btn-flowchart").classList.toggle("active", viewMode === "flowchart");
+            document.getElementById("btn-freeform").classList.toggle("active", viewMode === "freeform");
+            return true;
+        }
+        return false;
+    }
+
+    // Re-render unless the user is editing or has unsaved positions
+    function renderWhenIdle() {
+        const saveBtn = document.getElementById("btn-save-positions");
+        const active = document.activeElement;
+        const editing = active && canvas.contains(active) &&
+            (active.isContentEditable || active.tagName === "INPUT");
+        if (editing || (saveBtn && saveBtn.style.display !== "none")) {
+            if (!pendingRender) {
+                pendingRender = true;
+                setTimeout(() => { pendingRender = false; renderWhenIdle(); }, 2000);
+            }
+            return;
+        }
+        pendingRender = false;
+        render({ keepScroll: true });
     }
 
     // ── Render ────────────────────────────────────────────
-    function render() {
+    function render(opts = {}) {
         cleanup();
         canvas.innerHTML = "";
         cards.forEach((card, i) => {
@@ -139,7 +352,7 @@
         renderLines();
 
         // Auto-center to first card on initial load
-        if (cards.length > 0) {
+        if (!opts.keepScroll && cards.length > 0) {
             setTimeout(() => {
                 const firstCard = document.getElementById(`card-${cards[0].id}`);
                 if (firstCard) {
@@ -225,7 +438,7 @@
                     img.src = f.thumb_url;
                     img.alt = f.original_name;
                     img.title = f.original_name;
-                    img.addEventListener("click", () => window.open(f.url, "_blank"));
+                    img.addEventListener("click", () => window.open(f.viewer_url || f.url, "_blank"));
                     filesDiv.appendChild(img);
                 } else {
                     const icon = document.createElement("div");
@@ -348,10 +561,14 @@
         lines.forEach(l => { try { l.remove(); } catch(e) {} });
         lines = [];
 
-        // Auto-connect sequential cards (both modes)
-        for (let i = 0; i < cards.length - 1; i++) {
-            const fromEl = document.getElementById(`card-${cards[i].id}`);
-            const toEl = document.getElementById(`card-${cards[i + 1].id}`);
+        // Auto-connect sequential cards (both modes). A windowed board only
+        // holds some cards, so follow each card's next_id from the server.
+        const sequence = windowed
+            ? cards.filter(c => c.next_id).map(c => [c.id, c.next_id])
+            : cards.slice(0, -1).map((c, i) => [c.id, cards[i + 1].id]);
+        for (const [fromId, toId] of sequence) {
+            const fromEl = document.getElementById(`card-${fromId}`);
+            const toEl = document.getElementById(`card-${toId}`);
             if (fromEl && toEl) {
                 try {
                     // Use different socket positions based on layout
@@ -454,20 +671,70 @@
     });
 
     async function uploadFiles(cardId, boardId, fileList) {
-        const fd = new FormData();
-        for (const f of fileList) fd.append("files", f);
-        const res = await fetch(`/api/cards/${cardId}/files`, { method: "POST", body: fd });
-        const data = await res.json();
-        if (data.files) {
+        const small = [], large = [];
+        for (const f of fileList) (f.size > CHUNKED_UPLOAD_THRESHOLD ? large : small).push(f);
+        const added = [];
+        if (small.length) {
+            const fd = new FormData();
+            for (const f of small) fd.append("files", f);
+            const res = await fetch(`/api/cards/${cardId}/files`, { method: "POST", body: fd });
+            const data = await res.json();
+            if (data.files) added.push(...data.files);
+        }
+        for (const f of large) {
+            try {
+                added.push(await uploadChunked(cardId, f));
+            } catch (e) {
+                console.error("Upload failed:", f.name, e);
+                alert(`Upload of ${f.name} failed`);
+            }
+        }
+        if (added.length) {
             const card = cards.find(c => c.id === cardId);
             if (card) {
                 card.files = card.files || [];
-                card.files.push(...data.files);
+                card.files.push(...added);
                 render();
             }
         }
     }
 
+    // Large files go up in chunks; a failed chunk is retried, and the server
+    // tells us which chunk it expects next if it already has some.
+    async function uploadChunked(cardId, file) {
+        let session = await api(`/api/cards/${cardId}/uploads`, {
+            method: "POST",
+            body: { name: file.name, size: file.size, mime_type: file.type }
+        });
+        if (!session.id) throw new Error(session.error || "could not start upload");
+        let failures = 0;
+        while (session.received_bytes < session.size) {
+            const start = session.next_chunk * session.chunk_size;
+            const chunk = file.slice(start, start + session.chunk_size);
+            try {
+                const res = await fetch(`/api/uploads/${session.id}/chunks/${session.next_chunk}`, {
+                    method: "PUT",
+                    headers: { "Content-Type": "application/octet-stream" },
+                    body: chunk
+                });
+                const data = await res.json();
+                if (res.ok) {
+                    session = data;
+                    failures = 0;
+                    continue;
+                }
+                if (res.status !== 409) throw new Error(data.error);
+            } catch (e) {
+                if (++failures > UPLOAD_RETRIES) throw e;
+                await new Promise(r => setTimeout(r, 1000 * failures));
+            }
+            session = await api(`/api/uploads/${session.id}`);
+        }
+        const done = await api(`/api/uploads/${session.id}/complete`, { method: "POST", body: {} });
+        if (!done.file) throw new Error(done.error || "could not finish upload");
+        return done.file;
+    }
+
     // ── Connections ───────────────────────────────────────
     async function createConnection(fromId, toId) {
         const res = await api(`/api/boards/${BOARD_ID}/connections`, {
@@ -495,7 +762,12 @@
             }
         });
 
-        document.getElementById("btn-flowchart").addEventListener("click", () => {
+        document.getElementById("btn-flowchart").addEventListener("click", async () => {
+            if (windowed) {
+                // Flowchart layout needs every card
+                windowed = false;
+                await loadBoard();
+            }
             viewMode = "flowchart";
             document.getElementById("btn-flowchart").classList.add("active");
             document.getElementById("btn-freeform").classList.remove("active");
@@ -522,14 +794,14 @@
         // Save positions (freeform)
         document.getElementById("btn-save-positions").addEventListener("click", async () => {
             if (!confirm("Save current card positions?")) return;
-            for (const card of cards) {
-                if (card.pos_x != null && card.pos_y != null) {
-                    await api(`/api/cards/${card.id}`, {
-                        method: "PATCH",
-                        body: { pos_x: card.pos_x, pos_y: card.pos_y }
-                    });
-                }
-            }
+            const updates = cards
+                .filter(card => card.pos_x != null && card.pos_y != null)
+                .map(card => ({ id: card.id, pos_x: card.pos_x, pos_y: card.pos_y }));
+            const res = await api(`/api/boards/${BOARD_ID}/cards`, {
+                method: "PATCH",
+                body: { cards: updates }
+            });
+            if (!res.ok) return alert("Error: " + (res.error || "Unknown"));
             document.getElementById("btn-save-positions").style.display = "none";
         });
 
@@ -544,15 +816,25 @@
                 el.style.border = "";
             });
             document.querySelectorAll(".tag").forEach(el => el.style.background = "");
+            document.querySelectorAll(".search-snippet").forEach(el => el.remove());
             if (!q) return;
             const res = await api(`/api/boards/${BOARD_ID}/search?q=${encodeURIComponent(q)}`);
             if (res.card_ids) {
                 const qLower = q.toLowerCase();
+                const snippets = Object.fromEntries((res.results || []).map(r => [r.id, r.snippet]));
                 document.querySelectorAll(".card").forEach(el => {
                     const cid = el.dataset.cardId;
                     if (res.card_ids.includes(cid)) {
                         // Add red border to matching cards
                         el.style.border = "2px solid #ff0000";
+                        // Show where it matched; the server escapes snippets
+                        // and only adds <mark> around matches
+                        if (snippets[cid]) {
+                            const snippet = document.createElement("div");
+                            snippet.className = "search-snippet";
+                            snippet.innerHTML = snippets[cid];
+                            el.querySelector(".card-header").after(snippet);
+                        }
                         // Highlight matching tags yellow
                         el.querySelectorAll(".tag").forEach(tag => {
                             const tagText = tag.childNodes[0]?.textContent?.toLowerCase() || "";
@@ -605,18 +887,30 @@
             const res = await api(`/boards/${BOARD_ID}/send`, {
                 method: "POST", body: { to }
             });
-            if (res.ok) alert("Email sent!");
+            if (res.ok) alert("Export queued; the email will be sent when it is ready.");
             else alert("Error: " + (res.error || "Unknown"));
         });
 
         // Export
         document.getElementById("btn-export").addEventListener("click", async () => {
-            window.open(`/boards/${BOARD_ID}/export`, "_blank");
+            const btn = document.getElementById("btn-export");
+            btn.disabled = true;
+            try {
+                let job = await api(`/boards/${BOARD_ID}/exports`, {
+                    method: "POST", body: { format: "png" }
+                });
+                while (job.state === "queued" || job.state === "running") {
+                    await new Promise(r => setTimeout(r, EXPORT_POLL_INTERVAL));
+                    job = await api(job.status_url);
+                }
+                if (job.download_url) window.location = job.download_url;
+                else alert("Export failed: " + (job.error || "Unknown"));
+            } finally {
+                btn.disabled = false;
+            }
         });
 
         // Canvas controls (zoom, capture, layout)
-        let zoomLevel = 1.0;
-
         const updateZoom = (newZoom) => {
             zoomLevel = Math.max(0.5, Math.min(2.0, newZoom));
             canvas.style.transform = `scale(${zoomLevel})`;
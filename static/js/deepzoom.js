@@ -0,0 +1,131 @@
+// Minimal Deep Zoom viewer: loads the .dzi descriptor next to the tiles and
+// only requests the tiles covering the visible part of the image at the
+// current zoom. Drag to pan, scroll to zoom, double-click to zoom in.
+(function () {
+    const container = document.getElementById("deepzoom");
+    const dziUrl = container.dataset.dzi;
+    const tilesBase = dziUrl.replace(/\.dzi$/, "_files/");
+
+    let width, height, tileSize, format, maxLevel, baseLevel;
+    let scale = 1, originX = 0, originY = 0;   // screen px per image px; image px at top-left
+    const tiles = new Map();                   // "level/col_row" -> <img>
+    let base;
+
+    function tileUrl(level, col, row) {
+        return `${tilesBase}${level}/${col}_${row}.${format}`;
+    }
+
+    function levelSize(level) {
+        const div = Math.pow(2, maxLevel - level);
+        return [Math.ceil(width / div), Math.ceil(height / div)];
+    }
+
+    function fit() {
+        const rect = container.getBoundingClientRect();
+        scale = Math.min(rect.width / width, rect.height / height, 1);
+        originX = (width - rect.width / scale) / 2;
+        originY = (height - rect.height / scale) / 2;
+    }
+
+    function render() {
+        const rect = container.getBoundingClientRect();
+        // Coarsest level that still has at least one pixel per screen pixel
+        const level = Math.max(baseLevel, Math.min(maxLevel, maxLevel + Math.ceil(Math.log2(scale))));
+        const div = Math.pow(2, maxLevel - level);
+        const [lw, lh] = levelSize(level);
+        const span = tileSize * div;   // image px covered by one tile at this level
+
+        base.style.left = (-originX * scale) + "px";
+        base.style.top = (-originY * scale) + "px";
+        base.style.width = (width * scale) + "px";
+        base.style.height = (height * scale) + "px";
+
+        const visible = new Set();
+        const c0 = Math.max(0, Math.floor(originX / span));
+        const r0 = Math.max(0, Math.floor(originY / span));
+        const c1 = Math.min(Math.ceil(lw / tileSize) - 1, Math.floor((originX + rect.width / scale) / span));
+        const r1 = Math.min(Math.ceil(lh / tileSize) - 1, Math.floor((originY + rect.height / scale) / span));
+        for (let col = c0; col <= c1; col++) {
+            for (let row = r0; row <= r1; row++) {
+                const key = `${level}/${col}_${row}`;
+                visible.add(key);
+                let img = tiles.get(key);
+                if (!img) {
+                    img = document.createElement("img");
+                    img.className = "deepzoom-tile";
+                    img.draggable = false;
+                    img.src = tileUrl(level, col, row);
+                    container.appendChild(img);
+                    tiles.set(key, img);
+                }
+                const x = col * span, y = row * span;
+                img.style.left = ((x - originX) * scale) + "px";
+                img.style.top = ((y - originY) * scale) + "px";
+                img.style.width = (Math.min(span, width - x) * scale) + "px";
+                img.style.height = (Math.min(span, height - y) * scale) + "px";
+                img.style.display = "";
+            }
+        }
+        tiles.forEach((img, key) => {
+            if (visible.has(key)) return;
+            // Keep a bounded number of off-screen tiles around for panning back
+            if (tiles.size > 400) { img.remove(); tiles.delete(key); }
+            else img.style.display = "none";
+        });
+    }
+
+    function zoomAt(factor, clientX, clientY) {
+        const rect = container.getBoundingClientRect();
+        const px = clientX - rect.left, py = clientY - rect.top;
+        const ix = originX + px / scale, iy = originY + py / scale;
+        scale = Math.min(Math.max(scale * factor, 0.01), 4);
+        originX = ix - px / scale;
+        originY = iy - py / scale;
+        render();
+    }
+
+    container.addEventListener("wheel", (e) => {
+        e.preventDefault();
+        zoomAt(e.deltaY < 0 ? 1.25 : 0.8, e.clientX, e.clientY);
+    }, { passive: false });
+
+    container.addEventListener("dblclick", (e) => zoomAt(2, e.clientX, e.clientY));
+
+    let drag = null;
+    container.addEventListener("pointerdown", (e) => {
+        drag = { x: e.clientX, y: e.clientY };
+        container.setPointerCapture(e.pointerId);
+    });
+    container.addEventListener("pointermove", (e) => {
+        if (!drag) return;
+        originX -= (e.clientX - drag.x) / scale;
+        originY -= (e.clientY - drag.y) / scale;
+        drag = { x: e.clientX, y: e.clientY };
+        render();
+    });
+    container.addEventListener("pointerup", () => { drag = null; });
+    window.addEventListener("resize", render);
+
+    fetch(dziUrl)
+        .then(r => r.text())
+        .then(text => {
+            const doc = new DOMParser().parseFromString(text, "application/xml");
+            const image = doc.documentElement;
+            const size = image.getElementsByTagName("Size")[0];
+            width = parseInt(size.getAttribute("Width"), 10);
+            height = parseInt(size.getAttribute("Height"), 10);
+            tileSize = parseInt(image.getAttribute("TileSize"), 10);
+            format = image.getAttribute("Format");
+            maxLevel = Math.ceil(Math.log2(Math.max(width, height)));
+            // Highest level that fits in one tile: shown stretched underneath
+            // so there is never a blank area while tiles load
+            baseLevel = Math.max(0, maxLevel - Math.ceil(Math.log2(Math.max(width, height) / tileSize)));
+            base = document.createElement("img");
+            base.className = "deepzoom-tile";
+            base.draggable = false;
+            base.src = tileUrl(baseLevel, 0, 0);
+            container.appendChild(base);
+            fit();
+            render();
+        });
+})();
@@ -0,0 +1,59 @@
+import json
+import config
+from tools import db
+from tools.cache import TTLCache
+
+# user_id -> frozenset of board ids the user owns or is a member of.
+# Positive answers are served from here; a board missing from the set is
+# re-checked against the database before access is refused, so a cache
+# that lags behind a new membership never locks anyone out. Revocations
+# made by another worker take effect within ACCESS_CACHE_TTL seconds.
+_visible = TTLCache(config.ACCESS_CACHE_SIZE, config.ACCESS_CACHE_TTL)
+
+
+def visible_board_ids(user_id):
+    ids = _visible.get(user_id)
+    if ids is None:
+        rows = db.query(
+            """SELECT id FROM boards WHERE owner_id = ?
+               UNION
+               SELECT board_id FROM board_members WHERE user_id = ?""",
+            (user_id, user_id),
+        )
+        ids = frozenset(r["id"] for r in rows)
+        _visible.set(user_id, ids)
+    return ids
+
+
+def visible_board_ids_json(user_id):
+    """The visible board ids as a JSON array, for `IN (SELECT value FROM json_each(?))`."""
+    return json.dumps(sorted(visible_board_ids(user_id)))
+
+
+def can_access(user_id, board):
+    """Whether `user_id` may open `board` (a boards row)."""
+    if board["owner_id"] == user_id:
+        return True
+    if board["id"] in visible_board_ids(user_id):
+        return True
+    member = db.query_one(
+        "SELECT 1 FROM board_members WHERE board_id = ? AND user_id = ?",
+        (board["id"], user_id),
+    )
+    if member:
+        invalidate_user(user_id)
+        return True
+    return False
+
+
+def invalidate_user(user_id):
+    _visible.pop(user_id)
+
+
+def invalidate_board(board_id):
+    """Forget cached visibility for everyone who could see `board_id`."""
+    _visible.discard_where(lambda ids: board_id in ids)
+
+
+def stats():
+    return _visible.stats()
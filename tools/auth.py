@@ -1,7 +1,13 @@
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+import config
 from tools import db
+from tools.cache import TTLCache
+
+# Users loaded by id on every authenticated request. Kept short-lived so a
+# deactivation made outside this process still applies within the TTL.
+_user_cache = TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL)
 
 
 class User(UserMixin):
@@ -17,11 +23,31 @@ class User(UserMixin):
 
     @staticmethod
     def get_by_id(user_id):
+        user = _user_cache.get(user_id)
+        if user is not None:
+            return user
         row = db.query_one("SELECT * FROM users WHERE id = ?", (user_id,))
         if row:
-            return User(row["id"], row["email"], row["display_name"], row["is_active"])
+            user = User(row["id"], row["email"], row["display_name"], row["is_active"])
+            _user_cache.set(user_id, user)
+            return user
         return None
 
+    @staticmethod
+    def update(user_id, display_name=None, is_active=None):
+        """Change a user's profile or active flag and drop any cached copy."""
+        fields, params = [], []
+        if display_name is not None:
+            fields.append("display_name = ?")
+            params.append(display_name)
+        if is_active is not None:
+            fields.append("is_active = ?")
+            params.append(1 if is_active else 0)
+        if fields:
+            params.append(user_id)
+            db.execute(f"UPDATE users SET {', '.join(fields)} WHERE id = ?", params)
+        invalidate_user(user_id)
+
     @staticmethod
     def get_by_email(email):
         row = db.query_one("SELECT * FROM users WHERE email = ?", (email,))
@@ -47,5 +73,13 @@ class User(UserMixin):
         return None
 
 
+def invalidate_user(user_id):
+    _user_cache.pop(user_id)
+
+
+def user_cache_stats():
+    return _user_cache.stats()
+
+
 def check_honeypot(form, field_name="website"):
     return bool(form.get(field_name, "").strip())
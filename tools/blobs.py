@@ -0,0 +1,193 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import config
+from tools import db
+
+# Read/write granularity while hashing uploads
+CHUNK_SIZE = 1024 * 1024
+
+
+def root():
+    return os.path.join(config.UPLOAD_DIR, "blobs")
+
+
+def _shard(stored_name):
+    # Two hex characters of the hash keep directories to a manageable size
+    return stored_name[:2]
+
+
+def blob_path(stored_name):
+    return os.path.join(root(), _shard(stored_name), stored_name)
+
+
+def _thumb_name(stored_name, width, webp):
+    sha256, ext = os.path.splitext(stored_name)
+    return f"{sha256}_{width or config.THUMB_DEFAULT_WIDTH}{'.webp' if webp else ext}"
+
+
+def thumb_path(stored_name, width=None, webp=False):
+    """Where a blob's thumbnail of `width` (default THUMB_DEFAULT_WIDTH) is written."""
+    return os.path.join(root(), "thumbs", _shard(stored_name),
+                        _thumb_name(stored_name, width, webp))
+
+
+def tile_dir(stored_name):
+    """Directory holding a blob's Deep Zoom pyramid, one subdirectory per level."""
+    sha256 = os.path.splitext(stored_name)[0]
+    return os.path.join(root(), "tiles", _shard(stored_name), sha256)
+
+
+def tmp_dir():
+    """Scratch space on the same filesystem as the store, for atomic renames."""
+    path = os.path.join(root(), "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_stream(stream, ext):
+    """Store the contents of a file-like object, hashing it as it is written.
+
+    Returns {"sha256", "stored_name", "size"}. If identical content is already
+    stored, the new copy is discarded and the existing blob is returned.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir())
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return _place(tmp_path, digest.hexdigest(), ext, size)
+    except BaseException:
+        _unlink(tmp_path)
+        raise
+
+
+def import_file(path, ext):
+    """Copy an existing file into the store, leaving the original in place.
+
+    Returns the same dict as save_stream.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return _place(path, digest.hexdigest(), ext, os.path.getsize(path), move=False)
+
+
+def adopt(path, sha256, ext, size):
+    """Move a fully written file whose hash is already known into the store."""
+    return _place(path, sha256, ext, size)
+
+
+def _place(src, sha256, ext, size, move=True):
+    """Put `src` into the store under its hash unless that content is already there."""
+    row = db.query_one("SELECT stored_name FROM blobs WHERE sha256 = ?", (sha256,))
+    stored_name = row["stored_name"] if row else f"{sha256}{ext.lower()}"
+    dst = blob_path(stored_name)
+    if not os.path.exists(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if move:
+            os.replace(src, dst)
+        else:
+            shutil.copyfile(src, dst)
+    else:
+        # Mark the existing copy as in use so the storage GC, which only
+        # removes files idle for its grace period, leaves it alone.
+        os.utime(dst)
+        if move:
+            _unlink(src)
+    return {"sha256": sha256, "stored_name": stored_name, "size": size}
+
+
+def register(sha256, stored_name, size):
+    """Record a stored blob. Call in the transaction that inserts rows referencing it."""
+    db.execute(
+        "INSERT OR IGNORE INTO blobs (sha256, stored_name, size) VALUES (?, ?, ?)",
+        (sha256, stored_name, size),
+    )
+
+
+# ── Files stored before the blob store ─────────────────────
+
+def migrate_card_file(f, board_id):
+    """Move a legacy per-board card file into the store.
+
+    Updates the row and `f` in place. Returns False if the file is missing.
+    """
+    legacy = os.path.join(config.UPLOAD_DIR, board_id, f["stored_name"])
+    if not os.path.exists(legacy):
+        return False
+    blob = import_file(legacy, os.path.splitext(f["stored_name"])[1])
+    with db.transaction():
+        register(blob["sha256"], blob["stored_name"], blob["size"])
+        db.execute(
+            "UPDATE card_files SET blob_id = ?, stored_name = ? WHERE id = ?",
+            (blob["sha256"], blob["stored_name"], f["id"]),
+        )
+        db.after_commit(lambda: _unlink(legacy))
+    f["blob_id"], f["stored_name"] = blob["sha256"], blob["stored_name"]
+    return True
+
+
+def migrate_attachment(att):
+    """Move a legacy email attachment into the store; see migrate_card_file."""
+    legacy = os.path.join(config.EMAIL_ATTACH_DIR, att["stored_name"])
+    if not os.path.exists(legacy):
+        return False
+    blob = import_file(legacy, os.path.splitext(att["stored_name"])[1])
+    with db.transaction():
+        register(blob["sha256"], blob["stored_name"], blob["size"])
+        db.execute(
+            "UPDATE email_attachments SET blob_id = ?, stored_name = ? WHERE id = ?",
+            (blob["sha256"], blob["stored_name"], att["id"]),
+        )
+        db.after_commit(lambda: _unlink(legacy))
+    att["blob_id"], att["stored_name"] = blob["sha256"], blob["stored_name"]
+    return True
+
+
+def migrate_legacy(batch_size=200):
+    """Move every file stored before the blob store into it.
+
+    Returns {"migrated", "missing"}. Rows whose file no longer exists are
+    left untouched and counted as missing.
+    """
+    migrated = missing = 0
+    for sql, migrate in (
+        ("""SELECT cf.*, c.board_id FROM card_files cf
+            JOIN cards c ON c.id = cf.card_id
+            WHERE cf.blob_id IS NULL AND cf.id > ?
+            ORDER BY cf.id LIMIT ?""",
+         lambda row: migrate_card_file(row, row["board_id"])),
+        ("""SELECT * FROM email_attachments
+            WHERE blob_id IS NULL AND id > ?
+            ORDER BY id LIMIT ?""",
+         migrate_attachment),
+    ):
+        last = ""
+        while True:
+            rows = db.query(sql, (last, batch_size))
+            if not rows:
+                break
+            for row in rows:
+                if migrate(row):
+                    migrated += 1
+                else:
+                    missing += 1
+            last = rows[-1]["id"]
+    return {"migrated": migrated, "missing": missing}
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,193 @@
+from tools import db
+from tools.file_handler import file_url, thumb_url, viewer_url, is_image
+
+# Stay well under SQLite's bound-parameter limit when batching IN (...) lists.
+IN_BATCH_SIZE = 500
+
+# Cards are positioned by their top-left corner; widen viewport queries by
+# their size so cards overlapping the edge are included. Width matches .card
+# in style.css; height is a generous upper bound since cards grow with content.
+CARD_WIDTH = 260
+CARD_MAX_HEIGHT = 600
+
+
+def _batched(values, size=IN_BATCH_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def load_board(board_id, include_email=True, share_id=None):
+    """Build the cards/connections payload for a board.
+
+    Runs a fixed number of set-based queries regardless of card count
+    instead of one query per card for files, tags and emails. With
+    `share_id`, file URLs go through that share link instead of requiring
+    a login.
+    """
+    cards = db.query(
+        "SELECT * FROM cards WHERE board_id = ? ORDER BY sort_order, created_at, id",
+        (board_id,),
+    )
+    _attach_details(board_id, cards, include_email, share_id=share_id)
+    connections = db.query(
+        "SELECT * FROM connections WHERE board_id = ?", (board_id,)
+    )
+    return {"cards": cards, "connections": connections}
+
+
+def load_window(board_id, x1, y1, x2, y2, include_email=True):
+    """Build the payload for the cards of a freeform board inside a bounding box.
+
+    Cards without a saved position (laid out by the client) are always
+    included. Each card carries `next_id`, the card after it in board order,
+    so the client can draw sequence arrows without loading every card.
+    Connections touching any returned card are included.
+    """
+    board_key = _board_key(board_id)
+    # next_id is looked up per returned card through idx_cards_board_order,
+    # so the query costs the same however many cards the board has.
+    cards = db.query(
+        """WITH hits AS (
+               SELECT s.card_id AS id FROM card_rtree r
+               JOIN card_spatial s ON s.rid = r.rid
+               WHERE r.min_board <= ? AND r.max_board >= ?
+                 AND r.max_x >= ? AND r.min_x <= ?
+                 AND r.max_y >= ? AND r.min_y <= ?
+               UNION
+               SELECT id FROM cards
+               WHERE board_id = ? AND (pos_x = 0 OR pos_y = 0)
+           )
+           SELECT c.*,
+                  (SELECT n.id FROM cards n
+                   WHERE n.board_id = c.board_id
+                     AND (n.sort_order, n.created_at, n.id) > (c.sort_order, c.created_at, c.id)
+                   ORDER BY n.sort_order, n.created_at, n.id LIMIT 1) AS next_id
+           FROM hits h
+           JOIN cards c ON c.id = h.id
+           ORDER BY c.sort_order, c.created_at, c.id""",
+        (board_key, board_key,
+         x1 - CARD_WIDTH, x2, y1 - CARD_MAX_HEIGHT, y2,
+         board_id),
+    )
+    _attach_details(board_id, cards, include_email, subset=True)
+
+    connections = {}
+    ids = [c["id"] for c in cards]
+    for batch in _batched(ids, IN_BATCH_SIZE // 2):
+        placeholders = ", ".join("?" * len(batch))
+        for conn in db.query(
+            f"""SELECT * FROM connections
+                WHERE board_id = ?
+                  AND (from_card_id IN ({placeholders}) OR to_card_id IN ({placeholders}))""",
+            [board_id, *batch, *batch],
+        ):
+            connections[conn["id"]] = conn
+    return {"cards": cards, "connections": list(connections.values())}
+
+
+def board_bounds(board_id):
+    """Extent of all positioned cards on a board, or None if it has none."""
+    board_key = _board_key(board_id)
+    row = db.query_one(
+        """SELECT MIN(min_x) AS min_x, MIN(min_y) AS min_y,
+                  MAX(max_x) AS max_x, MAX(max_y) AS max_y
+           FROM card_rtree
+           WHERE min_board <= ? AND max_board >= ?""",
+        (board_key, board_key),
+    )
+    if row is None or row["max_x"] is None:
+        return None
+    return {
+        "min_x": row["min_x"], "min_y": row["min_y"],
+        "max_x": row["max_x"] + CARD_WIDTH, "max_y": row["max_y"] + CARD_MAX_HEIGHT,
+    }
+
+
+def first_card_position(board_id):
+    return db.query_one(
+        """SELECT pos_x, pos_y FROM cards WHERE board_id = ?
+           ORDER BY sort_order, created_at, id LIMIT 1""",
+        (board_id,),
+    )
+
+
+def _board_key(board_id):
+    row = db.query_one(
+        "SELECT board_key FROM spatial_boards WHERE board_id = ?", (board_id,)
+    )
+    return row["board_key"] if row else -1
+
+
+def _attach_details(board_id, cards, include_email, subset=False, share_id=None):
+    """Fill in files, tags and (optionally) source email for a list of cards.
+
+    With `subset`, `cards` is only part of the board and lookups are
+    restricted to those card ids.
+    """
+    by_id = {}
+    for card in cards:
+        card["files"] = []
+        card["tags"] = []
+        by_id[card["id"]] = card
+    if not cards:
+        return
+
+    for f in _rows_for_cards(
+        board_id, by_id if subset else None,
+        """SELECT cf.* FROM card_files cf
+           JOIN cards c ON c.id = cf.card_id
+           WHERE {where}
+           ORDER BY cf.uploaded_at""",
+        "cf.card_id",
+    ):
+        f["url"] = file_url(f, share_id)
+        f["thumb_url"] = thumb_url(f, share_id)
+        f["viewer_url"] = viewer_url(f, share_id)
+        f["is_image"] = is_image(f["mime_type"])
+        by_id[f["card_id"]]["files"].append(f)
+
+    for t in _rows_for_cards(
+        board_id, by_id if subset else None,
+        """SELECT ct.card_id, t.id, t.name FROM card_tags ct
+           JOIN tags t ON t.id = ct.tag_id
+           JOIN cards c ON c.id = ct.card_id
+           WHERE {where}""",
+        "ct.card_id",
+    ):
+        by_id[t["card_id"]]["tags"].append({"id": t["id"], "name": t["name"]})
+
+    if include_email:
+        _attach_emails(cards)
+
+
+def _rows_for_cards(board_id, card_ids, sql, card_column):
+    """Run a per-board query, or one keyed on `card_ids` in IN (...) batches if given.
+
+    Keying on the card ids alone keeps SQLite from scanning the whole board
+    to pick out a viewport's worth of cards.
+    """
+    if card_ids is None:
+        return db.query(sql.format(where="c.board_id = ?"), (board_id,))
+    rows = []
+    for batch in _batched(list(card_ids)):
+        placeholders = ", ".join("?" * len(batch))
+        rows.extend(db.query(sql.format(where=f"{card_column} IN ({placeholders})"), batch))
+    return rows
+
+
+def _attach_emails(cards):
+    email_ids = sorted({c["email_id"] for c in cards if c.get("email_id")})
+    if not email_ids:
+        return
+    emails = {}
+    for batch in _batched(email_ids):
+        placeholders = ", ".join("?" * len(batch))
+        for em in db.query(
+            f"""SELECT id, from_addr, subject, body_text FROM emails
+                WHERE id IN ({placeholders})""",
+            batch,
+        ):
+            emails[em["id"]] = em
+    for card in cards:
+        if card.get("email_id"):
+            card["email"] = emails.get(card["email_id"])
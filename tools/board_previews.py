@@ -0,0 +1,59 @@
+import config
+from tools import db
+from tools.cache import TTLCache
+from tools.board_loader import _batched, IN_BATCH_SIZE
+from tools.file_handler import thumb_url
+
+# Latest images per board, keyed by board id and tagged with the board's
+# revision: any upload or delete bumps the revision and so retires the entry.
+_previews = TTLCache(config.BOARD_PREVIEW_CACHE_SIZE, config.BOARD_PREVIEW_CACHE_TTL)
+
+
+def latest_images(boards, limit=None):
+    """Newest image thumbnails for each of `boards` (rows with id, revision, image_count).
+
+    Returns {board_id: [image, ...]}. Cached boards are served from memory;
+    the rest are loaded together with one windowed query per batch.
+    """
+    if limit is None:
+        limit = config.BOARD_PREVIEW_IMAGES
+    result = {}
+    missing = {}
+    for b in boards:
+        if not b["image_count"]:
+            result[b["id"]] = []
+            continue
+        cached = _previews.get(b["id"])
+        if cached is not None and cached[0] == (b["revision"], limit):
+            result[b["id"]] = cached[1]
+        else:
+            missing[b["id"]] = b["revision"]
+
+    loaded = {board_id: [] for board_id in missing}
+    for batch in _batched(list(missing), IN_BATCH_SIZE):
+        placeholders = ", ".join("?" * len(batch))
+        for img in db.query(
+            f"""SELECT * FROM (
+                    SELECT cf.*, c.board_id,
+                           ROW_NUMBER() OVER (PARTITION BY c.board_id
+                                              ORDER BY cf.uploaded_at DESC) AS rn
+                    FROM card_files cf
+                    JOIN cards c ON c.id = cf.card_id
+                    WHERE c.board_id IN ({placeholders})
+                      AND cf.mime_type LIKE 'image/%'
+                ) WHERE rn <= ?
+                ORDER BY board_id, rn""",
+            [*batch, limit],
+        ):
+            del img["rn"]
+            img["thumb_url"] = thumb_url(img)
+            loaded[img["board_id"]].append(img)
+
+    for board_id, images in loaded.items():
+        _previews.set(board_id, ((missing[board_id], limit), images))
+        result[board_id] = images
+    return result
+
+
+def stats():
+    return _previews.stats()
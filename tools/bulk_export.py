@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import has_app_context
+from werkzeug.utils import secure_filename
+import config
+from tools import db, access, blobs, dashboard, export_jobs
+from tools.board_loader import load_board
+
+CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.BULK_EXPORT_WORKERS,
+                                           thread_name_prefix="bulk-export")
+        return _executor
+
+
+def select_boards(user_id, filters=None, board_ids=None):
+    """Boards visible to `user_id`, by id (in the order given) or by facet filters.
+
+    Raises ExportError if nothing selects boards or too many match.
+    """
+    limit = config.BULK_EXPORT_MAX_BOARDS
+    if board_ids is not None:
+        if not isinstance(board_ids, list) or not all(isinstance(b, str) for b in board_ids):
+            raise export_jobs.ExportError("board_ids must be a list of board ids")
+        visible = access.visible_board_ids(user_id)
+        wanted = [b for b in dict.fromkeys(board_ids) if b in visible]
+        if len(wanted) > limit:
+            raise export_jobs.ExportError(f"At most {limit} boards can be exported at once")
+        rows = {r["id"]: r for r in db.query(
+            "SELECT * FROM boards WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(wanted),),
+        )}
+        return [rows[b] for b in wanted if b in rows]
+    if not filters:
+        raise export_jobs.ExportError("Give board_ids or at least one filter")
+    boards = dashboard.matching_boards(user_id, filters, limit + 1)
+    if len(boards) > limit:
+        raise export_jobs.ExportError(f"More than {limit} boards match; narrow the filter")
+    return boards
+
+
+def parse_filters(data):
+    """Facet filters from a JSON request body. Raises ExportError unless they are strings."""
+    if not isinstance(data, dict):
+        raise export_jobs.ExportError("Request body must be a JSON object")
+    for facet in dashboard.FACETS:
+        if facet in data and not isinstance(data[facet], str):
+            raise export_jobs.ExportError(f"{facet} must be a string")
+    return dashboard.parse_filters(data)
+
+
+def archive_name(filters=None):
+    parts = [secure_filename(v) for v in (filters or {}).values()]
+    return "-".join(["boards", *[p for p in parts if p]]) + ".zip"
+
+
+# ── Archive ────────────────────────────────────────────────
+
+class _Sink:
+    """Write-only file that holds what zipfile writes until it is drained.
+
+    Having no tell() or seek(), it makes zipfile write each entry's sizes
+    after its data, so nothing already written needs revisiting.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream(boards, fmt, user_id):
+    """Build a ZIP of `boards` and yield it chunk by chunk as it is written.
+
+    Each board gets a folder with its rendering in `fmt`, a JSON snapshot
+    and its original uploads; manifest.json at the end lists what went in
+    and any board whose rendering failed. Renderings go through the export
+    cache and are produced BULK_EXPORT_WORKERS at a time, a few boards
+    ahead of the one being written. Memory use stays at about one chunk.
+    """
+    if fmt not in export_jobs.FORMATS:
+        raise export_jobs.ExportError(f"format must be one of {', '.join(export_jobs.FORMATS)}")
+    return (chunk for chunk in _build(boards, fmt, user_id) if chunk)
+
+
+def _build(boards, fmt, user_id):
+    sink = _Sink()
+    todo = iter(boards)
+    pending = deque()
+
+    def submit_next():
+        board = next(todo, None)
+        if board is not None:
+            job = {"board_id": board["id"], "revision": board["revision"],
+                   "format": fmt, "user_id": user_id}
+            pending.append((board, _pool().submit(_render, job)))
+
+    try:
+        for _ in range(2 * config.BULK_EXPORT_WORKERS):
+            submit_next()
+        manifest = []
+        folders = set()
+        with zipfile.ZipFile(sink, "w") as zf:
+            while pending:
+                board, future = pending.popleft()
+                submit_next()
+                folder = _unique(folders, f"{secure_filename(board['title']) or 'board'}-{board['id'][:8]}")
+                entry = {"id": board["id"], "title": board["title"], "revision": board["revision"],
+                         "folder": folder, "files": [], "missing": []}
+
+                payload = load_board(board["id"], include_email=False)
+                zf.writestr(f"{folder}/board.json",
+                            json.dumps({"board": board, **payload}, indent=2, default=str),
+                            compress_type=zipfile.ZIP_DEFLATED)
+                yield sink.drain()
+
+                try:
+                    yield from _write_file(zf, sink, f"{folder}/board.{fmt}", future.result())
+                    entry["rendering"] = f"board.{fmt}"
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+
+                names = set()
+                for card in payload["cards"]:
+                    for f in card["files"]:
+                        name = _unique(names, secure_filename(f["original_name"]) or f["id"])
+                        try:
+                            yield from _write_file(zf, sink, f"{folder}/uploads/{name}", _original(f, board["id"]))
+                            entry["files"].append(name)
+                        except FileNotFoundError:
+                            entry["missing"].append(f["original_name"])
+                manifest.append(entry)
+
+            zf.writestr("manifest.json", json.dumps({"format": fmt, "boards": manifest}, indent=2),
+                        compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+        export_jobs.evict()
+    finally:
+        # The client may have gone away part way through
+        for _, future in pending:
+            future.cancel()
+
+
+def _write_file(zf, sink, name, path):
+    """Copy a file into the archive a chunk at a time, yielding as it goes.
+
+    Files are stored rather than deflated: renderings and most uploads are
+    compressed already.
+    """
+    with open(path, "rb") as src:
+        info = zipfile.ZipInfo.from_file(path, name)
+        with zf.open(info, "w", force_zip64=info.file_size >= zipfile.ZIP64_LIMIT) as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(chunk)
+                yield sink.drain()
+
+
+def _render(job):
+    try:
+        return export_jobs.rendering(job)
+    finally:
+        if not has_app_context():
+            db.close_conn()
+
+
+def _original(f, board_id):
+    if f["blob_id"]:
+        return blobs.blob_path(f["stored_name"])
+    return os.path.join(config.UPLOAD_DIR, board_id, f["stored_name"])
+
+
+def _unique(taken, name):
+    """`name`, or `name` with a counter before its extension if already taken."""
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{stem}-{n}{ext}"
+    taken.add(candidate)
+    return candidate
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+import config
+from tools import db
+
+# Entities recorded in the log
+CARD = "card"
+FILE = "file"
+TAG = "tag"
+CONNECTION = "connection"
+BOARD = "board"
+
+# Operations
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+MAX_CHANGES_PER_FETCH = 1000
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def record(board_id, entity, entity_id, op, data=None):
+    """Append a change for a board. Call inside the transaction that made it."""
+    db.execute(
+        """INSERT INTO board_changes (board_id, entity, entity_id, op, data)
+           VALUES (?, ?, ?, ?, ?)""",
+        (board_id, entity, entity_id, op,
+         json.dumps(data, separators=(",", ":")) if data is not None else None),
+    )
+    from tools import events
+    events.publish(board_id)
+
+
+def latest_seq(board_id):
+    row = db.query_one(
+        "SELECT COALESCE(MAX(seq), 0) AS seq FROM board_changes WHERE board_id = ?",
+        (board_id,),
+    )
+    return max(row["seq"], _floor(board_id))
+
+
+def _floor(board_id):
+    row = db.query_one("SELECT change_floor FROM boards WHERE id = ?", (board_id,))
+    return row["change_floor"] if row else 0
+
+
+def changes_since(board_id, since, limit=MAX_CHANGES_PER_FETCH):
+    """Changes after `since` for a board.
+
+    Returns a dict with the changes, the seq to resume from and whether more
+    are pending. `reset` is set when `since` predates compacted history and
+    the client has to reload the whole board instead.
+    """
+    if since < _floor(board_id):
+        return {"reset": True, "changes": [], "seq": latest_seq(board_id), "more": False}
+
+    rows = db.query(
+        """SELECT seq, entity, entity_id, op, data FROM board_changes
+           WHERE board_id = ? AND seq > ?
+           ORDER BY seq
+           LIMIT ?""",
+        (board_id, since, limit + 1),
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    for r in rows:
+        r["data"] = json.loads(r["data"]) if r["data"] else None
+    seq = rows[-1]["seq"] if rows else max(since, latest_seq(board_id))
+    return {"reset": False, "changes": rows, "seq": seq, "more": more}
+
+
+def compact(max_age_days=None, max_per_board=None):
+    """Drop old change-log entries, keeping each board's newest ones.
+
+    Cutoffs are worked out before anything is written, and each board is
+    then trimmed in its own short transaction, so writers are never held
+    up for a pass over the whole log. Returns the number of entries removed.
+    """
+    if max_age_days is None:
+        max_age_days = config.CHANGELOG_MAX_AGE_DAYS
+    if max_per_board is None:
+        max_per_board = config.CHANGELOG_MAX_PER_BOARD
+
+    cutoffs = {}
+    for r in db.query(
+        """SELECT board_id, MAX(seq) AS seq FROM board_changes
+           WHERE created_at < datetime('now', ?)
+           GROUP BY board_id""",
+        (f"-{int(max_age_days)} days",),
+    ):
+        cutoffs[r["board_id"]] = r["seq"]
+    for r in db.query(
+        """SELECT board_id, MAX(seq) AS seq FROM (
+               SELECT board_id, seq,
+                      ROW_NUMBER() OVER (PARTITION BY board_id ORDER BY seq DESC) AS rn
+               FROM board_changes
+           ) WHERE rn > ?
+           GROUP BY board_id""",
+        (max_per_board,),
+    ):
+        cutoffs[r["board_id"]] = max(cutoffs.get(r["board_id"], 0), r["seq"])
+
+    with db.transaction() as conn:
+        removed = conn.execute(
+            "DELETE FROM board_changes WHERE board_id NOT IN (SELECT id FROM boards)"
+        ).rowcount
+    for board_id, seq in cutoffs.items():
+        with db.transaction() as conn:
+            removed += conn.execute(
+                "DELETE FROM board_changes WHERE board_id = ? AND seq <= ?",
+                (board_id, seq),
+            ).rowcount
+            conn.execute(
+                "UPDATE boards SET change_floor = MAX(change_floor, ?) WHERE id = ?",
+                (seq, board_id),
+            )
+    return removed
+
+
+# ── Scheduling ─────────────────────────────────────────────
+
+def start_scheduler():
+    """Start this process's compaction thread, unless it is running or disabled.
+
+    It compacts every CHANGELOG_COMPACT_INTERVAL seconds, off the request
+    path; `flask compact-changes` does the same on demand.
+    """
+    global _scheduler
+    if _scheduler is not None or config.CHANGELOG_COMPACT_INTERVAL <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_schedule_loop, name="changelog-compact", daemon=True)
+            _scheduler.start()
+
+
+def _schedule_loop():
+    while True:
+        time.sleep(config.CHANGELOG_COMPACT_INTERVAL)
+        try:
+            compact()
+        except Exception:
+            # Nothing was half-done; try again next interval
+            pass
+        finally:
+            db.close_conn()
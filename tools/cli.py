@@ -0,0 +1,118 @@
+import click
+
+
+def register_commands(app):
+    @app.cli.command("compact-changes")
+    @click.option("--max-age-days", type=int, default=None, help="Drop entries older than this.")
+    @click.option("--max-per-board", type=int, default=None, help="Keep at most this many per board.")
+    def compact_changes(max_age_days, max_per_board):
+        """Compact the per-board change log."""
+        from tools import changelog
+        removed = changelog.compact(max_age_days, max_per_board)
+        click.echo(f"Removed {removed} change-log entries.")
+
+    @app.cli.command("migrate-blobs")
+    @click.option("--batch-size", type=int, default=200, show_default=True)
+    def migrate_blobs(batch_size):
+        """Move uploads and email attachments stored before the blob store into it."""
+        from tools import blobs
+        result = blobs.migrate_legacy(batch_size)
+        click.echo(f"Migrated {result['migrated']} files; {result['missing']} missing on disk.")
+
+    @app.cli.command("backfill-thumbnails")
+    @click.option("--retry-failed", is_flag=True, help="Also retry blobs whose generation failed.")
+    def backfill_thumbnails(retry_failed):
+        """Generate missing thumbnails for stored images."""
+        from tools import thumbnails
+        counts = thumbnails.backfill(retry_failed=retry_failed)
+        click.echo(f"Generated {counts['ready']}, failed {counts['failed']}, "
+                   f"skipped {counts['skipped']}.")
+
+    @app.cli.command("reconcile-thumbnails")
+    @click.option("--regenerate", is_flag=True, help="Generate whatever was found missing.")
+    def reconcile_thumbnails(regenerate):
+        """Repair recorded thumbnail state where it disagrees with the disk."""
+        from tools import thumbnails
+        counts = thumbnails.reconcile()
+        click.echo(f"Requeued {counts['requeued']}, marked ready {counts['repaired']}, "
+                   f"updated {counts['legacy']} legacy files.")
+        if regenerate:
+            counts = thumbnails.backfill()
+            click.echo(f"Generated {counts['ready']}, failed {counts['failed']}.")
+
+    @app.cli.command("backfill-tiles")
+    @click.option("--retry-failed", is_flag=True, help="Also retry images whose pyramid failed.")
+    def backfill_tiles(retry_failed):
+        """Build deep-zoom tile pyramids for large images that lack one."""
+        from tools import tiles
+        counts = tiles.backfill(retry_failed=retry_failed)
+        click.echo(f"Tiled {counts['ready']}, failed {counts['failed']}.")
+
+    @app.cli.command("cleanup-uploads")
+    @click.option("--max-age-hours", type=int, default=None, help="Drop sessions idle this long.")
+    def cleanup_uploads(max_age_hours):
+        """Remove abandoned chunked-upload sessions and their partial files."""
+        from tools import uploads
+        removed = uploads.cleanup(max_age_hours)
+        click.echo(f"Removed {removed} upload sessions.")
+
+    @app.cli.command("gc-storage")
+    @click.option("--dry-run", is_flag=True, help="Report what would be removed without removing it.")
+    @click.option("--grace-hours", type=int, default=None, help="Keep files touched within this many hours.")
+    @click.option("--batch-size", type=int, default=None, help="Rows and files handled per batch.")
+    def gc_storage(dry_run, grace_hours, batch_size):
+        """Delete stored files and thumbnails that nothing references."""
+        from tools import storage_gc
+        report = storage_gc.collect(dry_run=dry_run, grace_hours=grace_hours, batch_size=batch_size)
+        for category in storage_gc.CATEGORIES:
+            click.echo(f"{category:<12} {report[category]['files']:>8} files "
+                       f"{report[category]['bytes']:>14} bytes")
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        click.echo(f"{verb} {report['total']['bytes']} bytes in {report['total']['files']} files; "
+                   f"removed {report['rows']['cards']} orphaned cards, {report['rows']['blobs']} blobs.")
+
+    @app.cli.command("rebuild-search")
+    def rebuild_search():
+        """Rebuild the full-text search index from cards, tags and emails."""
+        from tools import search
+        count = search.rebuild()
+        click.echo(f"Indexed {count} documents.")
+
+    @app.cli.command("bench-export")
+    @click.argument("board_id")
+    @click.option("--format", "fmt", type=click.Choice(["png", "pdf"]), default="png", show_default=True)
+    @click.option("--runs", type=int, default=3, show_default=True)
+    @click.option("--backend", "backends", multiple=True, type=click.Choice(["native", "browser"]),
+                  help="Backends to time (default both). The browser one needs the app "
+                       "serving at EXPORT_BASE_URL and an active share of the board.")
+    def bench_export(board_id, fmt, runs, backends):
+        """Time a board's export with each rendering backend."""
+        import os
+        import statistics
+        import tempfile
+        import time
+        from tools import db
+        share = db.query_one(
+            """SELECT id FROM shares
+               WHERE board_id = ? AND is_active = 1
+                 AND (expires_at IS NULL OR expires_at > datetime('now'))""",
+            (board_id,),
+        )
+        with tempfile.TemporaryDirectory() as out_dir:
+            for backend in backends or ("native", "browser"):
+                if backend == "browser" and share is None:
+                    click.echo("browser  skipped: the board has no active share")
+                    continue
+                path = os.path.join(out_dir, f"{backend}.{fmt}")
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    if backend == "native":
+                        from tools.native_render import render_board
+                        render_board(board_id, fmt, path)
+                    else:
+                        from tools.export_board import export_board
+                        export_board(share["id"], fmt, output_path=path)
+                    timings.append(time.perf_counter() - start)
+                click.echo(f"{backend:<8} min {min(timings):.3f}s  median {statistics.median(timings):.3f}s  "
+                           f"max {max(timings):.3f}s  {os.path.getsize(path)} bytes")
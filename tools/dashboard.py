@@ -0,0 +1,103 @@
+import base64
+import json
+import config
+from tools import db, access
+
+# Board metadata columns that can be filtered on and counted
+FACETS = ("sales_team", "customer", "brand_site", "category")
+
+
+def parse_filters(args):
+    """Facet filters from request args; empty values mean "any"."""
+    return {f: args.get(f, "").strip() for f in FACETS if args.get(f, "").strip()}
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return config.DASHBOARD_PAGE_SIZE
+    return max(1, min(size, config.DASHBOARD_MAX_PAGE_SIZE))
+
+
+def encode_cursor(board):
+    raw = json.dumps([board["updated_at"], board["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(updated_at, id) of the last board on the previous page, or None if unusable."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, board_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(updated_at, str) or not isinstance(board_id, str):
+        return None
+    return updated_at, board_id
+
+
+def _where(user_id, filters, skip=None):
+    clauses = ["id IN (SELECT value FROM json_each(?))"]
+    params = [access.visible_board_ids_json(user_id)]
+    for facet, value in filters.items():
+        if facet != skip:
+            clauses.append(f"{facet} = ?")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+def list_boards(user_id, filters=None, cursor=None, limit=None):
+    """One page of the boards visible to `user_id`, most recently updated first.
+
+    Pages are keyed on (updated_at, id) rather than an offset, so each page
+    costs the same however deep it is. Returns {"boards", "next_cursor"};
+    `next_cursor` is None on the last page.
+    """
+    filters = filters or {}
+    limit = limit or config.DASHBOARD_PAGE_SIZE
+    where, params = _where(user_id, filters)
+    after = decode_cursor(cursor)
+    if after:
+        where += " AND (updated_at, id) < (?, ?)"
+        params.extend(after)
+    boards = db.query(
+        f"""SELECT * FROM boards WHERE {where}
+            ORDER BY updated_at DESC, id DESC
+            LIMIT ?""",
+        [*params, limit + 1],
+    )
+    next_cursor = encode_cursor(boards[limit - 1]) if len(boards) > limit else None
+    return {"boards": boards[:limit], "next_cursor": next_cursor}
+
+
+def matching_boards(user_id, filters, limit):
+    """Every board visible to `user_id` that matches `filters`, by title, at most `limit`."""
+    where, params = _where(user_id, filters)
+    return db.query(
+        f"SELECT * FROM boards WHERE {where} ORDER BY title, id LIMIT ?",
+        [*params, limit],
+    )
+
+
+def facet_counts(user_id, filters=None):
+    """Board counts per value of each facet.
+
+    Each facet is counted with every other active filter applied but not its
+    own, so the choices shown for a facet are the ones that would still match.
+    """
+    filters = filters or {}
+    counts = {}
+    for facet in FACETS:
+        where, params = _where(user_id, filters, skip=facet)
+        rows = db.query(
+            f"""SELECT {facet} AS value, COUNT(*) AS count FROM boards
+                WHERE {where} AND COALESCE({facet}, '') != ''
+                GROUP BY {facet}
+                ORDER BY count DESC, value""",
+            params,
+        )
+        counts[facet] = [{"value": r["value"], "count": r["count"]} for r in rows]
+    return counts
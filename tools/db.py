@@ -1,37 +1,183 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from flask import g, has_app_context
 import config
 
+# Idle connections shared between requests. Each connection is only ever used
+# by one thread at a time: a request borrows one for its app context and hands
+# it back on teardown; threads without an app context keep their own.
+_pool = queue.LifoQueue(maxsize=config.DB_POOL_SIZE)
+_local = threading.local()
+_dir_ready = False
 
-def get_conn():
-    os.makedirs(os.path.dirname(config.DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(config.DB_PATH, timeout=10.0)
+
+def _connect():
+    global _dir_ready
+    if not _dir_ready:
+        os.makedirs(os.path.dirname(config.DB_PATH), exist_ok=True)
+        _dir_ready = True
+    conn = sqlite3.connect(
+        config.DB_PATH,
+        timeout=10.0,
+        check_same_thread=False,
+        cached_statements=config.DB_STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _acquire():
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _connect()
+
+
+def _release(conn):
+    if conn.in_transaction:
+        conn.rollback()
+    # Callers may toggle foreign keys for a single operation; never hand
+    # a connection to the next borrower with them switched off.
+    conn.execute("PRAGMA foreign_keys=ON")
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def _state():
+    """Per-request state inside an app context, per-thread state outside it."""
+    return g if has_app_context() else _local
+
+
+def get_conn():
+    state = _state()
+    conn = getattr(state, "db_conn", None)
+    if conn is None:
+        conn = _acquire()
+        state.db_conn = conn
+        state.db_tx_depth = 0
     return conn
 
 
+def close_conn(exc=None):
+    """Return the current request's (or thread's) connection to the pool."""
+    state = _state()
+    conn = getattr(state, "db_conn", None)
+    if conn is not None:
+        state.db_conn = None
+        state.db_tx_depth = 0
+        _release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_conn)
+
+
 def init_db():
-    schema_path = os.path.join(config.BASE_DIR, "sql", "001_schema.sql")
-    with open(schema_path, "r") as f:
-        schema = f.read()
+    """Apply any sql/NNN_*.sql migrations that have not run on this database yet."""
     conn = get_conn()
-    conn.executescript(schema)
-    conn.close()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+               name       TEXT PRIMARY KEY,
+               applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+           )"""
+    )
+    conn.commit()
+    applied = {r["name"] for r in conn.execute("SELECT name FROM schema_migrations")}
+    sql_dir = os.path.join(config.BASE_DIR, "sql")
+    for name in sorted(os.listdir(sql_dir)):
+        if name.endswith(".sql") and name not in applied:
+            with open(os.path.join(sql_dir, name), "r") as f:
+                _apply_migration(conn, name, f.read())
 
 
-def query(sql, params=()):
+def _split_statements(script):
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            if current.strip():
+                statements.append(current)
+            current = ""
+    if current.strip():
+        statements.append(current)
+    return statements
+
+
+def _apply_migration(conn, name, script):
+    conn.execute("BEGIN")
+    try:
+        for stmt in _split_statements(script):
+            try:
+                conn.execute(stmt)
+            except sqlite3.OperationalError as e:
+                # Databases created before migrations were tracked may already
+                # have had a column added by hand.
+                if "duplicate column name" not in str(e):
+                    raise
+        conn.execute("INSERT INTO schema_migrations (name) VALUES (?)", (name,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@contextmanager
+def transaction():
+    """Group several statements into one commit. Nested blocks join the outer one."""
     conn = get_conn()
-    rows = conn.execute(sql, params).fetchall()
-    conn.close()
+    state = _state()
+    state.db_tx_depth += 1
+    if state.db_tx_depth == 1:
+        state.db_after_commit = []
+    try:
+        yield conn
+        if state.db_tx_depth == 1:
+            conn.commit()
+    except BaseException:
+        if state.db_tx_depth == 1:
+            conn.rollback()
+            state.db_after_commit = []
+        raise
+    finally:
+        state.db_tx_depth -= 1
+    if state.db_tx_depth == 0:
+        callbacks, state.db_after_commit = state.db_after_commit, []
+        for fn in callbacks:
+            fn()
+
+
+def after_commit(fn):
+    """Run `fn` once the current transaction commits (immediately outside one)."""
+    if _in_transaction():
+        _state().db_after_commit.append(fn)
+    else:
+        fn()
+
+
+def _in_transaction():
+    return getattr(_state(), "db_tx_depth", 0) > 0
+
+
+def _commit(conn):
+    if not _in_transaction():
+        conn.commit()
+
+
+def query(sql, params=()):
+    rows = get_conn().execute(sql, params).fetchall()
     return [dict(r) for r in rows]
 
 
 def query_one(sql, params=()):
-    conn = get_conn()
-    row = conn.execute(sql, params).fetchone()
-    conn.close()
+    row = get_conn().execute(sql, params).fetchone()
     return dict(row) if row else None
 
 
@@ -39,26 +185,27 @@ def execute(sql, params=()):
     conn = get_conn()
     try:
         conn.execute(sql, params)
-        conn.commit()
-    finally:
-        conn.close()
+        _commit(conn)
+    except BaseException:
+        if not _in_transaction():
+            conn.rollback()
+        raise
 
 
 def execute_many(operations):
     """Execute multiple SQL operations in a single transaction"""
-    conn = get_conn()
-    try:
+    with transaction() as conn:
         for sql, params in operations:
             conn.execute(sql, params)
-        conn.commit()
-    finally:
-        conn.close()
 
 
 def execute_returning(sql, params=()):
     conn = get_conn()
-    cursor = conn.execute(sql, params)
-    conn.commit()
-    last_id = cursor.lastrowid
-    conn.close()
-    return last_id
+    try:
+        cursor = conn.execute(sql, params)
+        _commit(conn)
+    except BaseException:
+        if not _in_transaction():
+            conn.rollback()
+        raise
+    return cursor.lastrowid
@@ -1,93 +1,177 @@
+import email as email_lib
+import io
+import json
 import os
 import uuid
 from email import policy
-from email.header import decode_header
 import imapclient
 import config
-from tools import db
+from tools import db, blobs, thumbnails
 
 
-def poll():
-    """Connect to IMAP, fetch unseen emails, store in DB. Returns count fetched."""
-    server = imapclient.IMAPClient(config.IMAP_HOST, port=config.IMAP_PORT, ssl=True)
+def connect():
+    """A logged-in IMAPClient for the configured mailbox."""
+    server = imapclient.IMAPClient(config.IMAP_HOST, port=config.IMAP_PORT, ssl=True,
+                                   timeout=config.IMAP_TIMEOUT)
     server.login(config.MAIL_USER, config.MAIL_PASS)
-    server.select_folder("INBOX")
+    return server
+
+
+def poll(server=None):
+    """Fetch new unseen emails and store them in the DB. Returns count fetched.
+
+    Uses `server` if given (a logged-in IMAPClient, left open), otherwise
+    connects for this one poll.
+    """
+    if server is not None:
+        return ingest(server)
+    server = connect()
+    try:
+        return ingest(server)
+    finally:
+        server.logout()
+
+
+def ingest(server, folder=None):
+    """Store the unseen messages in `folder` above the last UID fetched from it.
+
+    Messages are fetched IMAP_FETCH_BATCH at a time. Each batch is checked
+    against stored emails in one query and written in one transaction with
+    the folder's new high-water mark, so an interrupted poll resumes after
+    the last batch it stored. Returns the number of emails stored.
+    """
+    folder = folder or config.IMAP_FOLDER
+    info = server.select_folder(folder)
+    validity = int(info[b"UIDVALIDITY"])
+    state = _state(folder, validity)
+    last = state["last_uid"]
+    # "n:*" always matches the newest message, even below n
+    uids = sorted(u for u in server.search(["UID", f"{last + 1}:*", "UNSEEN"]) if u > last)
 
-    uids = server.search(["UNSEEN"])
     count = 0
+    for i in range(0, len(uids), config.IMAP_FETCH_BATCH):
+        batch = uids[i:i + config.IMAP_FETCH_BATCH]
+        known = _known(validity, batch, state["legacy_uids"])
+        wanted = [u for u in batch if u not in known]
+        fetched = server.fetch(wanted, ["RFC822"]) if wanted else {}
+        messages = [(uid, _parse(fetched[uid][b"RFC822"])) for uid in wanted if uid in fetched]
 
-    for uid in uids:
-        uid_str = str(uid)
-        # Dedup
-        existing = db.query_one("SELECT id FROM emails WHERE imap_uid = ?", (uid_str,))
-        if existing:
-            continue
-
-        raw = server.fetch([uid], ["RFC822"])
-        if uid not in raw:
-            continue
-
-        import email as email_lib
-        msg = email_lib.message_from_bytes(raw[uid][b"RFC822"], policy=policy.default)
-
-        subject = msg.get("Subject", "(no subject)")
-        from_addr = msg.get("From", "")
-        date_str = msg.get("Date", "")
-
-        body_text = ""
-        body_html = ""
-        attachments = []
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                ct = part.get_content_type()
-                cd = part.get("Content-Disposition", "")
-                if "attachment" in cd or part.get_filename():
-                    att_data = part.get_payload(decode=True)
-                    if att_data:
-                        fname = part.get_filename() or "attachment"
-                        attachments.append({
-                            "filename": fname,
-                            "data": att_data,
-                            "mime_type": ct,
-                        })
-                elif ct == "text/plain" and not body_text:
-                    body_text = part.get_payload(decode=True).decode("utf-8", errors="replace")
-                elif ct == "text/html" and not body_html:
-                    body_html = part.get_payload(decode=True).decode("utf-8", errors="replace")
-        else:
-            ct = msg.get_content_type()
-            payload = msg.get_payload(decode=True)
-            if payload:
-                text = payload.decode("utf-8", errors="replace")
-                if ct == "text/html":
-                    body_html = text
-                else:
-                    body_text = text
-
-        email_id = str(uuid.uuid4())
+        # Attachment files are written before the transaction to keep it
+        # short; if it then fails, storage GC removes the unreferenced blobs.
+        for _, msg in messages:
+            for att in msg["attachments"]:
+                ext = os.path.splitext(att["filename"])[1] or ""
+                att["blob"] = blobs.save_stream(io.BytesIO(att.pop("data")), ext)
+
+        with db.transaction() as conn:
+            for uid, msg in messages:
+                count += _store(conn, f"{validity}:{uid}", msg)
+            conn.execute(
+                "UPDATE imap_state SET last_uid = ?, updated_at = datetime('now') WHERE folder = ?",
+                (batch[-1], folder),
+            )
+    return count
+
+
+def _state(folder, validity):
+    """The folder's sync row, started over if the server's UIDVALIDITY changed."""
+    state = db.query_one("SELECT * FROM imap_state WHERE folder = ?", (folder,))
+    if state is None:
+        # Emails stored before UIDs were namespaced carry the bare UID
+        legacy = db.query_one("SELECT 1 FROM emails WHERE instr(imap_uid, ':') = 0 LIMIT 1")
         db.execute(
-            """INSERT INTO emails (id, imap_uid, from_addr, subject, body_text, body_html, received_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (email_id, uid_str, from_addr, subject, body_text, body_html, date_str),
+            "INSERT OR IGNORE INTO imap_state (folder, uidvalidity, legacy_uids) VALUES (?, ?, ?)",
+            (folder, validity, int(legacy is not None)),
         )
+    elif state["uidvalidity"] != validity:
+        db.execute(
+            """UPDATE imap_state SET uidvalidity = ?, last_uid = 0, legacy_uids = 0,
+                                     updated_at = datetime('now')
+               WHERE folder = ?""",
+            (validity, folder),
+        )
+    else:
+        return state
+    return db.query_one("SELECT * FROM imap_state WHERE folder = ?", (folder,))
 
-        # Save attachments
-        os.makedirs(config.EMAIL_ATTACH_DIR, exist_ok=True)
-        for att in attachments:
-            att_id = str(uuid.uuid4())
-            ext = os.path.splitext(att["filename"])[1] or ""
-            stored_name = f"{att_id}{ext}"
-            save_path = os.path.join(config.EMAIL_ATTACH_DIR, stored_name)
-            with open(save_path, "wb") as f:
-                f.write(att["data"])
-            db.execute(
-                """INSERT INTO email_attachments (id, email_id, original_name, stored_name, mime_type, file_size)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (att_id, email_id, att["filename"], stored_name, att["mime_type"], len(att["data"])),
-            )
 
-        count += 1
+def _known(validity, uids, legacy):
+    """Those of `uids` already stored as emails."""
+    keys = {f"{validity}:{u}": u for u in uids}
+    if legacy:
+        keys.update({str(u): u for u in uids})
+    rows = db.query(
+        "SELECT imap_uid FROM emails WHERE imap_uid IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(keys)),),
+    )
+    return {keys[r["imap_uid"]] for r in rows}
 
-    server.logout()
-    return count
+
+def _parse(raw):
+    msg = email_lib.message_from_bytes(raw, policy=policy.default)
+
+    body_text = ""
+    body_html = ""
+    attachments = []
+
+    if msg.is_multipart():
+        for part in msg.walk():
+            ct = part.get_content_type()
+            cd = part.get("Content-Disposition", "")
+            if "attachment" in cd or part.get_filename():
+                att_data = part.get_payload(decode=True)
+                if att_data:
+                    fname = part.get_filename() or "attachment"
+                    attachments.append({
+                        "filename": fname,
+                        "data": att_data,
+                        "mime_type": ct,
+                    })
+            elif ct == "text/plain" and not body_text:
+                body_text = part.get_payload(decode=True).decode("utf-8", errors="replace")
+            elif ct == "text/html" and not body_html:
+                body_html = part.get_payload(decode=True).decode("utf-8", errors="replace")
+    else:
+        ct = msg.get_content_type()
+        payload = msg.get_payload(decode=True)
+        if payload:
+            text = payload.decode("utf-8", errors="replace")
+            if ct == "text/html":
+                body_html = text
+            else:
+                body_text = text
+
+    return {
+        "subject": msg.get("Subject", "(no subject)"),
+        "from_addr": msg.get("From", ""),
+        "date": msg.get("Date", ""),
+        "body_text": body_text,
+        "body_html": body_html,
+        "attachments": attachments,
+    }
+
+
+def _store(conn, imap_uid, msg):
+    """Insert one parsed email and its attachments. Returns 0 if another poller got there first."""
+    email_id = str(uuid.uuid4())
+    inserted = conn.execute(
+        """INSERT OR IGNORE INTO emails
+               (id, imap_uid, from_addr, subject, body_text, body_html, received_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (email_id, imap_uid, msg["from_addr"], msg["subject"], msg["body_text"],
+         msg["body_html"], msg["date"]),
+    ).rowcount
+    if not inserted:
+        return 0
+    for att in msg["attachments"]:
+        blob = att["blob"]
+        blobs.register(blob["sha256"], blob["stored_name"], blob["size"])
+        conn.execute(
+            """INSERT INTO email_attachments
+                   (id, email_id, original_name, stored_name, mime_type, file_size, blob_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (str(uuid.uuid4()), email_id, att["filename"], blob["stored_name"],
+             att["mime_type"], blob["size"], blob["sha256"]),
+        )
+        thumbnails.enqueue(blob["sha256"])
+    return 1
@@ -7,7 +7,7 @@ from email import encoders
 import config
 
 
-def send_board_email(to_addr, subject, body, attachment_path=None):
+def send_board_email(to_addr, subject, body, attachment_path=None, attachment_name=None):
     msg = MIMEMultipart()
     msg["From"] = config.MAIL_USER
     msg["To"] = to_addr
@@ -21,7 +21,7 @@ def send_board_email(to_addr, subject, body, attachment_path=None):
             encoders.encode_base64(part)
             part.add_header(
                 "Content-Disposition",
-                f"attachment; filename={os.path.basename(attachment_path)}",
+                f"attachment; filename={attachment_name or os.path.basename(attachment_path)}",
             )
             msg.attach(part)
 
@@ -0,0 +1,204 @@
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import threading
+import time
+import config
+from tools import db
+
+log = logging.getLogger("email_worker")
+
+# Millisecond timestamps for the times lag is measured from
+NOW_MS = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# States in which the worker is connected and keeping up
+ACTIVE_STATES = ("idle", "polling", "syncing")
+
+
+# ── Web side ───────────────────────────────────────────────
+
+def request_poll(folder=None):
+    """Ask the worker to check the mailbox now. It picks this up within IMAP_IDLE_CHECK seconds."""
+    db.execute(
+        f"""INSERT INTO email_worker (folder, poll_requested_at) VALUES (?, {NOW_MS})
+           ON CONFLICT(folder) DO UPDATE
+           SET poll_requested_at = COALESCE(poll_requested_at, excluded.poll_requested_at)""",
+        (folder or config.IMAP_FOLDER,),
+    )
+
+
+def status(folder=None):
+    """The worker's status row, plus `healthy`, `heartbeat_age` and `lag_seconds`.
+
+    `lag_seconds` is how long new mail the worker has been told about (or a
+    poll request) has been waiting to be stored; 0 when it is caught up.
+    """
+    row = db.query_one(
+        """SELECT *,
+                  CAST((julianday('now') - julianday(heartbeat_at)) * 86400 AS INTEGER) AS heartbeat_age,
+                  CAST((julianday('now') - julianday(COALESCE(pending_since, poll_requested_at)))
+                       * 86400 AS INTEGER) AS lag_seconds
+           FROM email_worker WHERE folder = ?""",
+        (folder or config.IMAP_FOLDER,),
+    )
+    if row is None:
+        return {"folder": folder or config.IMAP_FOLDER, "state": "never_run",
+                "healthy": False, "lag_seconds": None}
+    row["lag_seconds"] = row["lag_seconds"] or 0
+    row["healthy"] = (row["state"] in ACTIVE_STATES and row["heartbeat_age"] is not None
+                      and row["heartbeat_age"] <= config.IMAP_WORKER_STALE)
+    return row
+
+
+# ── Worker ─────────────────────────────────────────────────
+
+def _update(folder, sql="", params=()):
+    """Set columns on the folder's status row, beating the heartbeat as well."""
+    assignments = f"{sql}, " if sql else ""
+    db.execute(
+        f"UPDATE email_worker SET {assignments}heartbeat_at = datetime('now') WHERE folder = ?",
+        (*params, folder),
+    )
+
+
+def run(stop):
+    """Keep `config.IMAP_FOLDER` ingested until the `stop` event is set.
+
+    Connects, catches up on anything missed, then waits in IDLE so new mail
+    is stored within seconds. Any failure drops the connection and retries
+    after a jittered, doubling delay, which resets once a connection has
+    caught up.
+    """
+    from tools import email_poller
+    folder = config.IMAP_FOLDER
+    db.execute("INSERT OR IGNORE INTO email_worker (folder) VALUES (?)", (folder,))
+    _update(folder, "state = 'starting', pid = ?", (os.getpid(),))
+    delay = config.IMAP_BACKOFF_MIN
+    while not stop.is_set():
+        server = None
+        try:
+            server = email_poller.connect()
+            _update(folder, "state = 'syncing', connected_at = datetime('now')")
+            log.info("connected to %s", config.IMAP_HOST)
+            _sync(server, folder)
+            delay = config.IMAP_BACKOFF_MIN
+            _serve(server, folder, stop)
+        except Exception as e:
+            wait = delay * random.uniform(0.5, 1)
+            log.warning("%s: %s; reconnecting in %.1fs", type(e).__name__, e, wait)
+            _update(folder, """state = 'backoff', connected_at = NULL, failures = failures + 1,
+                               last_error = ?, last_error_at = datetime('now')""",
+                    (f"{type(e).__name__}: {e}",))
+            stop.wait(wait)
+            delay = min(delay * 2, config.IMAP_BACKOFF_MAX)
+        finally:
+            if server is not None:
+                _logout(server)
+    _update(folder, "state = 'stopped', connected_at = NULL")
+    db.close_conn()
+
+
+def _serve(server, folder, stop):
+    """Wait for mail on a connected, caught-up server until stopped or it fails."""
+    idle = b"IDLE" in server.capabilities()
+    state = "idle" if idle else "polling"
+    last_sync = time.monotonic()
+    while not stop.is_set():
+        _update(folder, "state = ?", (state,))
+        if idle:
+            server.idle()
+            _wait(folder, stop, last_sync, config.IMAP_IDLE_RENEW, lambda: _idle_check(server))
+            server.idle_done()
+        else:
+            _wait(folder, stop, last_sync, config.IMAP_POLL_INTERVAL, lambda: _sleep(stop))
+        if stop.is_set():
+            return
+        _sync(server, folder)
+        last_sync = time.monotonic()
+
+
+def _wait(folder, stop, last_sync, limit, check):
+    """Beat the heartbeat every check until there is something to ingest.
+
+    Returns on new mail, a poll request, the resync interval passing since
+    `last_sync`, `limit` seconds of waiting, or `check` returning None.
+    """
+    started = time.monotonic()
+    while not stop.is_set():
+        responses = check()
+        if responses is None:
+            return
+        if any(len(r) > 1 and r[1] == b"EXISTS" for r in responses):
+            _update(folder, f"pending_since = COALESCE(pending_since, {NOW_MS})")
+            return
+        with db.transaction() as conn:
+            requested = conn.execute(
+                """UPDATE email_worker
+                   SET pending_since = COALESCE(pending_since, poll_requested_at), poll_requested_at = NULL
+                   WHERE folder = ? AND poll_requested_at IS NOT NULL""",
+                (folder,),
+            ).rowcount
+            _update(folder)
+        now = time.monotonic()
+        if requested or now - started >= limit or now - last_sync >= config.IMAP_RESYNC_INTERVAL:
+            return
+
+
+def _idle_check(server):
+    """IDLE responses, or None if the connection may have dropped.
+
+    idle_check() swallows EOF and returns nothing straight away; leaving
+    IDLE then raises, so the caller reconnects.
+    """
+    started = time.monotonic()
+    responses = server.idle_check(timeout=config.IMAP_IDLE_CHECK)
+    if not responses and time.monotonic() - started < config.IMAP_IDLE_CHECK / 2:
+        return None
+    return responses
+
+
+def _sleep(stop):
+    stop.wait(config.IMAP_IDLE_CHECK)
+    return []
+
+
+def _sync(server, folder):
+    from tools import email_poller
+    _update(folder, "state = 'syncing'")
+    count = email_poller.ingest(server, folder)
+    _update(folder, """synced_at = datetime('now'), last_fetched = ?, failures = 0,
+                       last_lag_ms = CASE WHEN pending_since IS NULL THEN last_lag_ms ELSE
+                           CAST((julianday('now') - julianday(pending_since)) * 86400000 AS INTEGER) END,
+                       pending_since = NULL""",
+            (count,))
+    if count:
+        log.info("stored %d new email(s)", count)
+
+
+def _logout(server):
+    try:
+        server.logout()
+    except Exception:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest email from IMAP continuously using IDLE.")
+    parser.add_argument("--status", action="store_true", help="Print the worker's status and exit.")
+    args = parser.parse_args(argv)
+    db.init_db()
+    if args.status:
+        print(json.dumps(status(), indent=2))
+        return
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    run(stop)
+
+
+if __name__ == "__main__":
+    main()
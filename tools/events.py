@@ -0,0 +1,90 @@
+import json
+import queue
+import threading
+import config
+from tools import db, changelog
+
+# Browsers wait this long before reconnecting a dropped stream
+RETRY_MS = 3000
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Hub:
+    """In-process publish/subscribe of "board changed" notifications.
+
+    Subscribers only learn that a board has new change-log entries; the
+    entries themselves are read from the change log, so a notification that
+    is coalesced or missed (e.g. a change made by another worker) is picked
+    up on the next wake-up or heartbeat.
+    """
+
+    def __init__(self, max_subscribers):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._count = 0
+
+    def subscribe(self, board_id):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers()
+            q = queue.Queue(maxsize=1)
+            self._subscribers.setdefault(board_id, set()).add(q)
+            self._count += 1
+            return q
+
+    def unsubscribe(self, board_id, q):
+        with self._lock:
+            subs = self._subscribers.get(board_id)
+            if subs and q in subs:
+                subs.discard(q)
+                self._count -= 1
+                if not subs:
+                    del self._subscribers[board_id]
+
+    def publish(self, board_id):
+        with self._lock:
+            subs = list(self._subscribers.get(board_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(True)
+            except queue.Full:
+                pass  # a wake-up is already pending
+
+
+hub = Hub(config.SSE_MAX_SUBSCRIBERS)
+
+
+def publish(board_id):
+    """Notify subscribers of `board_id` once the current transaction commits."""
+    db.after_commit(lambda: hub.publish(board_id))
+
+
+def _format(event, seq, data):
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream(board_id, q, since):
+    """Yield SSE frames for a board's changes after `since` until the client goes away."""
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            result = changelog.changes_since(board_id, since)
+            # Don't hold a pooled connection while the stream is idle
+            db.close_conn()
+            if result["reset"]:
+                yield _format("reset", result["seq"], {"seq": result["seq"]})
+            for ch in result["changes"]:
+                yield _format("change", ch["seq"], ch)
+            since = result["seq"]
+            if result["more"]:
+                continue
+            try:
+                q.get(timeout=config.SSE_HEARTBEAT)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+    finally:
+        hub.unsubscribe(board_id, q)
@@ -1,28 +1,156 @@
+import asyncio
+import atexit
 import os
+import tempfile
+import threading
 import config
 
+# board_public.html sets this once cards, images and connection lines are drawn
+RENDERED = "window.boardRendered === true"
 
-def export_board(share_id, fmt="png"):
-    """Export a shared board as PDF or PNG using Playwright."""
-    from playwright.sync_api import sync_playwright
+VIEWPORT = {"width": 1400, "height": 900}
 
-    output_dir = os.path.join(config.BASE_DIR, ".tmp")
-    os.makedirs(output_dir, exist_ok=True)
+_loop = None
+_loop_lock = threading.Lock()
+_pool = None
+
+
+def export_board(share_id, fmt="png", output_path=None):
+    """Export a shared board as PDF or PNG using a pooled headless Chromium.
 
+    Writes to `output_path` (default .tmp/export_<share_id>.<ext>) and
+    returns it. Blocks the calling thread until the file is written. At most
+    EXPORT_CONCURRENCY exports render at once per process; the rest queue.
+    """
     ext = "pdf" if fmt == "pdf" else "png"
-    output_path = os.path.join(output_dir, f"export_{share_id}.{ext}")
+    if output_path is None:
+        output_path = os.path.join(config.BASE_DIR, ".tmp", f"export_{share_id}.{ext}")
+    output_dir = os.path.dirname(output_path)
+    os.makedirs(output_dir, exist_ok=True)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page(viewport={"width": 1400, "height": 900})
-        page.goto(f"http://127.0.0.1:5000/s/{share_id}")
-        page.wait_for_timeout(2000)  # Wait for cards and lines to render
+    # Concurrent exports of one board mustn't hand out a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix=f".{ext}")
+    os.close(fd)
+    try:
+        asyncio.run_coroutine_threadsafe(_render(share_id, ext, tmp_path), _browser_loop()).result()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
 
-        if fmt == "pdf":
-            page.pdf(path=output_path, format="A3", landscape=True)
-        else:
-            page.screenshot(path=output_path, full_page=True)
 
-        browser.close()
+async def _render(share_id, fmt, output_path):
+    global _pool
+    if _pool is None:
+        _pool = _BrowserPool()
+    timeout = config.EXPORT_TIMEOUT * 1000
+    context, uses = await _pool.acquire()
+    ok = False
+    try:
+        page = await context.new_page()
+        try:
+            await page.goto(f"{config.EXPORT_BASE_URL}/s/{share_id}",
+                            wait_until="domcontentloaded", timeout=timeout)
+            await page.wait_for_function(RENDERED, timeout=timeout)
+            if fmt == "pdf":
+                await page.pdf(path=output_path, format="A3", landscape=True)
+            else:
+                await page.screenshot(path=output_path, full_page=True)
+        finally:
+            await page.close()
+        ok = True
+    finally:
+        await _pool.release(context, uses + 1, reuse=ok)
 
-    return output_path
+
+# ── Browser pool ───────────────────────────────────────────
+
+def _browser_loop():
+    """Event loop owning the browser, on its own thread.
+
+    Playwright objects may only be used from the loop that created them, so
+    every request thread hands its export to this one.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="export-browser", daemon=True).start()
+            atexit.register(_shutdown)
+        return _loop
+
+
+def _shutdown():
+    if _pool is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(_pool.close(), _loop).result(timeout=5)
+        except Exception:
+            pass
+
+
+class _BrowserPool:
+    """One Chromium per process with warm, reusable browser contexts.
+
+    Contexts keep their HTTP cache between exports, so scripts, styles and
+    thumbnails are usually already loaded. A context is retired after
+    EXPORT_CONTEXT_MAX_USES exports or a failed one, and the browser is
+    relaunched if it dies.
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._slots = asyncio.Semaphore(config.EXPORT_CONCURRENCY)
+        self._launch_lock = asyncio.Lock()
+
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                from playwright.async_api import async_playwright
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+                self._idle = []
+            return self._browser
+
+    async def acquire(self):
+        """Wait for a free slot and return (context, times used)."""
+        await self._slots.acquire()
+        try:
+            browser = await self._ensure_browser()
+            if self._idle:
+                return self._idle.pop()
+            return await browser.new_context(viewport=VIEWPORT), 0
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, context, uses, reuse=True):
+        try:
+            if (reuse and uses < config.EXPORT_CONTEXT_MAX_USES
+                    and context.browser is self._browser and self._browser.is_connected()):
+                self._idle.append((context, uses))
+            else:
+                await _quietly(context.close())
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        for context, _ in self._idle:
+            await _quietly(context.close())
+        self._idle = []
+        if self._browser is not None:
+            await _quietly(self._browser.close())
+        if self._playwright is not None:
+            await _quietly(self._playwright.stop())
+
+
+async def _quietly(coro):
+    """Await a cleanup call whose target may already be gone."""
+    try:
+        await coro
+    except Exception:
+        pass
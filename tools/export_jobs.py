@@ -0,0 +1,348 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import has_app_context
+from werkzeug.utils import secure_filename
+import config
+from tools import db
+
+FORMATS = ("png", "pdf")
+
+# Marks the jobs this process holds. It beats their updated_at every
+# EXPORT_HEARTBEAT seconds, so rows that stop being beaten belong to a
+# process that has gone.
+WORKER_ID = str(uuid.uuid4())
+
+_executor = None
+_executor_lock = threading.Lock()
+_heartbeat = None
+
+
+class ExportError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _pool():
+    """Threads that run export jobs, created on first use.
+
+    With the browser backend these threads only wait on the browser pool
+    (tools/export_board); with the native one they render themselves.
+    Either way web workers never do.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.EXPORT_WORKERS,
+                                           thread_name_prefix="export")
+        return _executor
+
+
+def start():
+    """Start this process's heartbeat thread, unless it is running.
+
+    Each beat also recovers jobs left by processes that died: queued jobs
+    are taken over and run here, running ones are marked failed.
+    """
+    global _heartbeat
+    if _heartbeat is not None:
+        return
+    with _executor_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="export-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _heartbeat_loop():
+    while True:
+        try:
+            _beat()
+            _recover()
+        except Exception:
+            # Try again next beat
+            pass
+        finally:
+            db.close_conn()
+        time.sleep(config.EXPORT_HEARTBEAT)
+
+
+def _stale():
+    return f"-{config.EXPORT_JOB_STALE} seconds"
+
+
+def _beat():
+    db.execute(
+        """UPDATE export_jobs SET updated_at = datetime('now')
+           WHERE worker = ? AND state IN ('queued', 'running')""",
+        (WORKER_ID,),
+    )
+
+
+def _recover():
+    db.execute(
+        """UPDATE export_jobs SET state = 'failed', error = 'Export was interrupted',
+                                  updated_at = datetime('now')
+           WHERE state = 'running' AND updated_at < datetime('now', ?)""",
+        (_stale(),),
+    )
+    for r in db.query(
+        """SELECT id FROM export_jobs
+           WHERE state = 'queued' AND updated_at < datetime('now', ?)
+           ORDER BY created_at""",
+        (_stale(),),
+    ):
+        # Claimed row by row so that only one process takes each job over
+        with db.transaction() as conn:
+            claimed = conn.execute(
+                """UPDATE export_jobs SET worker = ?, updated_at = datetime('now')
+                   WHERE id = ? AND state = 'queued' AND updated_at < datetime('now', ?)""",
+                (WORKER_ID, r["id"], _stale()),
+            ).rowcount
+        if claimed:
+            _pool().submit(_run, r["id"])
+
+
+def result_path(board_id, revision, fmt):
+    return os.path.join(config.EXPORT_DIR, board_id, f"{revision}.{fmt}")
+
+
+def download_name(board, fmt):
+    return f"{secure_filename(board['title']) or 'board'}.{fmt}"
+
+
+# ── Jobs ───────────────────────────────────────────────────
+
+def submit(board, fmt, user_id, email_to=None):
+    """Queue an export of `board` at its current revision. Returns the job row.
+
+    An export already cached for that revision and format finishes at once,
+    and one already queued or running is returned instead of starting
+    another. Jobs that also email the result always run, but reuse the
+    cached file.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    revision = board["revision"]
+    if email_to is None:
+        running = db.query_one(
+            """SELECT * FROM export_jobs
+               WHERE board_id = ? AND revision = ? AND format = ? AND email_to IS NULL
+                 AND state IN ('queued', 'running') AND updated_at > datetime('now', ?)
+               ORDER BY created_at LIMIT 1""",
+            (board["id"], revision, fmt, _stale()),
+        )
+        if running:
+            return running
+
+    state = "done" if email_to is None and _cached(board["id"], revision, fmt) else "queued"
+    if state == "queued":
+        backlog = db.query_one(
+            """SELECT COUNT(*) AS n FROM export_jobs
+               WHERE state IN ('queued', 'running') AND updated_at > datetime('now', ?)""",
+            (_stale(),),
+        )["n"]
+        if backlog >= config.EXPORT_QUEUE_MAX:
+            raise ExportError("Too many exports in progress; try again shortly", status=503)
+
+    start()
+    job_id = str(uuid.uuid4())
+    with db.transaction():
+        db.execute(
+            """INSERT INTO export_jobs (id, board_id, user_id, revision, format, email_to, state, worker)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, board["id"], user_id, revision, fmt, email_to, state, WORKER_ID),
+        )
+        if state == "queued":
+            db.after_commit(lambda: _pool().submit(_run, job_id))
+    return get(job_id)
+
+
+def get(job_id):
+    return db.query_one("SELECT * FROM export_jobs WHERE id = ?", (job_id,))
+
+
+def result(job):
+    """Path of a finished job's file, or None if it has been evicted since."""
+    if job["state"] != "done" or not _cached(job["board_id"], job["revision"], job["format"]):
+        return None
+    return result_path(job["board_id"], job["revision"], job["format"])
+
+
+def _set_state(job_id, state, error=None):
+    db.execute(
+        "UPDATE export_jobs SET state = ?, error = ?, updated_at = datetime('now') WHERE id = ?",
+        (state, error, job_id),
+    )
+
+
+def render(job, path):
+    """Render a job's board with the configured EXPORT_BACKEND."""
+    if config.EXPORT_BACKEND == "native":
+        from tools.native_render import render_board
+        render_board(job["board_id"], job["format"], path)
+    else:
+        from tools.export_board import export_board
+        export_board(render_share(job["board_id"], job["user_id"]), job["format"], output_path=path)
+
+
+def render_share(board_id, user_id):
+    """A share link the browser can render `board_id` through.
+
+    Reuses an active one that stays valid for at least half of
+    EXPORT_SHARE_TTL_MINUTES, otherwise creates one that expires after
+    EXPORT_SHARE_TTL_MINUTES. Only the browser backend needs one.
+    """
+    ttl = config.EXPORT_SHARE_TTL_MINUTES
+    share = db.query_one(
+        """SELECT id FROM shares
+           WHERE board_id = ? AND is_active = 1
+             AND (expires_at IS NULL OR expires_at > datetime('now', ?))
+           ORDER BY expires_at IS NOT NULL, expires_at DESC LIMIT 1""",
+        (board_id, f"+{ttl // 2} minutes"),
+    )
+    if share:
+        return share["id"]
+    share_id = str(uuid.uuid4())
+    db.execute(
+        """INSERT INTO shares (id, board_id, created_by, expires_at)
+           VALUES (?, ?, ?, datetime('now', ?))""",
+        (share_id, board_id, user_id, f"+{ttl} minutes"),
+    )
+    return share_id
+
+
+def rendering(job):
+    """Path of the cached rendering for a job's board, revision and format.
+
+    Renders and caches it first if there is none, blocking until then.
+    """
+    board_id, revision, fmt = job["board_id"], job["revision"], job["format"]
+    path = result_path(board_id, revision, fmt)
+    if not _cached(board_id, revision, fmt):
+        render(job, path)
+        _store(board_id, revision, fmt, os.path.getsize(path))
+    return path
+
+
+def _run(job_id):
+    try:
+        # Another process may have taken the job over
+        with db.transaction() as conn:
+            claimed = conn.execute(
+                """UPDATE export_jobs SET state = 'running', updated_at = datetime('now')
+                   WHERE id = ? AND state = 'queued' AND worker = ?""",
+                (job_id, WORKER_ID),
+            ).rowcount
+        if not claimed:
+            return
+        job = db.query_one("SELECT * FROM export_jobs WHERE id = ?", (job_id,))
+        board_id, fmt = job["board_id"], job["format"]
+        path = rendering(job)
+        if job["email_to"]:
+            from tools.email_sender import send_board_email
+            board = db.query_one("SELECT title FROM boards WHERE id = ?", (board_id,))
+            send_board_email(
+                job["email_to"],
+                f"Board: {board['title']}",
+                f"Please find the board '{board['title']}' attached.",
+                path,
+                attachment_name=download_name(board, fmt),
+            )
+        _set_state(job_id, "done")
+        evict()
+    except Exception as e:
+        _set_state(job_id, "failed", f"{type(e).__name__}: {e}")
+    finally:
+        # Pool threads have no request to return their connection at teardown
+        if not has_app_context():
+            db.close_conn()
+
+
+# ── Result cache ───────────────────────────────────────────
+
+def _cached(board_id, revision, fmt):
+    """Whether a rendering is cached; counts as a use for LRU eviction."""
+    row = db.query_one(
+        "SELECT 1 FROM export_results WHERE board_id = ? AND revision = ? AND format = ?",
+        (board_id, revision, fmt),
+    )
+    if row is None:
+        return False
+    if not os.path.exists(result_path(board_id, revision, fmt)):
+        db.execute(
+            "DELETE FROM export_results WHERE board_id = ? AND revision = ? AND format = ?",
+            (board_id, revision, fmt),
+        )
+        return False
+    db.execute(
+        """UPDATE export_results SET last_used_at = datetime('now')
+           WHERE board_id = ? AND revision = ? AND format = ?""",
+        (board_id, revision, fmt),
+    )
+    return True
+
+
+def _store(board_id, revision, fmt, size):
+    """Record a rendering. Older revisions of the board can't be asked for again, so they go."""
+    with db.transaction():
+        db.execute(
+            """INSERT OR REPLACE INTO export_results (board_id, revision, format, size)
+               VALUES (?, ?, ?, ?)""",
+            (board_id, revision, fmt, size),
+        )
+        _drop(db.query(
+            "SELECT board_id, revision, format FROM export_results WHERE board_id = ? AND revision < ?",
+            (board_id, revision),
+        ))
+
+
+def _drop(rows):
+    """Forget cached renderings and delete their files once that commits."""
+    with db.transaction():
+        for r in rows:
+            db.execute(
+                "DELETE FROM export_results WHERE board_id = ? AND revision = ? AND format = ?",
+                (r["board_id"], r["revision"], r["format"]),
+            )
+            path = result_path(r["board_id"], r["revision"], r["format"])
+            db.after_commit(lambda path=path: _unlink(path))
+
+
+def evict():
+    """Keep the cache within EXPORT_CACHE_MAX_AGE_HOURS and EXPORT_CACHE_MAX_BYTES.
+
+    Removes renderings past the age limit, then the least recently used
+    until the total fits. Also forgets finished jobs older than
+    EXPORT_JOB_TTL_HOURS and share links that have expired.
+    """
+    _drop(db.query(
+        "SELECT board_id, revision, format FROM export_results WHERE created_at < datetime('now', ?)",
+        (f"-{config.EXPORT_CACHE_MAX_AGE_HOURS} hours",),
+    ))
+    total = db.query_one("SELECT COALESCE(SUM(size), 0) AS n FROM export_results")["n"]
+    if total > config.EXPORT_CACHE_MAX_BYTES:
+        victims = []
+        for r in db.query(
+            "SELECT board_id, revision, format, size FROM export_results ORDER BY last_used_at, created_at"
+        ):
+            if total <= config.EXPORT_CACHE_MAX_BYTES:
+                break
+            victims.append(r)
+            total -= r["size"]
+        _drop(victims)
+    db.execute(
+        """DELETE FROM export_jobs
+           WHERE state IN ('done', 'failed') AND updated_at < datetime('now', ?)""",
+        (f"-{config.EXPORT_JOB_TTL_HOURS} hours",),
+    )
+    db.execute("DELETE FROM shares WHERE expires_at < datetime('now')")
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,241 @@
+import bisect
+import re
+import socket
+import socketserver
+import threading
+import time
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+
+# Returned by a command handler when the client went away mid-command
+_CLOSED = object()
+
+
+class FakeIMAPServer:
+    """In-memory IMAP server on localhost for exercising the email poller.
+
+    Speaks just enough IMAP4rev1 for IMAPClient over plain TCP: LOGIN (any
+    credentials), SELECT/EXAMINE of one folder, UID SEARCH on UID ranges,
+    ALL, SEEN and UNSEEN, UID FETCH of RFC822, BODY[] and FLAGS, IDLE (with
+    EXISTS pushed on delivery), NOOP and LOGOUT. Fetching a message's body
+    marks it seen, as a real server does.
+    `latency` (seconds) delays every response, to stand in for a remote one.
+    """
+
+    def __init__(self, folder="INBOX", uidvalidity=1, latency=0):
+        self.folder = folder
+        self.latency = latency
+        self.uidvalidity = uidvalidity
+        self.messages = {}  # uid -> (raw bytes, set of flags)
+        self._next_uid = 1
+        self.lock = threading.RLock()
+        self._server = None
+        self._connections = set()
+        self._idling = set()
+
+    def add(self, raw, seen=False):
+        """Deliver a message. Returns its UID."""
+        with self.lock:
+            uid = self._next_uid
+            self._next_uid += 1
+            self.messages[uid] = (raw, {rb"\Seen"} if seen else set())
+            for handler in self._idling:
+                try:
+                    handler._send(b"* %d EXISTS" % len(self.messages))
+                except OSError:
+                    pass
+        return uid
+
+    def reset(self, uidvalidity):
+        """Empty the folder under a new UIDVALIDITY, as after a mailbox rebuild."""
+        with self.lock:
+            self.uidvalidity = uidvalidity
+            self.messages = {}
+            self._next_uid = 1
+
+    def disconnect(self):
+        """Drop every open connection, as a server restart would."""
+        with self.lock:
+            for handler in list(self._connections):
+                try:
+                    handler.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def start(self):
+        """Listen on a free local port in a background thread. Returns the port."""
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.imap = self
+        threading.Thread(target=self._server.serve_forever, name="fake-imap", daemon=True).start()
+        return self.port
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def stop(self):
+        self.disconnect()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def uids(self, spec):
+        """UIDs matched by an IMAP sequence set such as "1:5,9,12:*"."""
+        with self.lock:
+            existing = sorted(self.messages)
+        top = existing[-1] if existing else 0
+        wanted = set()
+        for part in spec.split(","):
+            lo, _, hi = part.partition(":")
+            lo = top if lo == "*" else int(lo)
+            hi = lo if not hi else top if hi == "*" else int(hi)
+            lo, hi = min(lo, hi), max(lo, hi)
+            wanted.update(existing[bisect.bisect_left(existing, lo):bisect.bisect_right(existing, hi)])
+        return sorted(wanted)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Responses go out as several small writes; don't let them wait on ACKs
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.imap = self.server.imap
+        with self.imap.lock:
+            self.imap._connections.add(self)
+        try:
+            self._serve()
+        except OSError:
+            pass
+        finally:
+            with self.imap.lock:
+                self.imap._connections.discard(self)
+                self.imap._idling.discard(self)
+
+    def _serve(self):
+        self._send(b"* OK [CAPABILITY IMAP4rev1 IDLE] Fake IMAP ready")
+        while True:
+            line = self._read_command()
+            if line is None:
+                return
+            tag, _, rest = line.partition(b" ")
+            command, _, args = rest.partition(b" ")
+            command = command.upper()
+            if command == b"UID":
+                command, _, args = args.partition(b" ")
+                command = b"UID " + command.upper()
+            if self.imap.latency:
+                time.sleep(self.imap.latency)
+            handler = self.COMMANDS.get(command)
+            if handler is None:
+                self._send(tag + b" BAD Unknown command")
+                continue
+            outcome = handler(self, args.decode())
+            if outcome is _CLOSED:
+                return
+            if outcome is False:
+                self._send(tag + b" OK LOGOUT completed")
+                return
+            self._send(tag + b" OK " + command + b" completed")
+
+    def _read_command(self):
+        """One command line, with any literals (as LOGIN may send) inlined."""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        while True:
+            m = _LITERAL_RE.search(line)
+            if not m:
+                return line.rstrip(b"\r\n")
+            self._send(b"+ Ready")
+            literal = self.rfile.read(int(m.group(1)))
+            line = line[:m.start()] + b'"' + literal + b'"' + self.rfile.readline()
+
+    def _send(self, data):
+        self.wfile.write(data + b"\r\n")
+
+    def _capability(self, args):
+        self._send(b"* CAPABILITY IMAP4rev1 IDLE")
+
+    def _noop(self, args):
+        pass
+
+    def _logout(self, args):
+        self._send(b"* BYE Logging out")
+        return False
+
+    def _idle(self, args):
+        with self.imap.lock:
+            self._send(b"+ idling")
+            self.imap._idling.add(self)
+        line = self.rfile.readline()
+        with self.imap.lock:
+            self.imap._idling.discard(self)
+        if not line:
+            return _CLOSED
+
+    def _select(self, args):
+        imap = self.imap
+        with imap.lock:
+            count, next_uid, validity = len(imap.messages), imap._next_uid, imap.uidvalidity
+        self._send(rb"* FLAGS (\Seen)")
+        self._send(b"* %d EXISTS" % count)
+        self._send(b"* 0 RECENT")
+        self._send(b"* OK [UIDVALIDITY %d] UIDs valid" % validity)
+        self._send(b"* OK [UIDNEXT %d] Predicted next UID" % next_uid)
+
+    def _search(self, args):
+        tokens = args.upper().split()
+        uids = self.imap.uids("1:*")
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token == "UID" or token[0].isdigit() or token[0] == "*":
+                if token == "UID":
+                    i += 1
+                matched = set(self.imap.uids(tokens[i]))
+                uids = [u for u in uids if u in matched]
+            elif token in ("SEEN", "UNSEEN"):
+                with self.imap.lock:
+                    uids = [u for u in uids if u in self.imap.messages and
+                            (rb"\Seen" in self.imap.messages[u][1]) == (token == "SEEN")]
+            i += 1
+        self._send(b"* SEARCH" + b"".join(b" %d" % u for u in uids))
+
+    def _fetch(self, args):
+        spec, _, items = args.partition(" ")
+        items = items.upper()
+        want_body = "RFC822" in items or "BODY[]" in items or "BODY.PEEK[]" in items
+        body_key = b"RFC822" if "RFC822" in items else b"BODY[]"
+        peek = "PEEK" in items
+        out = []
+        with self.imap.lock:
+            order = {uid: n for n, uid in enumerate(sorted(self.imap.messages), 1)}
+            for uid in self.imap.uids(spec):
+                raw, flags = self.imap.messages[uid]
+                if want_body and not peek:
+                    flags.add(rb"\Seen")
+                parts = [b"UID %d" % uid]
+                if "FLAGS" in items:
+                    parts.append(b"FLAGS (" + b" ".join(sorted(flags)) + b")")
+                if want_body:
+                    parts.append(body_key + b" {%d}\r\n" % len(raw) + raw)
+                out.append(b"* %d FETCH (" % order[uid] + b" ".join(parts) + b")\r\n")
+        self.wfile.write(b"".join(out))
+
+    COMMANDS = {
+        b"CAPABILITY": _capability,
+        b"NOOP": _noop,
+        b"LOGIN": _noop,
+        b"LOGOUT": _logout,
+        b"IDLE": _idle,
+        b"SELECT": _select,
+        b"EXAMINE": _select,
+        b"UID SEARCH": _search,
+        b"UID FETCH": _fetch,
+    }
@@ -1,7 +1,7 @@
 import os
 import uuid
-from PIL import Image
 import config
+from tools import blobs
 
 ALLOWED_EXTENSIONS = {
     "image": {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".svg"},
@@ -10,76 +10,80 @@ ALLOWED_EXTENSIONS = {
 
 ALL_ALLOWED = ALLOWED_EXTENSIONS["image"] | ALLOWED_EXTENSIONS["document"]
 
-THUMB_SIZE = (300, 300)
-
-
 def allowed_file(filename):
     ext = os.path.splitext(filename)[1].lower()
     return ext in ALL_ALLOWED
 
 
-def get_board_upload_dir(board_id):
-    path = os.path.join(config.UPLOAD_DIR, board_id)
-    os.makedirs(path, exist_ok=True)
-    return path
-
-
-def get_thumb_dir(board_id):
-    path = os.path.join(config.UPLOAD_DIR, board_id, "thumbs")
-    os.makedirs(path, exist_ok=True)
-    return path
+def save_upload(file_storage):
+    """Save an uploaded file into the blob store. Returns dict with file metadata or None.
 
-
-def save_upload(file_storage, board_id):
-    """Save an uploaded file. Returns dict with file metadata or None."""
+    The caller must `blobs.register` the result in the transaction that
+    inserts the row referencing it.
+    """
     original_name = file_storage.filename
     if not original_name or not allowed_file(original_name):
         return None
 
     ext = os.path.splitext(original_name)[1].lower()
-    file_id = str(uuid.uuid4())
-    stored_name = f"{file_id}{ext}"
-
-    upload_dir = get_board_upload_dir(board_id)
-    save_path = os.path.join(upload_dir, stored_name)
-    file_storage.save(save_path)
-
-    file_size = os.path.getsize(save_path)
+    blob = blobs.save_stream(file_storage.stream, ext)
     mime_type = file_storage.content_type or "application/octet-stream"
 
-    # Generate thumbnail for images
-    if ext in ALLOWED_EXTENSIONS["image"] and ext != ".svg":
-        try:
-            generate_thumbnail(save_path, board_id, stored_name)
-        except Exception:
-            pass
-
     return {
-        "id": file_id,
+        "id": str(uuid.uuid4()),
         "original_name": original_name,
-        "stored_name": stored_name,
+        "stored_name": blob["stored_name"],
+        "blob_id": blob["sha256"],
         "mime_type": mime_type,
-        "file_size": file_size,
+        "file_size": blob["size"],
     }
 
 
-def generate_thumbnail(image_path, board_id, stored_name):
-    thumb_dir = get_thumb_dir(board_id)
-    thumb_path = os.path.join(thumb_dir, stored_name)
-    with Image.open(image_path) as img:
-        img.thumbnail(THUMB_SIZE)
-        img.save(thumb_path)
+def _base_url(f, share_id):
+    """Card files are served by routes/file_routes; shared links get their own prefix."""
+    prefix = f"/s/{share_id}" if share_id else ""
+    return f"{prefix}/files/{f['id']}"
 
 
-def get_file_url(board_id, stored_name):
-    return f"/static/uploads/{board_id}/{stored_name}"
+def file_url(f, share_id=None):
+    """URL of a card_files row's content."""
+    return _base_url(f, share_id)
+
+
+def thumb_widths(f):
+    """Thumbnail widths recorded on a card_files row."""
+    return [int(w) for w in (f.get("thumb_widths") or "").split(",") if w]
+
+
+def thumb_url(f, share_id=None, width=None, webp=False):
+    """Thumbnail URL for a card_files row, falling back to the file itself.
+
+    Availability comes from the row's thumb_state/thumb_widths columns, never
+    from the disk. Uses the closest generated width to `width` (default
+    THUMB_DEFAULT_WIDTH).
+    """
+    if f.get("thumb_state") != "ready":
+        return file_url(f, share_id)
+    width = width or config.THUMB_DEFAULT_WIDTH
+    widths = thumb_widths(f)
+    if widths and width not in widths:
+        width = min(widths, key=lambda w: abs(w - width))
+    ext = ".webp" if webp else os.path.splitext(f["stored_name"])[1]
+    return f"{_base_url(f, share_id)}/thumb/{width}{ext}"
+
+
+def tiles_url(f, share_id=None):
+    """Deep Zoom descriptor (.dzi) URL for a card_files row, or None if it has no pyramid."""
+    if f.get("tile_state") != "ready":
+        return None
+    return f"{_base_url(f, share_id)}/tiles.dzi"
 
 
-def get_thumb_url(board_id, stored_name):
-    thumb_path = os.path.join(config.UPLOAD_DIR, board_id, "thumbs", stored_name)
-    if os.path.exists(thumb_path):
-        return f"/static/uploads/{board_id}/thumbs/{stored_name}"
-    return get_file_url(board_id, stored_name)
+def viewer_url(f, share_id=None):
+    """Page that pans and zooms a tiled image, falling back to the file itself."""
+    if f.get("tile_state") != "ready":
+        return file_url(f, share_id)
+    return f"{_base_url(f, share_id)}/view"
 
 
 def is_image(mime_type):
@@ -0,0 +1,75 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from email.message import EmailMessage
+import config
+
+
+def _message(n, attach):
+    msg = EmailMessage()
+    msg["From"] = f"Sender {n % 50} <sender{n % 50}@example.com>"
+    msg["To"] = "boards@example.com"
+    msg["Subject"] = f"Board request #{n}"
+    msg["Date"] = "Mon, 05 Oct 2026 09:00:00 +0000"
+    msg.set_content(f"Message {n}.\n" + "Please put this on the board. " * 30)
+    if attach:
+        msg.add_attachment(f"brief {n}\n".encode() * 200, maintype="application",
+                           subtype="octet-stream", filename=f"brief-{n}.txt")
+    return msg.as_bytes()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time email ingestion against a local fake IMAP server, on a scratch database.")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--batch-sizes", default="1,50,200",
+                        help="Comma-separated IMAP_FETCH_BATCH values to compare (1 is one message per round trip).")
+    parser.add_argument("--attach-every", type=int, default=10,
+                        help="Give every Nth message an attachment (0 for none).")
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="Delay before each server response, as from a remote mailbox.")
+    args = parser.parse_args(argv)
+
+    # Point storage at scratch space before anything opens a connection
+    scratch = tempfile.mkdtemp(prefix="imap-bench-")
+    config.DB_PATH = os.path.join(scratch, "bench.db")
+    config.UPLOAD_DIR = os.path.join(scratch, "uploads")
+    config.EMAIL_ATTACH_DIR = os.path.join(scratch, "email_attachments")
+    import imapclient
+    from tools import db, email_poller
+    from tools.fake_imap import FakeIMAPServer
+
+    try:
+        db.init_db()
+        raw = [_message(n, args.attach_every and n % args.attach_every == 0) for n in range(args.messages)]
+        print(f"{args.messages} messages, {sum(map(len, raw)) // 1024} KiB, "
+              f"{args.latency_ms:g} ms per server response")
+        for batch in (int(b) for b in args.batch_sizes.split(",")):
+            db.execute_many([("DELETE FROM emails", ()), ("DELETE FROM imap_state", ())])
+            server = FakeIMAPServer(latency=args.latency_ms / 1000)
+            for r in raw:
+                server.add(r)
+            client = imapclient.IMAPClient("127.0.0.1", port=server.start(), ssl=False)
+            client.login("bench", "bench")
+            config.IMAP_FETCH_BATCH = batch
+            try:
+                start = time.perf_counter()
+                count = email_poller.poll(client)
+                full = time.perf_counter() - start
+                start = time.perf_counter()
+                email_poller.poll(client)
+                again = time.perf_counter() - start
+            finally:
+                client.logout()
+                server.stop()
+            print(f"batch {batch:>5}: {count} stored in {full:.2f}s ({count / full:,.0f}/s); "
+                  f"incremental re-poll {again * 1000:.1f} ms")
+    finally:
+        db.close_conn()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
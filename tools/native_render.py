@@ -0,0 +1,379 @@
+import math
+import os
+import tempfile
+import zlib
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+import config
+from tools import db, blobs, thumbnails
+from tools.board_loader import load_board, CARD_WIDTH
+
+# Card geometry in board pixels, mirroring .card and its parts in style.css
+# (1rem = 16px) so exports match the shared board page.
+HEADER_PAD_X, HEADER_PAD_Y, TITLE_SIZE = 9.6, 8, 14.4
+FILES_PAD_X, FILES_PAD_Y, FILE_BOX, FILE_GAP, FILE_LABEL_SIZE = 9.6, 6.4, 60, 4.8, 11.2
+TAGS_PAD_X, TAGS_PAD_Y, TAG_PAD_X, TAG_PAD_Y, TAG_GAP, TAG_SIZE = 9.6, 4.8, 8, 1.6, 4.8, 11.2
+LINE_HEIGHT = 1.25
+
+# Flowchart boards stack cards in one column, as board_public.html does
+FLOW_X, FLOW_TOP, FLOW_STEP = 400, 40, 220
+
+MARGIN = 40
+LINE_WIDTH = 2
+
+# A3 landscape in PDF points; board pixels print at 96 dpi (0.75 pt)
+PAGE_SIZE = (1190.55, 841.89)
+PT_PER_PX = 0.75
+
+
+# ── Layout ─────────────────────────────────────────────────
+
+@lru_cache(maxsize=64)
+def _font(size, bold=False):
+    name = config.NATIVE_FONT_BOLD if bold else config.NATIVE_FONT
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def _text_width(text, size, bold=False):
+    return _font(max(1, round(size)), bold).getlength(text)
+
+
+def _ellipsize(text, size, width, bold=False):
+    if _text_width(text, size, bold) <= width:
+        return text
+    while text and _text_width(text + "…", size, bold) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def _layout_card(card, x, y):
+    """Place a card's parts relative to the board. Returns the card's box."""
+    inner = CARD_WIDTH - 2
+    top = y + 1
+    box = {"card": card, "x": x, "y": y, "w": CARD_WIDTH}
+
+    header_h = TITLE_SIZE * LINE_HEIGHT + 2 * HEADER_PAD_Y
+    box["title"] = (x + 1 + HEADER_PAD_X, top + HEADER_PAD_Y,
+                    _ellipsize(card["title"] or "", TITLE_SIZE, inner - 2 * HEADER_PAD_X, bold=True))
+    top += header_h
+    box["header_bottom"] = top
+    top += 1
+
+    box["files"] = []
+    files = card.get("files") or []
+    if files:
+        per_row = max(1, int((inner - 2 * FILES_PAD_X + FILE_GAP) // (FILE_BOX + FILE_GAP)))
+        for i, f in enumerate(files):
+            row, col = divmod(i, per_row)
+            box["files"].append((x + 1 + FILES_PAD_X + col * (FILE_BOX + FILE_GAP),
+                                 top + FILES_PAD_Y + row * (FILE_BOX + FILE_GAP), f))
+        rows = math.ceil(len(files) / per_row)
+        top += 2 * FILES_PAD_Y + rows * FILE_BOX + (rows - 1) * FILE_GAP
+
+    box["tags"] = []
+    tags = card.get("tags") or []
+    if tags:
+        tag_h = TAG_SIZE * LINE_HEIGHT + 2 * TAG_PAD_Y
+        left, right = x + 1 + TAGS_PAD_X, x + CARD_WIDTH - 1 - TAGS_PAD_X
+        cx, cy = left, top + TAGS_PAD_Y
+        for t in tags:
+            w = min(_text_width(t["name"], TAG_SIZE) + 2 * TAG_PAD_X, right - left)
+            if cx > left and cx + w > right:
+                cx, cy = left, cy + tag_h + TAG_GAP
+            box["tags"].append((cx, cy, w, tag_h, t["name"]))
+            cx += w + TAG_GAP
+        top = cy + tag_h + TAGS_PAD_Y
+
+    box["h"] = top + 1 - y
+    return box
+
+
+def layout(board, payload):
+    """Position every card and connection line of a board, in board pixels."""
+    boxes = {}
+    for i, card in enumerate(payload["cards"]):
+        if board["view_mode"] == "flowchart":
+            x, y = FLOW_X, i * FLOW_STEP + FLOW_TOP
+        else:
+            x, y = card["pos_x"] or 100, card["pos_y"] or 100
+        boxes[card["id"]] = _layout_card(card, x, y)
+
+    cards = list(boxes.values())
+    lines = []
+    if board["view_mode"] == "flowchart":
+        for a, b in zip(cards, cards[1:]):
+            lines.append(_straight(a, b))
+    for conn in payload["connections"]:
+        a, b = boxes.get(conn["from_card_id"]), boxes.get(conn["to_card_id"])
+        if a and b:
+            lines.append(_fluid(a, b))
+
+    width = max((c["x"] + c["w"] for c in cards), default=0) + MARGIN
+    height = max((c["y"] + c["h"] for c in cards), default=0) + MARGIN
+    return {"cards": cards, "lines": lines, "width": max(width, 1), "height": max(height, 1)}
+
+
+def _straight(a, b):
+    """Bottom-centre to top-centre, like the flowchart sequence arrows."""
+    return [(a["x"] + a["w"] / 2, a["y"] + a["h"]), (b["x"] + b["w"] / 2, b["y"])]
+
+
+def _fluid(a, b):
+    """A curve between the facing sides of two cards, sampled as a polyline."""
+    ax, ay = a["x"] + a["w"] / 2, a["y"] + a["h"] / 2
+    bx, by = b["x"] + b["w"] / 2, b["y"] + b["h"] / 2
+    if abs(bx - ax) >= abs(by - ay):
+        sign = 1 if bx >= ax else -1
+        start = (ax + sign * a["w"] / 2, ay)
+        end = (bx - sign * b["w"] / 2, by)
+        pull = abs(end[0] - start[0]) / 2
+        c1, c2 = (start[0] + sign * pull, start[1]), (end[0] - sign * pull, end[1])
+    else:
+        sign = 1 if by >= ay else -1
+        start = (ax, ay + sign * a["h"] / 2)
+        end = (bx, by - sign * b["h"] / 2)
+        pull = abs(end[1] - start[1]) / 2
+        c1, c2 = (start[0], start[1] + sign * pull), (end[0], end[1] - sign * pull)
+    points = []
+    for i in range(25):
+        t = i / 24
+        u = 1 - t
+        points.append((
+            u ** 3 * start[0] + 3 * u * u * t * c1[0] + 3 * u * t * t * c2[0] + t ** 3 * end[0],
+            u ** 3 * start[1] + 3 * u * u * t * c1[1] + 3 * u * t * t * c2[1] + t ** 3 * end[1],
+        ))
+    return points
+
+
+# ── Drawing ────────────────────────────────────────────────
+
+def _thumbnail_source(f, board_id, size):
+    """Best stored image to shrink to `size` pixels for a card file, or None."""
+    if f["blob_id"] and f.get("thumb_state") == "ready":
+        widths = sorted(int(w) for w in (f.get("thumb_widths") or "").split(",") if w)
+        if widths:
+            width = next((w for w in widths if w >= size), widths[-1])
+            return blobs.thumb_path(f["stored_name"], width)
+    if os.path.splitext(f["stored_name"])[1].lower() not in thumbnails.THUMBNAILABLE:
+        return None
+    if f["blob_id"]:
+        return blobs.blob_path(f["stored_name"])
+    thumb = os.path.join(config.UPLOAD_DIR, board_id, "thumbs", f["stored_name"])
+    if os.path.exists(thumb):
+        return thumb
+    return os.path.join(config.UPLOAD_DIR, board_id, f["stored_name"])
+
+
+def _load_thumbnail(f, board_id, size, cache):
+    key = (f["id"], size)
+    if key not in cache:
+        cache[key] = None
+        path = _thumbnail_source(f, board_id, size)
+        if path:
+            try:
+                with Image.open(path) as img:
+                    img.draft("RGB", (size, size))
+                    img = ImageOps.exif_transpose(img).convert("RGB")
+                    # object-fit: cover
+                    cache[key] = ImageOps.fit(img, (size, size))
+            except (OSError, ValueError):
+                pass
+    return cache[key]
+
+
+def _draw_region(board_layout, x0, y0, width, height, scale, cache):
+    """Rasterise the board area (x0, y0, width, height) at `scale` device px per board px."""
+    img = Image.new("RGB", (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))), "white")
+    draw = ImageDraw.Draw(img)
+
+    def at(x, y):
+        return (x - x0) * scale, (y - y0) * scale
+
+    def rect(x, y, w, h, **kwargs):
+        (l, t), (r, b) = at(x, y), at(x + w, y + h)
+        draw.rectangle([l, t, r - 1, b - 1], **kwargs)
+
+    stroke = max(1, round(scale))
+    for c in board_layout["cards"]:
+        if c["x"] > x0 + width or c["y"] > y0 + height or c["x"] + c["w"] < x0 or c["y"] + c["h"] < y0:
+            continue
+        rect(c["x"], c["y"], c["w"], c["h"], fill="white")
+        left, _ = at(c["x"] + 1, 0)
+        right, _ = at(c["x"] + c["w"] - 1, 0)
+        _, hb = at(0, c["header_bottom"])
+        draw.line([(left, hb), (right, hb)], fill="#eeeeee", width=stroke)
+        tx, ty, title = c["title"]
+        draw.text(at(tx, ty), title, fill="black", font=_font(max(1, round(TITLE_SIZE * scale)), True))
+
+        for fx, fy, f in c["files"]:
+            size = max(1, round(FILE_BOX * scale))
+            thumb = _load_thumbnail(f, c["card"]["board_id"], size, cache)
+            if thumb is not None:
+                img.paste(thumb, tuple(round(v) for v in at(fx, fy)))
+            else:
+                label = os.path.splitext(f["original_name"])[1].lstrip(".").upper() or "FILE"
+                draw.text(at(fx + FILE_BOX / 2, fy + FILE_BOX / 2), label, fill="black",
+                          font=_font(max(1, round(FILE_LABEL_SIZE * scale))), anchor="mm")
+            rect(fx, fy, FILE_BOX, FILE_BOX, outline="#cccccc", width=stroke)
+
+        for gx, gy, gw, gh, name in c["tags"]:
+            (l, t), (r, b) = at(gx, gy), at(gx + gw, gy + gh)
+            draw.rounded_rectangle([l, t, r, b], radius=2 * scale, fill="black")
+            label = _ellipsize(name, TAG_SIZE, gw - 2 * TAG_PAD_X)
+            draw.text(at(gx + TAG_PAD_X, gy + gh / 2), label, fill="white",
+                      font=_font(max(1, round(TAG_SIZE * scale))), anchor="lm")
+        rect(c["x"], c["y"], c["w"], c["h"], outline="black", width=stroke)
+
+    width_px = max(1, round(LINE_WIDTH * scale))
+    for points in board_layout["lines"]:
+        pts = [at(x, y) for x, y in points]
+        draw.line(pts, fill="black", width=width_px, joint="curve")
+        _plugs(draw, pts, scale)
+    return img
+
+
+def _plugs(draw, pts, scale):
+    """Disc at the start and arrowhead at the end, like the browser lines."""
+    r = 3 * scale
+    sx, sy = pts[0]
+    draw.ellipse([sx - r, sy - r, sx + r, sy + r], fill="black")
+    (px, py), (ex, ey) = pts[-2], pts[-1]
+    angle = math.atan2(ey - py, ex - px)
+    length, spread = 10 * scale, math.radians(25)
+    draw.polygon([
+        (ex, ey),
+        (ex - length * math.cos(angle - spread), ey - length * math.sin(angle - spread)),
+        (ex - length * math.cos(angle + spread), ey - length * math.sin(angle + spread)),
+    ], fill="black")
+
+
+# ── Output ─────────────────────────────────────────────────
+
+def render_board(board_id, fmt, output_path):
+    """Render a board straight from the database to a PNG or PDF at `output_path`.
+
+    PNGs are scaled down to stay within NATIVE_MAX_PIXELS. PDFs fit the
+    board on one A3 page when it stays legible at NATIVE_PDF_MIN_SCALE,
+    and otherwise split it across pages at full size, each page rendered
+    on its own so memory stays bounded.
+    """
+    board = db.query_one("SELECT * FROM boards WHERE id = ?", (board_id,))
+    if board is None:
+        raise ValueError(f"Board {board_id} not found")
+    board_layout = layout(board, load_board(board_id, include_email=False))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        if fmt == "pdf":
+            _render_pdf(board_layout, tmp_path)
+        else:
+            _render_png(board_layout, tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
+
+
+def _render_png(board_layout, path):
+    w, h = board_layout["width"], board_layout["height"]
+    scale = min(config.NATIVE_PNG_SCALE, math.sqrt(config.NATIVE_MAX_PIXELS / (w * h)))
+    _draw_region(board_layout, 0, 0, w, h, scale, {}).save(path, "PNG", optimize=False)
+
+
+def _render_pdf(board_layout, path):
+    w, h = board_layout["width"], board_layout["height"]
+    page_w, page_h = PAGE_SIZE
+    px_per_pt = config.NATIVE_PDF_DPI / 72
+    cache = {}
+    with _PdfWriter(path) as pdf:
+        fit = min(page_w / w, page_h / h, PT_PER_PX)
+        if fit >= config.NATIVE_PDF_MIN_SCALE * PT_PER_PX:
+            img = _draw_region(board_layout, 0, 0, w, h, fit * px_per_pt, cache)
+            pdf.add_page(img, w * fit, h * fit)
+            return
+        # Tile the board at full size, left to right then top to bottom
+        span_w, span_h = page_w / PT_PER_PX, page_h / PT_PER_PX
+        for row in range(math.ceil(h / span_h)):
+            for col in range(math.ceil(w / span_w)):
+                x0, y0 = col * span_w, row * span_h
+                if not any(c["x"] < x0 + span_w and c["x"] + c["w"] > x0 and
+                           c["y"] < y0 + span_h and c["y"] + c["h"] > y0
+                           for c in board_layout["cards"]):
+                    continue
+                img = _draw_region(board_layout, x0, y0, span_w, span_h, PT_PER_PX * px_per_pt, cache)
+                pdf.add_page(img, page_w, page_h)
+        if not pdf.pages:
+            pdf.add_page(Image.new("RGB", (1, 1), "white"), page_w, page_h)
+
+
+class _PdfWriter:
+    """Minimal PDF writer: one full-page, Flate-compressed RGB image per page.
+
+    Pages are written as they are added, so only one page's pixels are held
+    at a time; the page tree and cross-reference table follow at close.
+    """
+
+    def __init__(self, path):
+        self._f = open(path, "wb")
+        self._offsets = {}
+        self._next = 3  # 1 is the catalog, 2 the page tree
+        self.pages = []
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._finish()
+        finally:
+            self._f.close()
+
+    def _object(self, num, body, stream=None):
+        self._offsets[num] = self._f.tell()
+        self._f.write(f"{num} 0 obj\n".encode())
+        if stream is None:
+            self._f.write(body.encode() + b"\nendobj\n")
+        else:
+            self._f.write(f"{body[:-2]} /Length {len(stream)} >>\nstream\n".encode())
+            self._f.write(stream + b"\nendstream\nendobj\n")
+
+    def _alloc(self):
+        num, self._next = self._next, self._next + 1
+        return num
+
+    def add_page(self, img, width_pt, height_pt):
+        image, content, page = self._alloc(), self._alloc(), self._alloc()
+        self._object(
+            image,
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode >>",
+            zlib.compress(img.tobytes(), 6),
+        )
+        self._object(content, "<< >>",
+                     f"q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q".encode())
+        self._object(
+            page,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>",
+        )
+        self.pages.append(page)
+
+    def _finish(self):
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self._object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self._f.tell()
+        count = self._next
+        self._f.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode())
+        for num in range(1, count):
+            self._f.write(f"{self._offsets[num]:010d} 00000 n \n".encode())
+        self._f.write(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
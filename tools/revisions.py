@@ -0,0 +1,31 @@
+from flask import request, make_response
+from tools import db
+
+
+def bump_revision(board_id):
+    """Mark a board as changed. Call inside the transaction that changed it."""
+    db.execute(
+        "UPDATE boards SET updated_at = datetime('now'), revision = revision + 1 WHERE id = ?",
+        (board_id,),
+    )
+
+
+def board_etag(board, variant):
+    """Strong ETag for one representation (`variant`) of a board at its current revision."""
+    return f"{board['id']}.{board['revision']}.{variant}"
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds `etag`, else None."""
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+        return with_etag(resp, etag)
+    return None
+
+
+def with_etag(resp, etag):
+    resp = make_response(resp)
+    resp.set_etag(etag)
+    # Let browsers keep the body but always revalidate before reuse.
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
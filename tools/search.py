@@ -0,0 +1,115 @@
+import html
+import re
+from tools import db, access
+
+SNIPPET_TOKENS = 12
+MAX_RESULTS = 200
+
+# snippet() marks matches with these; they become <mark> once the text is escaped
+_MATCH_START, _MATCH_END = "\x02", "\x03"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = _WORD_RE.findall(q)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_board(board_id, q, limit=MAX_RESULTS):
+    """Cards on a board matching `q` by title/body, tag name or source email.
+
+    Returns a list of {"id", "snippet"} ordered best match first. Snippets
+    are HTML: the indexed text escaped, with matches wrapped in <mark>.
+    """
+    match = fts_query(q)
+    if not match:
+        return []
+
+    rows = db.query(
+        """SELECT id, MIN(rank) AS rank, snippet FROM (
+               SELECT d.ref_id AS id, bm25(search_fts) AS rank,
+                      snippet(search_fts, -1, ?, ?, '…', ?) AS snippet
+               FROM search_fts
+               JOIN search_docs d ON d.doc_id = search_fts.rowid
+               WHERE search_fts MATCH ? AND d.kind = 'card' AND d.board_id = ?
+             UNION ALL
+               SELECT c.id, bm25(search_fts), snippet(search_fts, 0, ?, ?, '…', ?)
+               FROM search_fts
+               JOIN search_docs d ON d.doc_id = search_fts.rowid
+               JOIN card_tags ct ON ct.tag_id = d.ref_id
+               JOIN cards c ON c.id = ct.card_id
+               WHERE search_fts MATCH ? AND d.kind = 'tag' AND c.board_id = ?
+             UNION ALL
+               SELECT c.id, bm25(search_fts), snippet(search_fts, -1, ?, ?, '…', ?)
+               FROM search_fts
+               JOIN search_docs d ON d.doc_id = search_fts.rowid
+               JOIN cards c ON c.email_id = d.ref_id
+               WHERE search_fts MATCH ? AND d.kind = 'email' AND c.board_id = ?
+           )
+           GROUP BY id
+           ORDER BY rank
+           LIMIT ?""",
+        (_MATCH_START, _MATCH_END, SNIPPET_TOKENS, match, board_id,
+         _MATCH_START, _MATCH_END, SNIPPET_TOKENS, match, board_id,
+         _MATCH_START, _MATCH_END, SNIPPET_TOKENS, match, board_id,
+         limit),
+    )
+    return [{"id": r["id"], "snippet": _highlight(r["snippet"])} for r in rows]
+
+
+def _highlight(snippet):
+    """Escape a snippet's text (card, tag or email content) and turn its match markers into <mark>."""
+    return (html.escape(snippet or "")
+            .replace(_MATCH_START, "<mark>")
+            .replace(_MATCH_END, "</mark>"))
+
+
+def search_boards_by_tag(user_id, q):
+    """Boards visible to `user_id` with at least one card tagged with a match for `q`."""
+    match = fts_query(q)
+    if not match:
+        return []
+    return db.query(
+        """SELECT DISTINCT b.id, b.title, b.updated_at
+           FROM search_fts
+           JOIN search_docs d ON d.doc_id = search_fts.rowid
+           JOIN card_tags ct ON ct.tag_id = d.ref_id
+           JOIN cards c ON c.id = ct.card_id
+           JOIN boards b ON b.id = c.board_id
+           WHERE search_fts MATCH ? AND d.kind = 'tag'
+             AND b.id IN (SELECT value FROM json_each(?))
+           ORDER BY b.updated_at DESC""",
+        (match, access.visible_board_ids_json(user_id)),
+    )
+
+
+def rebuild():
+    """Re-index every card, tag and email from scratch. Returns the number of documents."""
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM search_fts")
+        conn.execute("DELETE FROM search_docs")
+        conn.execute(
+            "INSERT INTO search_docs (kind, ref_id, board_id) SELECT 'card', id, board_id FROM cards"
+        )
+        conn.execute("INSERT INTO search_docs (kind, ref_id) SELECT 'tag', id FROM tags")
+        conn.execute("INSERT INTO search_docs (kind, ref_id) SELECT 'email', id FROM emails")
+        conn.execute(
+            """INSERT INTO search_fts (rowid, title, body)
+               SELECT d.doc_id, c.title, COALESCE(c.body, '') FROM search_docs d
+               JOIN cards c ON d.kind = 'card' AND c.id = d.ref_id"""
+        )
+        conn.execute(
+            """INSERT INTO search_fts (rowid, title, body)
+               SELECT d.doc_id, t.name, '' FROM search_docs d
+               JOIN tags t ON d.kind = 'tag' AND t.id = d.ref_id"""
+        )
+        conn.execute(
+            """INSERT INTO search_fts (rowid, title, body)
+               SELECT d.doc_id, e.subject, COALESCE(e.body_text, '') FROM search_docs d
+               JOIN emails e ON d.kind = 'email' AND e.id = d.ref_id"""
+        )
+        count = conn.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+    db.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+    return count
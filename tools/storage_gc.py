@@ -0,0 +1,374 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import config
+from tools import db, blobs
+from tools.board_loader import IN_BATCH_SIZE, _batched
+
+# Legacy per-board upload directories are named by board id
+_BOARD_DIR_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+# Subdirectories of the blob store that aren't content shards
+_STORE_DIRS = {"thumbs", "tiles", "tmp"}
+
+# Derivative states whose tile pyramid is, or is about to be, in use
+_LIVE_TILE_STATES = {"pending", "processing", "ready"}
+
+CATEGORIES = ("blobs", "thumbnails", "tiles", "scratch", "legacy", "attachments")
+
+# How often the scheduler thread checks whether a run is due
+SCHEDULER_TICK = 600
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class _Run:
+    """One collection pass: its settings and what it found."""
+
+    def __init__(self, dry_run, grace_hours, batch_size):
+        self.dry_run = dry_run
+        self.grace = f"-{int(grace_hours)} hours"
+        self.cutoff = time.time() - grace_hours * 3600
+        self.batch_size = batch_size
+        self.report = {c: {"files": 0, "bytes": 0} for c in CATEGORIES}
+        self.report["rows"] = {"cards": 0, "blobs": 0}
+        self._seen = set()
+
+    def idle(self, path):
+        """Whether `path` exists and hasn't been written since the grace period began."""
+        try:
+            return os.stat(path).st_mtime < self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def remove(self, category, path):
+        """Remove an unreferenced file or directory tree once it has sat idle long enough.
+
+        The idle check runs right before deleting, so a blob the upload path
+        has just reused (see blobs._place) survives.
+        """
+        if path in self._seen or not self.idle(path):
+            return
+        self._seen.add(path)
+        files, size = _usage(path)
+        if not self.dry_run:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                return
+        self.report[category]["files"] += files
+        self.report[category]["bytes"] += size
+
+
+def _usage(path):
+    """(file count, bytes) of a file or directory tree."""
+    if not os.path.isdir(path):
+        try:
+            return 1, os.path.getsize(path)
+        except FileNotFoundError:
+            return 0, 0
+    files = size = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, name))
+                files += 1
+            except FileNotFoundError:
+                pass
+    return files, size
+
+
+def _listdir(path):
+    try:
+        with os.scandir(path) as it:
+            return sorted(e.name for e in it)
+    except FileNotFoundError:
+        return []
+
+
+# ── Collection ─────────────────────────────────────────────
+
+def collect(dry_run=False, grace_hours=None, batch_size=None):
+    """Remove stored files that nothing in the database refers to any more.
+
+    Compares the blob store, its thumbnails and tile pyramids, scratch files,
+    legacy per-board upload directories and EMAIL_ATTACH_DIR against
+    card_files, email_attachments and blobs. Anything unreferenced and
+    untouched for `grace_hours` is deleted, in batches of `batch_size`.
+    Cards left behind by deleted boards are removed first so their files
+    count as unreferenced; a dry run leaves them, and so under-reports
+    what their boards held.
+
+    Every run is recorded in storage_gc_runs. Returns the report: files and
+    bytes per category, rows removed, and a "total".
+    """
+    run_id = db.execute_returning(
+        "INSERT INTO storage_gc_runs (dry_run) VALUES (?)", (int(dry_run),)
+    )
+    return _collect(run_id, dry_run, grace_hours, batch_size)
+
+
+def _collect(run_id, dry_run, grace_hours=None, batch_size=None):
+    run = _Run(
+        dry_run,
+        config.STORAGE_GC_GRACE_HOURS if grace_hours is None else grace_hours,
+        batch_size or config.STORAGE_GC_BATCH_SIZE,
+    )
+    try:
+        _orphan_cards(run)
+        _unreferenced_blobs(run)
+        _sweep_store(run)
+        _sweep_scratch(run)
+        _sweep_legacy(run)
+        _sweep_attachments(run)
+    except Exception as e:
+        run.report["error"] = f"{type(e).__name__}: {e}"
+        _record(run_id, run.report)
+        raise
+    run.report["total"] = {
+        "files": sum(run.report[c]["files"] for c in CATEGORIES),
+        "bytes": sum(run.report[c]["bytes"] for c in CATEGORIES),
+    }
+    _record(run_id, run.report)
+    return run.report
+
+
+def _record(run_id, report):
+    total = report.get("total", {})
+    db.execute(
+        """UPDATE storage_gc_runs SET finished_at = datetime('now'), files = ?, bytes = ?, report = ?
+           WHERE id = ?""",
+        (total.get("files"), total.get("bytes"), json.dumps(report), run_id),
+    )
+
+
+def _orphan_cards(run):
+    """Cards whose board was deleted without cascading to them."""
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT id FROM cards
+               WHERE board_id NOT IN (SELECT id FROM boards) AND id > ?
+               ORDER BY id LIMIT ?""",
+            (last, run.batch_size),
+        )
+        if not rows:
+            break
+        last = rows[-1]["id"]
+        if not run.dry_run:
+            with db.transaction() as conn:
+                conn.executemany("DELETE FROM cards WHERE id = ?", [(r["id"],) for r in rows])
+        run.report["rows"]["cards"] += len(rows)
+
+
+def _thumbnails(blob):
+    """Thumbnail paths a blob may have: configured widths plus any it was generated at."""
+    widths = set(config.THUMB_WIDTHS)
+    widths.update(int(w) for w in (blob["thumb_widths"] or "").split(",") if w)
+    return [blobs.thumb_path(blob["stored_name"], w, webp) for w in widths for webp in (True, False)]
+
+
+def _unsized_thumbnail(blob):
+    """Where thumbnails went before there were several widths."""
+    return os.path.join(blobs.root(), "thumbs", blob["stored_name"][:2], blob["stored_name"])
+
+
+def _unreferenced_blobs(run):
+    """Blob rows no card file or attachment has pointed at for the grace period."""
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT * FROM blobs
+               WHERE ref_count = 0 AND created_at < datetime('now', ?) AND sha256 > ?
+               ORDER BY sha256 LIMIT ?""",
+            (run.grace, last, run.batch_size),
+        )
+        if not rows:
+            break
+        last = rows[-1]["sha256"]
+        candidates = [
+            b for b in rows
+            if run.idle(blobs.blob_path(b["stored_name"]))
+            or not os.path.exists(blobs.blob_path(b["stored_name"]))
+        ]
+        gone = candidates
+        if not run.dry_run:
+            gone = []
+            with db.transaction() as conn:
+                for b in candidates:
+                    # The counter is trusted to find candidates, not to delete them
+                    if conn.execute(
+                        """DELETE FROM blobs WHERE sha256 = ? AND ref_count = 0
+                             AND NOT EXISTS (SELECT 1 FROM card_files WHERE blob_id = ?)
+                             AND NOT EXISTS (SELECT 1 FROM email_attachments WHERE blob_id = ?)""",
+                        (b["sha256"], b["sha256"], b["sha256"]),
+                    ).rowcount:
+                        gone.append(b)
+        for b in gone:
+            run.remove("blobs", blobs.blob_path(b["stored_name"]))
+            for path in _thumbnails(b) + [_unsized_thumbnail(b)]:
+                run.remove("thumbnails", path)
+            run.remove("tiles", blobs.tile_dir(b["stored_name"]))
+        run.report["rows"]["blobs"] += len(gone)
+
+
+def _blob_rows(shas):
+    rows = {}
+    for batch in _batched(sorted(shas), IN_BATCH_SIZE):
+        placeholders = ", ".join("?" * len(batch))
+        for r in db.query(
+            f"""SELECT sha256, stored_name, thumb_widths, tile_state FROM blobs
+                WHERE sha256 IN ({placeholders})""",
+            batch,
+        ):
+            rows[r["sha256"]] = r
+    return rows
+
+
+def _sweep_store(run):
+    """Files in the blob store with no blobs row, and derivatives nothing serves.
+
+    Covers content written but never registered (a request that failed
+    after saving), thumbnails of removed blobs or of widths no longer
+    generated, and tile pyramids of blobs that no longer need one.
+    """
+    root = blobs.root()
+    for shard in _listdir(root):
+        path = os.path.join(root, shard)
+        if shard in _STORE_DIRS or not os.path.isdir(path):
+            continue
+        for batch in _batched(_listdir(path), run.batch_size):
+            known = _blob_rows(name[:64] for name in batch)
+            for name in batch:
+                row = known.get(name[:64])
+                if row is None or row["stored_name"] != name:
+                    run.remove("blobs", os.path.join(path, name))
+
+    thumbs = os.path.join(root, "thumbs")
+    for shard in _listdir(thumbs):
+        for batch in _batched(_listdir(os.path.join(thumbs, shard)), run.batch_size):
+            known = _blob_rows(name[:64] for name in batch)
+            for name in batch:
+                row = known.get(name[:64])
+                if row is None or name not in {os.path.basename(p) for p in _thumbnails(row)}:
+                    run.remove("thumbnails", os.path.join(thumbs, shard, name))
+
+    tiles = os.path.join(root, "tiles")
+    for shard in _listdir(tiles):
+        for batch in _batched(_listdir(os.path.join(tiles, shard)), run.batch_size):
+            known = _blob_rows(name[:64] for name in batch)
+            for name in batch:
+                row = known.get(name)
+                # Scratch pyramids (<sha>.tmp<pid>) never match a row
+                if row is None or row["tile_state"] not in _LIVE_TILE_STATES:
+                    run.remove("tiles", os.path.join(tiles, shard, name))
+
+
+def _sweep_scratch(run):
+    """Temporary files in the store's tmp directory left by interrupted writes.
+
+    Part files of live upload sessions are left to uploads.cleanup, which
+    expires sessions on their own TTL.
+    """
+    live = {f"upload-{r['id']}.part" for r in db.query("SELECT id FROM upload_sessions")}
+    tmp = os.path.join(blobs.root(), "tmp")
+    for name in _listdir(tmp):
+        if name not in live:
+            run.remove("scratch", os.path.join(tmp, name))
+
+
+def _sweep_legacy(run):
+    """Files under UPLOAD_DIR/<board id>/ from before the blob store.
+
+    Only files still listed in card_files (without a blob) on a live board
+    are kept; everything in the directory of a deleted board goes.
+    """
+    for board_id in _listdir(config.UPLOAD_DIR):
+        board_dir = os.path.join(config.UPLOAD_DIR, board_id)
+        if not _BOARD_DIR_RE.match(board_id) or not os.path.isdir(board_dir):
+            continue
+        referenced = {r["stored_name"] for r in db.query(
+            """SELECT cf.stored_name FROM card_files cf
+               JOIN cards c ON c.id = cf.card_id
+               JOIN boards b ON b.id = c.board_id
+               WHERE c.board_id = ? AND cf.blob_id IS NULL""",
+            (board_id,),
+        )}
+        for sub in (board_dir, os.path.join(board_dir, "thumbs")):
+            for name in _listdir(sub):
+                path = os.path.join(sub, name)
+                if name not in referenced and os.path.isfile(path):
+                    run.remove("legacy", path)
+        if not run.dry_run:
+            for sub in (os.path.join(board_dir, "thumbs"), board_dir):
+                try:
+                    os.rmdir(sub)
+                except OSError:
+                    pass
+
+
+def _sweep_attachments(run):
+    """Files in EMAIL_ATTACH_DIR that no attachment row still points at.
+
+    New attachments go to the blob store, so this directory only drains.
+    """
+    referenced = {r["stored_name"] for r in db.query(
+        "SELECT stored_name FROM email_attachments WHERE blob_id IS NULL"
+    )}
+    for name in _listdir(config.EMAIL_ATTACH_DIR):
+        path = os.path.join(config.EMAIL_ATTACH_DIR, name)
+        if name not in referenced and os.path.isfile(path):
+            run.remove("attachments", path)
+
+
+# ── Scheduling ─────────────────────────────────────────────
+
+def run_scheduled():
+    """Collect if no scheduled run has started within STORAGE_GC_INTERVAL.
+
+    The run is claimed by inserting its row, so with several processes only
+    one of them collects. Returns the report, or None if a run wasn't due.
+    """
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            """INSERT INTO storage_gc_runs (dry_run)
+               SELECT 0 WHERE NOT EXISTS (
+                   SELECT 1 FROM storage_gc_runs
+                   WHERE dry_run = 0 AND started_at > datetime('now', ?)
+               )""",
+            (f"-{config.STORAGE_GC_INTERVAL} seconds",),
+        )
+        run_id = cursor.lastrowid if cursor.rowcount else None
+    if run_id is None:
+        return None
+    return _collect(run_id, dry_run=False)
+
+
+def start_scheduler():
+    """Start this process's scheduler thread, unless it is running or disabled."""
+    global _scheduler
+    if _scheduler is not None or config.STORAGE_GC_INTERVAL <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_schedule_loop, name="storage-gc", daemon=True)
+            _scheduler.start()
+
+
+def _schedule_loop():
+    while True:
+        time.sleep(min(SCHEDULER_TICK, config.STORAGE_GC_INTERVAL))
+        try:
+            run_scheduled()
+        except Exception:
+            # Already recorded on the run's row; try again next interval
+            pass
+        finally:
+            db.close_conn()
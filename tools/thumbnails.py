@@ -0,0 +1,354 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import has_app_context
+from PIL import Image, ImageOps
+import config
+from tools import db, blobs, changelog, tiles
+from tools.file_handler import thumb_url, viewer_url
+from tools.revisions import bump_revision
+
+# Extensions Pillow can thumbnail; SVG is vector and is shown as-is
+THUMBNAILABLE = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+
+# A claim older than this belonged to a worker that died mid-job
+STALE_AFTER_MINUTES = 10
+
+# Formats that can't hold an alpha channel or palette as-is
+_RGB_ONLY = {"JPEG"}
+
+# EXIF orientations that rotate the image by 90 degrees
+_TRANSPOSED = {5, 6, 7, 8}
+
+_executor = None
+_executor_lock = threading.Lock()
+_resumed = False
+
+
+def pool():
+    """Process pool shared by the app's image jobs, created on first use.
+
+    Workers are spawned rather than forked so they don't inherit the web
+    server's threads, locks or database connections.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=config.THUMB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+# ── Worker side (runs in the process pool) ─────────────────
+
+def render(src, targets, webp_quality):
+    """Write every thumbnail size of one image in WebP and its own format.
+
+    `targets` is a list of (width, webp_path, original_format_path). Decodes
+    once, at the smallest resolution that still covers the largest size:
+    JPEG via draft mode (DCT scaling), others via Image.reduce inside
+    thumbnail(reducing_gap=...). Smaller sizes are resized from the largest.
+    Returns (widths written, (width, height) of the upright original).
+    """
+    targets = sorted(targets, reverse=True)
+    largest = targets[0][0]
+    with Image.open(src) as img:
+        fmt = img.format
+        size = upright_size(img)
+        img.draft(img.mode, (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((largest, largest), reducing_gap=2.0)
+        for width, webp_path, original_path in targets:
+            thumb = img
+            if width != largest:
+                thumb = img.copy()
+                thumb.thumbnail((width, width), reducing_gap=2.0)
+            _save(thumb, webp_path, "WEBP", quality=webp_quality)
+            _save(thumb, original_path, fmt)
+    return [t[0] for t in targets], size
+
+
+def upright_size(img):
+    """(width, height) of an opened image once its EXIF orientation is applied."""
+    if img.getexif().get(0x0112) in _TRANSPOSED:
+        return img.size[::-1]
+    return img.size
+
+
+def _save(img, path, fmt, **params):
+    if fmt == "WEBP" and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or img.mode == "P" else "RGB")
+    elif fmt in _RGB_ONLY and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    img.save(tmp, format=fmt, **params)
+    os.replace(tmp, path)
+
+
+# ── App side ───────────────────────────────────────────────
+
+def enqueue(sha256):
+    """Generate a blob's thumbnails in the background once the current transaction commits."""
+    db.after_commit(lambda: _submit(sha256))
+
+
+def _claim(sha256):
+    """Mark a pending blob as being processed. Returns its row, or None if not ours."""
+    blob = db.query_one("SELECT * FROM blobs WHERE sha256 = ?", (sha256,))
+    if blob is None or blob["thumb_state"] != "pending":
+        return None
+    if os.path.splitext(blob["stored_name"])[1].lower() not in THUMBNAILABLE:
+        _set_state(sha256, "skipped")
+        return None
+    with db.transaction() as conn:
+        claimed = conn.execute(
+            """UPDATE blobs SET thumb_state = 'processing', thumb_attempts = thumb_attempts + 1,
+                                thumb_updated_at = datetime('now')
+               WHERE sha256 = ? AND thumb_state = 'pending'""",
+            (sha256,),
+        ).rowcount
+    return blob if claimed else None
+
+
+def _set_state(sha256, state, error=None, widths=None, size=None):
+    """Record a blob's thumbnail state; triggers copy it onto its card_files rows.
+
+    When thumbnails appear or disappear, boards showing the blob get a new
+    revision so cached payloads pick up the changed URLs.
+    """
+    with db.transaction():
+        db.execute(
+            """UPDATE blobs SET thumb_state = ?, thumb_error = ?, thumb_widths = ?,
+                                thumb_updated_at = datetime('now')
+               WHERE sha256 = ?""",
+            (state, error, ",".join(str(w) for w in sorted(widths)) if widths else None, sha256),
+        )
+        if size:
+            db.execute(
+                "UPDATE blobs SET image_width = ?, image_height = ? WHERE sha256 = ?",
+                (size[0], size[1], sha256),
+            )
+        if state in ("ready", "pending"):
+            bump_boards(sha256)
+
+
+def bump_boards(sha256):
+    """Give every board showing a blob a new revision and log its files' new URLs.
+
+    Call inside a transaction, once the blob's state columns are updated.
+    """
+    files = db.query(
+        """SELECT cf.*, c.board_id FROM card_files cf
+           JOIN cards c ON c.id = cf.card_id
+           WHERE cf.blob_id = ?""",
+        (sha256,),
+    )
+    for f in files:
+        changelog.record(f["board_id"], changelog.FILE, f["id"], changelog.UPDATE, {
+            "card_id": f["card_id"],
+            "thumb_state": f["thumb_state"],
+            "thumb_widths": f["thumb_widths"],
+            "tile_state": f["tile_state"],
+            "thumb_url": thumb_url(f),
+            "viewer_url": viewer_url(f),
+        })
+    for board_id in {f["board_id"] for f in files}:
+        bump_revision(board_id)
+
+
+def _submit(sha256):
+    blob = _claim(sha256)
+    if blob is None:
+        return None
+    name = blob["stored_name"]
+    targets = [
+        (width, blobs.thumb_path(name, width, webp=True), blobs.thumb_path(name, width))
+        for width in set(config.THUMB_WIDTHS)
+    ]
+    future = pool().submit(render, blobs.blob_path(name), targets, config.THUMB_WEBP_QUALITY)
+    future.add_done_callback(lambda f: _finish(sha256, f))
+    return future
+
+
+def _finish(sha256, future):
+    error = future.exception()
+    if error:
+        _set_state(sha256, "failed", f"{type(error).__name__}: {error}")
+    else:
+        widths, size = future.result()
+        _set_state(sha256, "ready", widths=widths, size=size)
+        if tiles.wanted(*size):
+            tiles.enqueue(sha256)
+    # Done callbacks usually run on the pool's management thread, which has
+    # no request to hand its connection back at teardown.
+    if not has_app_context():
+        db.close_conn()
+
+
+def start():
+    """Start this process's thread that resubmits jobs a crash or restart left behind.
+
+    Jobs otherwise only reach the pool from the transaction that queued
+    them. The thread resumes thumbnails and tiles at once, then every
+    STALE_AFTER_MINUTES to pick up claims that were still fresh at startup.
+    """
+    global _resumed
+    with _executor_lock:
+        if _resumed:
+            return
+        _resumed = True
+    threading.Thread(target=_resume_loop, name="thumbnail-resume", daemon=True).start()
+
+
+def _resume_loop():
+    while True:
+        try:
+            resume()
+            tiles.resume()
+        except Exception:
+            # Try again next round
+            pass
+        finally:
+            db.close_conn()
+        time.sleep(STALE_AFTER_MINUTES * 60)
+
+
+def resume(batch_size=100):
+    """Submit every pending blob, and claims abandoned by dead workers, without waiting.
+
+    Returns the number of blobs submitted.
+    """
+    _release_stale()
+    count = 0
+    for rows in _pending(batch_size):
+        count += sum(_submit(r["sha256"]) is not None for r in rows)
+    return count
+
+
+def _release_stale():
+    db.execute(
+        """UPDATE blobs SET thumb_state = 'pending'
+           WHERE thumb_state = 'processing' AND thumb_updated_at < datetime('now', ?)""",
+        (f"-{STALE_AFTER_MINUTES} minutes",),
+    )
+
+
+def _pending(batch_size):
+    """Pending blobs in batches of `batch_size`, in sha256 order."""
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT sha256 FROM blobs WHERE thumb_state = 'pending' AND sha256 > ?
+               ORDER BY sha256 LIMIT ?""",
+            (last, batch_size),
+        )
+        if not rows:
+            return
+        last = rows[-1]["sha256"]
+        yield rows
+
+
+def backfill(retry_failed=False, batch_size=100):
+    """Generate thumbnails for every blob still waiting for them.
+
+    Also picks up claims abandoned by dead workers and, with `retry_failed`,
+    failed blobs under THUMB_MAX_ATTEMPTS. Blocks until done and returns the
+    number of blobs in each final state.
+    """
+    _release_stale()
+    if retry_failed:
+        db.execute(
+            "UPDATE blobs SET thumb_state = 'pending' WHERE thumb_state = 'failed' AND thumb_attempts < ?",
+            (config.THUMB_MAX_ATTEMPTS,),
+        )
+
+    counts = {"ready": 0, "failed": 0, "skipped": 0}
+    for rows in _pending(batch_size):
+        futures = {}
+        for r in rows:
+            future = _submit(r["sha256"])
+            if future is None:
+                counts["skipped"] += 1
+            else:
+                futures[future] = r["sha256"]
+        for future in as_completed(futures):
+            counts["failed" if future.exception() else "ready"] += 1
+    return counts
+
+
+def reconcile(batch_size=500):
+    """Bring thumbnail columns back in line with what is on disk.
+
+    Ready blobs missing any derivative go back to pending; pending or failed
+    blobs whose derivatives all exist become ready. Card files stored before
+    the blob store get their state from their per-board thumbs directory.
+    Directories are listed once each instead of stat-ing every file. Returns
+    counts of rows changed.
+    """
+    listings = {}
+
+    def listing(path):
+        if path not in listings:
+            try:
+                with os.scandir(path) as it:
+                    listings[path] = {e.name for e in it}
+            except FileNotFoundError:
+                listings[path] = set()
+        return listings[path]
+
+    def on_disk(name):
+        found = set()
+        for width in set(config.THUMB_WIDTHS):
+            paths = (blobs.thumb_path(name, width, webp=True), blobs.thumb_path(name, width))
+            if all(os.path.basename(p) in listing(os.path.dirname(p)) for p in paths):
+                found.add(width)
+        return found
+
+    counts = {"requeued": 0, "repaired": 0, "legacy": 0}
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT sha256, stored_name, thumb_state, thumb_widths FROM blobs
+               WHERE thumb_state IN ('ready', 'pending', 'failed') AND sha256 > ?
+               ORDER BY sha256 LIMIT ?""",
+            (last, batch_size),
+        )
+        if not rows:
+            break
+        last = rows[-1]["sha256"]
+        for b in rows:
+            found = on_disk(b["stored_name"])
+            complete = found == set(config.THUMB_WIDTHS)
+            if b["thumb_state"] == "ready" and not complete:
+                _set_state(b["sha256"], "pending")
+                counts["requeued"] += 1
+            elif complete and (b["thumb_state"] != "ready" or b["thumb_widths"] is None):
+                _set_state(b["sha256"], "ready", widths=found)
+                counts["repaired"] += 1
+
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT cf.id, cf.stored_name, cf.thumb_state, c.board_id FROM card_files cf
+               JOIN cards c ON c.id = cf.card_id
+               WHERE cf.blob_id IS NULL AND cf.id > ?
+               ORDER BY cf.id LIMIT ?""",
+            (last, batch_size),
+        )
+        if not rows:
+            break
+        last = rows[-1]["id"]
+        with db.transaction():
+            for f in rows:
+                thumbs = listing(os.path.join(config.UPLOAD_DIR, f["board_id"], "thumbs"))
+                state = "ready" if f["stored_name"] in thumbs else None
+                if state != f["thumb_state"]:
+                    db.execute("UPDATE card_files SET thumb_state = ? WHERE id = ?", (state, f["id"]))
+                    bump_revision(f["board_id"])
+                    counts["legacy"] += 1
+    return counts
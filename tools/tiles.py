@@ -0,0 +1,224 @@
+import math
+import os
+import re
+import shutil
+from concurrent.futures import as_completed
+from flask import has_app_context
+from PIL import Image, ImageOps
+import config
+from tools import db, blobs, thumbnails
+
+# Tiles are WebP: small, and unlike JPEG they keep transparency
+TILE_FORMAT = "webp"
+
+TILE_NAME_RE = re.compile(r"^(\d+)_(\d+)\.webp$")
+
+
+def wanted(width, height):
+    """Whether an image of this size gets a tile pyramid."""
+    return max(width, height) > config.TILE_MIN_SIZE
+
+
+def max_level(width, height):
+    """Deep Zoom's full-resolution level: level 0 is 1x1, each level doubles."""
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+# ── Worker side (runs in the process pool) ─────────────────
+
+def render(src, out_dir, tile_size, quality):
+    """Write a Deep Zoom pyramid of `src` to `out_dir`/<level>/<col>_<row>.webp.
+
+    Each level is halved from the one above it rather than from the
+    original, so the image is decoded once. Tiles go to a sibling scratch
+    directory that replaces `out_dir` when complete, so a pyramid is never
+    seen half written. Returns (width, height).
+    """
+    scratch = f"{out_dir}.tmp{os.getpid()}"
+    shutil.rmtree(scratch, ignore_errors=True)
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or img.mode == "P" else "RGB")
+        size = img.size
+        level_img = img
+        for level in range(max_level(*size), -1, -1):
+            level_dir = os.path.join(scratch, str(level))
+            os.makedirs(level_dir)
+            w, h = level_img.size
+            for col in range(math.ceil(w / tile_size)):
+                for row in range(math.ceil(h / tile_size)):
+                    box = (col * tile_size, row * tile_size,
+                           min((col + 1) * tile_size, w), min((row + 1) * tile_size, h))
+                    level_img.crop(box).save(
+                        os.path.join(level_dir, f"{col}_{row}.{TILE_FORMAT}"),
+                        format="WEBP", quality=quality,
+                    )
+            if level:
+                # reduce() rounds up, matching Deep Zoom's level sizes
+                level_img = level_img.reduce(2)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(scratch, out_dir)
+    return size
+
+
+# ── App side ───────────────────────────────────────────────
+
+def enqueue(sha256):
+    """Build a blob's tile pyramid in the background once the current transaction commits."""
+    db.after_commit(lambda: _submit(sha256))
+
+
+def _claim(sha256):
+    with db.transaction() as conn:
+        claimed = conn.execute(
+            """UPDATE blobs SET tile_state = 'processing', tile_error = NULL,
+                                tile_updated_at = datetime('now')
+               WHERE sha256 = ? AND (tile_state IS NULL OR tile_state = 'pending')""",
+            (sha256,),
+        ).rowcount
+    if not claimed:
+        return None
+    return db.query_one("SELECT * FROM blobs WHERE sha256 = ?", (sha256,))
+
+
+def _submit(sha256):
+    blob = _claim(sha256)
+    if blob is None:
+        return None
+    name = blob["stored_name"]
+    future = thumbnails.pool().submit(
+        render, blobs.blob_path(name), blobs.tile_dir(name), config.TILE_SIZE, config.TILE_QUALITY,
+    )
+    future.add_done_callback(lambda f: _finish(sha256, f))
+    return future
+
+
+def _finish(sha256, future):
+    error = future.exception()
+    with db.transaction():
+        if error:
+            db.execute(
+                """UPDATE blobs SET tile_state = 'failed', tile_error = ?,
+                                    tile_updated_at = datetime('now')
+                   WHERE sha256 = ?""",
+                (f"{type(error).__name__}: {error}", sha256),
+            )
+        else:
+            width, height = future.result()
+            db.execute(
+                """UPDATE blobs SET tile_state = 'ready', tile_error = NULL, tile_size = ?,
+                                    image_width = ?, image_height = ?,
+                                    tile_updated_at = datetime('now')
+                   WHERE sha256 = ?""",
+                (config.TILE_SIZE, width, height, sha256),
+            )
+            # Payloads start carrying the viewer URL
+            thumbnails.bump_boards(sha256)
+    if not has_app_context():
+        db.close_conn()
+
+
+def backfill(retry_failed=False, batch_size=100):
+    """Build pyramids for every large image that should have one.
+
+    Images thumbnailed before their size was recorded are measured from
+    their headers first. Blocks until done and returns counts of blobs
+    that ended up ready or failed.
+    """
+    last = ""
+    while True:
+        rows = db.query(
+            """SELECT sha256, stored_name FROM blobs
+               WHERE thumb_state = 'ready' AND image_width IS NULL AND sha256 > ?
+               ORDER BY sha256 LIMIT ?""",
+            (last, batch_size),
+        )
+        if not rows:
+            break
+        last = rows[-1]["sha256"]
+        with db.transaction():
+            for b in rows:
+                try:
+                    with Image.open(blobs.blob_path(b["stored_name"])) as img:
+                        size = thumbnails.upright_size(img)
+                except (OSError, ValueError):
+                    continue
+                db.execute(
+                    "UPDATE blobs SET image_width = ?, image_height = ? WHERE sha256 = ?",
+                    (size[0], size[1], b["sha256"]),
+                )
+
+    _release_stale()
+    if retry_failed:
+        db.execute("UPDATE blobs SET tile_state = 'pending' WHERE tile_state = 'failed'")
+
+    counts = {"ready": 0, "failed": 0}
+    for rows in _batches(
+        "tile_state = 'pending' OR (tile_state IS NULL AND MAX(image_width, image_height) > ?)",
+        (config.TILE_MIN_SIZE,), batch_size,
+    ):
+        futures = [f for f in (_submit(r["sha256"]) for r in rows) if f is not None]
+        for future in as_completed(futures):
+            counts["failed" if future.exception() else "ready"] += 1
+    return counts
+
+
+def resume(batch_size=100):
+    """Submit pending pyramids, and claims abandoned by dead workers, without waiting.
+
+    Returns the number of blobs submitted.
+    """
+    _release_stale()
+    count = 0
+    for rows in _batches("tile_state = 'pending'", (), batch_size):
+        count += sum(_submit(r["sha256"]) is not None for r in rows)
+    return count
+
+
+def _release_stale():
+    db.execute(
+        """UPDATE blobs SET tile_state = 'pending'
+           WHERE tile_state = 'processing' AND tile_updated_at < datetime('now', ?)""",
+        (f"-{thumbnails.STALE_AFTER_MINUTES} minutes",),
+    )
+
+
+def _batches(where, params, batch_size):
+    """Blobs matching `where`, in batches of `batch_size` in sha256 order."""
+    last = ""
+    while True:
+        rows = db.query(
+            f"SELECT sha256 FROM blobs WHERE ({where}) AND sha256 > ? ORDER BY sha256 LIMIT ?",
+            (*params, last, batch_size),
+        )
+        if not rows:
+            return
+        last = rows[-1]["sha256"]
+        yield rows
+
+
+# ── Serving ────────────────────────────────────────────────
+
+def dzi(f):
+    """Deep Zoom descriptor for a file whose blob columns are joined onto `f`."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'Format="{TILE_FORMAT}" Overlap="0" TileSize="{f["tile_size"]}">'
+        f'<Size Width="{f["image_width"]}" Height="{f["image_height"]}"/></Image>'
+    )
+
+
+def tile_path(f, level, name):
+    """Path of one tile, or None if `level`/`name` aren't in the file's pyramid."""
+    m = TILE_NAME_RE.match(name)
+    if not m or level > max_level(f["image_width"], f["image_height"]):
+        return None
+    scale = 2 ** (max_level(f["image_width"], f["image_height"]) - level)
+    cols = math.ceil(math.ceil(f["image_width"] / scale) / f["tile_size"])
+    rows = math.ceil(math.ceil(f["image_height"] / scale) / f["tile_size"])
+    if int(m.group(1)) >= cols or int(m.group(2)) >= rows:
+        return None
+    return os.path.join(blobs.tile_dir(f["stored_name"]), str(level), name)
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+import config
+from tools import db, blobs
+from tools.file_handler import allowed_file
+
+# Bytes read from the request per write, so a chunk never sits in memory whole
+COPY_SIZE = 64 * 1024
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = None
+
+# session id -> (offset, sha256 state) for the bytes received so far. Lost on
+# restart or when a chunk lands on another worker; rebuilt from the part file.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def part_path(session_id):
+    return os.path.join(blobs.tmp_dir(), f"upload-{session_id}.part")
+
+
+def create(card_id, user_id, original_name, mime_type, total_size):
+    """Start a chunked upload. Returns the session row."""
+    _maybe_cleanup()
+    if not original_name or not allowed_file(original_name):
+        raise UploadError("File type not allowed")
+    if not isinstance(total_size, int) or total_size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if total_size > config.UPLOAD_MAX_SIZE:
+        raise UploadError(f"File exceeds {config.UPLOAD_MAX_SIZE} bytes", status=413)
+
+    session_id = str(uuid.uuid4())
+    open(part_path(session_id), "wb").close()
+    db.execute(
+        """INSERT INTO upload_sessions
+               (id, card_id, user_id, original_name, mime_type, total_size, chunk_size)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (session_id, card_id, user_id, original_name,
+         mime_type or "application/octet-stream", total_size, config.UPLOAD_CHUNK_SIZE),
+    )
+    return get(session_id)
+
+
+def get(session_id):
+    return db.query_one("SELECT * FROM upload_sessions WHERE id = ?", (session_id,))
+
+
+def _hasher_at(session_id, offset):
+    """SHA-256 state after the first `offset` bytes of the part file."""
+    with _hashers_lock:
+        cached = _hashers.get(session_id)
+    if cached and cached[0] == offset:
+        return cached[1].copy()
+    digest = hashlib.sha256()
+    remaining = offset
+    with open(part_path(session_id), "rb") as f:
+        while remaining:
+            chunk = f.read(min(blobs.CHUNK_SIZE, remaining))
+            if not chunk:
+                raise UploadError("Upload data is missing; start again", status=410)
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def write_chunk(session, index, stream):
+    """Append chunk `index` from `stream`. Chunks must arrive in order.
+
+    Re-sending a chunk that was already stored is acknowledged without
+    rewriting it, so clients can retry blindly after a dropped response.
+    Returns the updated session row.
+    """
+    if index < session["next_chunk"]:
+        return session
+    if index > session["next_chunk"]:
+        raise UploadError("Chunk out of order", status=409, next_chunk=session["next_chunk"])
+
+    offset = session["received_bytes"]
+    expected = min(session["chunk_size"], session["total_size"] - offset)
+    if expected <= 0:
+        raise UploadError("Upload already has all its data", status=409,
+                          next_chunk=session["next_chunk"])
+
+    digest = _hasher_at(session["id"], offset)
+    written = 0
+    with open(part_path(session["id"]), "r+b") as f:
+        # Drop anything left over from an earlier attempt at this chunk
+        f.truncate(offset)
+        f.seek(offset)
+        while written <= expected:
+            data = stream.read(COPY_SIZE)
+            if not data:
+                break
+            f.write(data)
+            digest.update(data)
+            written += len(data)
+        if written != expected:
+            f.truncate(offset)
+            raise UploadError(f"Chunk {index} must be {expected} bytes")
+
+    with db.transaction() as conn:
+        advanced = conn.execute(
+            """UPDATE upload_sessions
+               SET next_chunk = next_chunk + 1, received_bytes = ?, updated_at = datetime('now')
+               WHERE id = ? AND next_chunk = ?""",
+            (offset + written, session["id"], index),
+        ).rowcount
+    if advanced:
+        with _hashers_lock:
+            _hashers[session["id"]] = (offset + written, digest)
+    return get(session["id"])
+
+
+def finish(session, expected_sha256=None):
+    """Move a fully received upload into the blob store.
+
+    Returns file metadata in the same shape as file_handler.save_upload and
+    removes the session.
+    """
+    if session["received_bytes"] != session["total_size"]:
+        raise UploadError("Upload is incomplete", status=409, next_chunk=session["next_chunk"])
+    # Only one concurrent call gets to attach the file
+    with db.transaction() as conn:
+        claimed = conn.execute(
+            """UPDATE upload_sessions SET state = 'finishing', updated_at = datetime('now')
+               WHERE id = ? AND state = 'open'""",
+            (session["id"],),
+        ).rowcount
+    if not claimed:
+        raise UploadError("Upload was already completed", status=409)
+
+    try:
+        sha256 = _hasher_at(session["id"], session["received_bytes"]).hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise UploadError("Checksum mismatch", status=422, sha256=sha256)
+        ext = os.path.splitext(session["original_name"])[1].lower()
+        blob = blobs.adopt(part_path(session["id"]), sha256, ext, session["total_size"])
+    except FileNotFoundError:
+        discard(session["id"])
+        raise UploadError("Upload data is missing; start again", status=410)
+    except Exception:
+        # Let the client retry, e.g. with the right checksum
+        db.execute("UPDATE upload_sessions SET state = 'open' WHERE id = ?", (session["id"],))
+        raise
+    discard(session["id"], remove_part=False)
+    return {
+        "id": str(uuid.uuid4()),
+        "original_name": session["original_name"],
+        "stored_name": blob["stored_name"],
+        "blob_id": blob["sha256"],
+        "mime_type": session["mime_type"],
+        "file_size": blob["size"],
+    }
+
+
+def discard(session_id, remove_part=True):
+    db.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+    if remove_part:
+        try:
+            os.remove(part_path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+def cleanup(max_age_hours=None):
+    """Remove sessions idle for longer than `max_age_hours`, and stray part files.
+
+    Returns the number of sessions removed.
+    """
+    if max_age_hours is None:
+        max_age_hours = config.UPLOAD_SESSION_TTL_HOURS
+    stale = db.query(
+        "SELECT id FROM upload_sessions WHERE updated_at < datetime('now', ?)",
+        (f"-{int(max_age_hours)} hours",),
+    )
+    for s in stale:
+        discard(s["id"])
+
+    # Part files whose session row is gone (e.g. card deleted mid-upload)
+    live = {r["id"] for r in db.query("SELECT id FROM upload_sessions")}
+    cutoff = time.time() - max_age_hours * 3600
+    with os.scandir(blobs.tmp_dir()) as it:
+        for entry in it:
+            name = entry.name
+            if not (name.startswith("upload-") and name.endswith(".part")):
+                continue
+            if name[len("upload-"):-len(".part")] in live:
+                continue
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    return len(stale)
+
+
+def _maybe_cleanup():
+    """Clean up at most once per UPLOAD_CLEANUP_INTERVAL seconds per process."""
+    global _last_cleanup
+    now = time.monotonic()
+    if _last_cleanup is not None and now - _last_cleanup < config.UPLOAD_CLEANUP_INTERVAL:
+        return
+    if not _cleanup_lock.acquire(blocking=False):
+        return
+    try:
+        _last_cleanup = now
+        cleanup()
+    finally:
+        _cleanup_lock.release()